@@ -1,296 +1,1297 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import requests
+import asyncio
 import time
 import threading
-import pika
-import json
+import hmac
 import os
+import socket
 from dotenv import load_dotenv
-from functools import wraps
+from scheduler import PollScheduler
+from async_engine import AsyncPollEngine
+from codeforces import CodeforcesClient, AsyncCodeforcesClient, SubmissionCursor, HandleDirectory, aiohttp
+from breaker import CircuitBreaker, CircuitOpenError, STATES as BREAKER_STATES
+from governor import RateGovernor, match_weight
+from publisher import WinnerPublisher
+from consumer import MatchConsumer
+from statelog import StateLog
+from registry import TrackingRegistry, match_round, FINISHED_STATUSES, DECIDED_STATUSES
+from events import EventBus
+from cluster import ClusterMembership
+from ipc import EngineServer, EngineReplica
+from standby import ReplicationServer, Standby
+from snapshots import SnapshotCache
+from tenants import DEFAULT_TENANT, tenant_of, tenant_key, check_match_id, local_id, parse_shares
+import codec
+import logs
+from metrics import REGISTRY, Gauge, MATCHES_RECEIVED, CALLBACK_SECONDS, DETECTION_SECONDS, POLL_SECONDS, POLL_PHASE_SECONDS
+from profiler import SamplingProfiler, ProfilerBusyError, collapse, summarize
 
 load_dotenv()
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON through the codec module's fast encoder, keeping sorted keys and the stdlib fallbacks."""
+
+    def dumps(self, obj, **kwargs):
+        try:
+            return codec.dumps(obj, sort_keys=self.sort_keys).decode()
+        except TypeError:
+            # A type only Flask's default encoder knows (dates, dataclasses, ...)
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return codec.loads(s)
+
 app = Flask(__name__)
+if codec.orjson is not None:
+    app.json = FastJSONProvider(app)
 cors=CORS(app)
 
 # RabbitMQ Configuration
 CLOUDAMQP_URL = os.getenv('CLOUDAMQP_URL')
 QUEUE_NAME = 'winners'
+QUEUE_CODEC = os.getenv('QUEUE_CODEC', 'json')  # 'json' (what the Node backend reads) or 'msgpack' for the winners queue
+WINNER_OUTBOX_SIZE = int(os.getenv('WINNER_OUTBOX_SIZE', 10000))
+PUBLISH_BATCH_SIZE = int(os.getenv('PUBLISH_BATCH_SIZE', 100))
+MATCHES_QUEUE = 'matches'
+MATCHES_PREFETCH = int(os.getenv('MATCHES_PREFETCH', 64))
+CONSUMER_WORKERS = int(os.getenv('CONSUMER_WORKERS', 4))
 
+# Polling Configuration
+POLL_INTERVAL = int(os.getenv('POLL_INTERVAL', 5))  # seconds
+FAST_POLL_INTERVAL = float(os.getenv('FAST_POLL_INTERVAL', 1))  # seconds while the tracked problem is being judged
+MAX_POLL_INTERVAL = float(os.getenv('MAX_POLL_INTERVAL', 15))  # longest idle backoff of a handle in seconds
+TRACKING_WORKERS = int(os.getenv('TRACKING_WORKERS', 8))
+TRACKING_ENGINE = os.getenv('TRACKING_ENGINE', 'threads')  # 'threads' or 'asyncio'
+CF_POOL_SIZE = int(os.getenv('CF_POOL_SIZE', 16))
+CF_RATE = float(os.getenv('CF_RATE', 0.5))  # Codeforces calls per second for the whole process
+CF_BURST = int(os.getenv('CF_BURST', 1))
+CF_CONNECT_TIMEOUT = float(os.getenv('CF_CONNECT_TIMEOUT', 3.05))  # seconds
+CF_READ_TIMEOUT = float(os.getenv('CF_READ_TIMEOUT', 10))  # seconds
+CF_BREAKER_FAILURES = int(os.getenv('CF_BREAKER_FAILURES', 5))  # consecutive failed calls that pause polling
+CF_BREAKER_RESET = float(os.getenv('CF_BREAKER_RESET', 30))  # seconds polling stays paused before a probe call
+CF_HEDGE_QUANTILE = float(os.getenv('CF_HEDGE_QUANTILE', 0.95))  # latency quantile after which a decisive call is hedged (0 disables)
+HANDLE_CACHE_TTL = int(os.getenv('HANDLE_CACHE_TTL', 6 * 3600))  # seconds a handle validated through user.info stays cached
+HANDLE_BATCH_SIZE = int(os.getenv('HANDLE_BATCH_SIZE', 300))  # handles per user.info call
+HANDLE_CHECK_DELAY = float(os.getenv('HANDLE_CHECK_DELAY', 0.5))  # seconds queued matches wait to share one user.info call
+CURSOR_START_GRACE = int(os.getenv('CURSOR_START_GRACE', 60))  # seconds before match start still counted
+# Tracked handles on one contest from which a single contest.status feed replaces per-handle polling (0 disables)
+CONTEST_FEED_MIN_HANDLES = int(os.getenv('CONTEST_FEED_MIN_HANDLES', 2))
+FEED_KEY_PREFIX = 'contest:'
 
-tracking_threads={}
-# Dictionary to store active tracking status
-active_tracking = {}
-
-def retry_on_connection_error(max_retries=3, delay=5):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            retries = 0
-            while retries < max_retries:
-                try:
-                    return func(*args, **kwargs)
-                except (pika.exceptions.AMQPConnectionError, 
-                       pika.exceptions.ConnectionClosedByBroker,
-                       pika.exceptions.StreamLostError) as e:
-                    retries += 1
-                    if retries == max_retries:
-                        print(f"Failed to connect after {max_retries} attempts: {str(e)}")
-                        raise
-                    print(f"Connection attempt {retries} failed. Retrying in {delay} seconds...")
-                    time.sleep(delay)
-            return None
-        return wrapper
-    return decorator
+# State log Configuration (empty STATE_DIR disables recovery)
+STATE_DIR = os.getenv('STATE_DIR', '.state')
+STATE_FSYNC_INTERVAL = float(os.getenv('STATE_FSYNC_INTERVAL', 0.2))  # seconds
+STATE_COMPACT_EVERY = int(os.getenv('STATE_COMPACT_EVERY', 5000))  # log records between snapshots
+TRACKING_RETENTION = int(os.getenv('TRACKING_RETENTION', 24 * 3600))  # seconds a finished match stays listed
+MAX_FINISHED_TRACKING = int(os.getenv('MAX_FINISHED_TRACKING', 10000))
 
-@retry_on_connection_error()
-def publish_to_winner_queue(winner_data):
-    """Publish winner data to RabbitMQ"""
-    try:
-        # Parse AMQP URL and create connection parameters
-        parameters = pika.URLParameters(CLOUDAMQP_URL)
-        connection = pika.BlockingConnection(parameters)
-        channel = connection.channel()
-        
-        # Declare queue
-        channel.queue_declare(queue=QUEUE_NAME, durable=True)
-        
-        # Publish message
-        channel.basic_publish(
-            exchange='',
-            routing_key=QUEUE_NAME,
-            body=json.dumps(winner_data),
-            properties=pika.BasicProperties(
-                delivery_mode=2  # make message persistent
-            )
-        )
+# Event stream Configuration
+EVENT_BUFFER_SIZE = int(os.getenv('EVENT_BUFFER_SIZE', 10000))  # events kept for resuming clients
+SSE_HEARTBEAT = int(os.getenv('SSE_HEARTBEAT', 15))  # seconds between keep-alive comments
+MAX_LONG_POLL = int(os.getenv('MAX_LONG_POLL', 60))  # longest check_status ?wait= in seconds
+GZIP_MIN_BYTES = int(os.getenv('GZIP_MIN_BYTES', 1024))  # smallest listing worth gzipping (0 disables)
 
-        print('Message published to RabbitMQ')
-        
-        connection.close()
-    except Exception as e:
-        print(f"Error publishing to RabbitMQ: {str(e)}")
-        raise
+# Match lifetime Configuration
+MATCH_TIME_LIMIT = int(os.getenv('MATCH_TIME_LIMIT', 0))  # seconds before an undecided match times out (0 = never)
+TIMEOUT_OUTCOME = os.getenv('TIMEOUT_OUTCOME', 'record')  # 'record' the timeout, or also 'notify' the winners queue
+REAPER_INTERVAL = float(os.getenv('REAPER_INTERVAL', 5))  # seconds between sweeps for expired matches
+TIMEOUT_VERDICT_GRACE = float(os.getenv('TIMEOUT_VERDICT_GRACE', 60))  # seconds past a deadline a pending verdict may still win
+STALE_MATCH_AFTER = int(os.getenv('STALE_MATCH_AFTER', 1800))  # seconds without a submission before a match counts as stale
 
-@retry_on_connection_error()
-def subscribe_from_match_queue():
-    try:
-        connection = pika.BlockingConnection(pika.URLParameters(CLOUDAMQP_URL))
-        channel = connection.channel()
-
-        matches_queue = 'matches'
-        channel.queue_declare(queue=matches_queue, durable=True)
-        channel.basic_consume(
-            queue=matches_queue, 
-            on_message_callback=callback, 
-            auto_ack=True
-        )
+# Tenancy Configuration: matches tagged with a "tenant" (one tournament among several) are
+# tracked under namespaced ids, and every tenant is guaranteed its share of CF_RATE
+TENANT_SHARES = parse_shares(os.getenv('TENANT_SHARES', ''))  # relative budget shares, e.g. "iitb:2,nitk:1"
+DEFAULT_TENANT_SHARE = float(os.getenv('DEFAULT_TENANT_SHARE', 1))  # share of tenants not in TENANT_SHARES
 
-        print('Waiting for messages in match queue. To exit press CTRL+C')
-        channel.start_consuming()
-    except Exception as e:
-        print('Error', str(e))
-        raise
+# Cluster Configuration (empty CLUSTER_PEERS runs a single node)
+NODE_ID = os.getenv('NODE_ID', socket.gethostname())
+NODE_URL = os.getenv('NODE_URL', 'http://localhost:5000')  # base URL peers reach this node on
+CLUSTER_PEERS = [peer for peer in os.getenv('CLUSTER_PEERS', '').split(',') if peer]
+CLUSTER_LEASE_TTL = float(os.getenv('CLUSTER_LEASE_TTL', 15))  # seconds without a heartbeat before a node is dropped
+CLUSTER_HEARTBEAT = float(os.getenv('CLUSTER_HEARTBEAT', 5))  # seconds
+CLUSTER_TOKEN = os.getenv('CLUSTER_TOKEN')  # shared secret for /cluster/* requests
+
+# Profiling Configuration (empty DEBUG_TOKEN disables /debug/profile)
+DEBUG_TOKEN = os.getenv('DEBUG_TOKEN')  # shared secret sent as X-Debug-Token
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.01))  # seconds between stack samples
+PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', 60))  # longest profile one request may take
+
+# Process role: 'all' runs everything in one process; 'engine' consumes and polls and
+# serves its state on ENGINE_SOCKET; 'api' serves HTTP from a replica of that state
+PROCESS_ROLE = os.getenv('PROCESS_ROLE', 'all')
+ENGINE_SOCKET = os.getenv('ENGINE_SOCKET', os.path.join(STATE_DIR or '.', 'engine.sock'))
+ENGINE_TIMEOUT = float(os.getenv('ENGINE_TIMEOUT', 70))  # seconds an API worker waits on the engine
+
+# Warm standby Configuration: a primary with REPLICATION_LISTEN streams its state log to a
+# process started with STANDBY_OF, which takes over once the primary's lease lapses
+REPLICATION_LISTEN = os.getenv('REPLICATION_LISTEN')  # host:port the primary streams its state log on
+STANDBY_OF = os.getenv('STANDBY_OF')  # host:port of the primary to follow; empty starts as the primary
+REPLICATION_TOKEN = os.getenv('REPLICATION_TOKEN')  # shared secret standbys send to the primary
+REPLICATION_HEARTBEAT = float(os.getenv('REPLICATION_HEARTBEAT', 0.25))  # seconds between heartbeats to standbys
+STANDBY_LEASE_TTL = float(os.getenv('STANDBY_LEASE_TTL', 1))  # seconds of primary silence before taking over
+REPLICATION_FENCE_GRACE = float(os.getenv('REPLICATION_FENCE_GRACE', 30))  # seconds a primary stays fenced with no standby (0 = until one acks)
+
+# Logging Configuration: structured records written off the request and poll threads
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'info')  # debug, info, warning or error
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json' lines or readable 'text'
+LOG_BUFFER_SIZE = int(os.getenv('LOG_BUFFER_SIZE', 10000))  # records queued for the writer before new ones are dropped
+LOG_RATE = float(os.getenv('LOG_RATE', 200))  # records per second written (0 disables the limit)
+LOG_BURST = int(os.getenv('LOG_BURST', 1000))  # records written back to back before LOG_RATE applies
+LOG_DEDUP_WINDOW = float(os.getenv('LOG_DEDUP_WINDOW', 10))  # seconds a repeated warning or error is suppressed (0 disables)
+logs.LOGGER.configure(
+    level=LOG_LEVEL, fmt=LOG_FORMAT, buffer_size=LOG_BUFFER_SIZE, rate=LOG_RATE, burst=LOG_BURST,
+    dedup_window=LOG_DEDUP_WINDOW
+)
+
+# Warm standby roles: the follower of a primary, and the primary's stream to its standbys
+standby = None
+replication_server = None
+
+# Dictionary to store per-match polling state
+match_states = {}
+# Contest id (namespaced per tenant) -> matches on that contest and how they are polled ("user" or "feed")
+contest_groups = {}
+tracking_lock = threading.RLock()
+# Match id -> creation time of its deciding submission, until the broker confirms the winner
+winner_times = {}
+# Tracking id -> handles of matches from the queue not checked with Codeforces yet
+unchecked = {}
+unchecked_lock = threading.Lock()
+unchecked_ready = threading.Event()
+# Tracking state transitions and winner decisions, streamed to /events and long-polls
+event_bus = EventBus(max_events=EVENT_BUFFER_SIZE)
+# Serialized listing responses, rebuilt only after the registry version moves
+listing_cache = SnapshotCache()
+
+# Tracking statuses indexed by status and round; finished matches are evicted to an archive
+if PROCESS_ROLE == 'api':
+    # A replica fed by the engine; the engine archives and logs evictions
+    tracking_registry = TrackingRegistry(retention=TRACKING_RETENTION, max_finished=MAX_FINISHED_TRACKING)
+else:
+    tracking_registry = TrackingRegistry(
+        retention=TRACKING_RETENTION, max_finished=MAX_FINISHED_TRACKING,
+        archive_path=os.path.join(STATE_DIR, 'archive.jsonl') if STATE_DIR else None,
+        on_evict=lambda match_id: log_state("evict", match_id),
+        on_change=lambda match_id, data: tracking_changed(match_id, data)
+    )
+tracking_registry.start()
+
+# Nodes own disjoint sets of match ids on a consistent hash ring, with lease-based membership
+cluster = ClusterMembership(
+    NODE_ID, NODE_URL, CLUSTER_PEERS, lease_ttl=CLUSTER_LEASE_TTL, heartbeat_interval=CLUSTER_HEARTBEAT,
+    token=CLUSTER_TOKEN, on_change=lambda joined, left: rebalance(joined, left)
+) if CLUSTER_PEERS else None
+# Latest status of every match in the cluster, replicated from the node tracking it
+cluster_catalog = TrackingRegistry(retention=TRACKING_RETENTION, max_finished=MAX_FINISHED_TRACKING) if cluster else None
+
+# Write-ahead log of match starts, cursor progress and results for restart recovery
+state_log = StateLog(STATE_DIR, fsync_interval=STATE_FSYNC_INTERVAL, compact_every=STATE_COMPACT_EVERY) if STATE_DIR and PROCESS_ROLE != 'api' else None
+
+# One long-lived connection publishes winners from a local outbox
+winner_publisher = WinnerPublisher(
+    CLOUDAMQP_URL, QUEUE_NAME, max_outbox=WINNER_OUTBOX_SIZE, batch_size=PUBLISH_BATCH_SIZE,
+    on_published=lambda message: winner_published(message), codec=codec.MessageCodec(QUEUE_CODEC),
+    paused=lambda: fenced()
+)
+
+# Process-wide rate budget shared by every Codeforces call, split across tenants by share
+# and within a tenant across matches by weight
+rate_governor = RateGovernor(rate=CF_RATE, burst=CF_BURST, min_interval=POLL_INTERVAL,
+                             shares=TENANT_SHARES, default_share=DEFAULT_TENANT_SHARE)
+
+# Shared keep-alive connection pool for every Codeforces call
+# Pauses every Codeforces call while codeforces.com keeps failing
+cf_breaker = CircuitBreaker(failure_threshold=CF_BREAKER_FAILURES, reset_timeout=CF_BREAKER_RESET, name="Codeforces")
+CF_CLIENT_OPTIONS = {
+    "governor": rate_governor,
+    "timeout": (CF_CONNECT_TIMEOUT, CF_READ_TIMEOUT),
+    "breaker": cf_breaker,
+    "hedge_quantile": CF_HEDGE_QUANTILE
+}
+
+cf_client = CodeforcesClient(pool_size=CF_POOL_SIZE, **CF_CLIENT_OPTIONS)
+# Handles of incoming matches are checked in batched user.info calls before any polling
+handle_directory = HandleDirectory(cf_client, ttl=HANDLE_CACHE_TTL, batch_size=HANDLE_BATCH_SIZE)
+
+if TRACKING_ENGINE == 'asyncio' and aiohttp is None:
+    logs.warning("aiohttp is not installed, falling back to the threaded tracking engine")
+    TRACKING_ENGINE = 'threads'
+
+if TRACKING_ENGINE == 'asyncio':
+    # One event loop drives every tracked match, polling both handles concurrently
+    async_cf_client = AsyncCodeforcesClient(pool_size=CF_POOL_SIZE, **CF_CLIENT_OPTIONS)
+    poll_scheduler = AsyncPollEngine(lambda tracking_id: async_poll_match(tracking_id))
+else:
+    # One deadline-ordered queue and a fixed worker pool poll every tracked match
+    async_cf_client = None
+    poll_scheduler = PollScheduler(lambda tracking_id: poll_match(tracking_id), workers=TRACKING_WORKERS)
+
+# Stacks of every thread, sampled only while /debug/profile is running
+profiler = SamplingProfiler(interval=PROFILE_INTERVAL)
+# Always-on timing of the poll phases; children are cached since they are recorded on every poll
+COMPARE_PHASE = POLL_PHASE_SECONDS.labels("compare")
+PUBLISH_PHASE = POLL_PHASE_SECONDS.labels("publish")
+
+# Gauges are read when /metrics is scraped, so they add nothing to the hot paths
+Gauge("blitz_threads", "Live threads in the process", threading.active_count)
+Gauge("blitz_tracked_matches", "Matches in the tracking registry by status",
+      lambda: {(status,): count for status, count in tracking_registry.counts()["by_status"].items()}, ["status"])
+Gauge("blitz_active_matches", "Matches currently being polled", lambda: len(match_states))
+Gauge("blitz_scheduled_polls", "Polls waiting in the scheduler", lambda: len(poll_scheduler))
+Gauge("blitz_winner_outbox", "Winners waiting for broker confirmation", lambda: winner_publisher.stats()["outbox"])
+Gauge("blitz_cf_rate_tokens", "Codeforces rate budget tokens available", lambda: rate_governor.stats()["tokens"])
+Gauge("blitz_cf_breaker_state", "1 for the current state of the Codeforces circuit breaker",
+      lambda: {(state,): int(cf_breaker.state == state) for state in BREAKER_STATES}, ["state"])
+Gauge("blitz_poll_staleness_max_seconds", "Longest time any active match has gone unpolled",
+      lambda: max((entry["stale_seconds"] or 0 for entry in rate_governor.staleness().values()), default=0))
+Gauge("blitz_tenant_cf_budget", "Codeforces calls per second each tenant may make",
+      lambda: {(tenant,): entry["budget"] for tenant, entry in rate_governor.tenants().items()}, ["tenant"])
+Gauge("blitz_tenant_poll_pace", "How much each tenant's preferred poll intervals are stretched to fit its budget",
+      lambda: {(tenant,): entry["pace"] for tenant, entry in rate_governor.tenants().items()}, ["tenant"])
+Gauge("blitz_stale_matches", "Active matches without a submission for STALE_MATCH_AFTER seconds",
+      lambda: len(stale_matches()))
+Gauge("blitz_stale_poll_rate", "Codeforces calls per second spent polling stale matches",
+      lambda: stale_capacity()["calls_per_second"])
+Gauge("blitz_log_queue", "Log records waiting for the writer thread", lambda: logs.LOGGER.stats()["queued"])
+
+def publish_to_winner_queue(winner_data):
+    """Queue winner data for the background RabbitMQ publisher, past the outbox limit if it is full"""
+    # A decided match must reach the broker; it is already in the state log, so it is never dropped
+    winner_publisher.publish(winner_data, spill=True)
 
 def callback(ch, method, properties, body):
+    """
+    Handle one message from the matches queue.
+
+    Returns:
+        bool: True once tracking is registered, so the consumer can ack it;
+            False if the message can never be tracked
+    """
     # print("Received message:", body)
+    started = time.perf_counter()
+    try:
+        handled = handle_match_message(body, properties)
+    except Exception:
+        MATCHES_RECEIVED.labels("failed").inc()
+        raise
+    finally:
+        CALLBACK_SECONDS.observe(time.perf_counter() - started)
+    MATCHES_RECEIVED.labels("tracked" if handled else "rejected").inc()
+    return handled
 
-    data = json.loads(body)
+def handle_match_message(body, properties=None):
+    try:
+        # Matches come as JSON from the Node backend, or msgpack marked by its content type
+        data = codec.decode_message(body, getattr(properties, "content_type", None), getattr(properties, "headers", None))
+    except ValueError as e:
+        logs.warning("Invalid match message", phase="consume", error=e)
+        return False
+    if not isinstance(data, dict):
+        logs.warning("Invalid match message: expected an object", got=type(data).__name__, phase="consume")
+        return False
     # print(data)
 
+    if isinstance(data.get("matches"), list):
+        # A whole round in one message
+        errors = start_matches([match_from_message(match, data.get("tenant")) for match in data["matches"]], validate=False)
+        if errors:
+            # The ids in `error` keep rejections of different rounds apart when repeated warnings are collapsed
+            logs.warning("Rejected round message", matches=len(data["matches"]), errors=errors, phase="consume",
+                         error=f"Invalid matches: {', '.join(sorted(errors))}")
+        return not errors
+
     match_id = data.get("match_id")
     # match_number = data.get("match_number")
     handle1 = data.get("p1")
     handle2 = data.get("p2")
     problem_id = data.get("cf_question")
+    level = data.get("level")
+    time_limit = data.get("time_limit")
     # print(match_id, match_number, handle1, handle2, problem_id)
+    try:
+        tenant = tenant_of(data.get("tenant"))
+        check_match_id(tenant, match_id)
+    except ValueError as e:
+        logs.warning("Invalid match message", match=match_id, phase="consume", error=e)
+        return False
+    tracking_id = tenant_key(tenant, match_id) if match_id else match_id
+
+
+    if cluster is not None and match_id and handle1 and handle2 and problem_id and not cluster.is_local(tracking_id):
+        match = {"match_id": tracking_id, "handle1": handle1, "handle2": handle2, "problem_id": problem_id,
+                 "level": level, "time_limit": time_limit, "tenant": tenant}
+        if forward_match(cluster.owner(tracking_id), match):
+            return True
 
     # Start tracking directly
-    start_tracking(match_id, handle1, handle2, problem_id)
+    with app.app_context():
+        response = start_tracking(match_id, handle1, handle2, problem_id, level, time_limit, tenant)
+    if isinstance(response, tuple):
+        status_code = response[1]
+        if status_code >= 500:
+            raise RuntimeError(f"Could not start tracking {tracking_id}")
+        return False
+    # Polling has started; the handles are checked in the background
+    check_handles_later(tracking_id, [handle1, handle2])
+    return True
 
-# Start Subscriber
-threading.Thread(target=subscribe_from_match_queue, daemon=True).start()
+def accepted_time(submissions, contest_id, problem_index):
+    """
+    Return the time of the earliest accepted solution of the problem among
+    the given submissions, else None.
+    """
+    started = time.perf_counter()
+    solved_times = [
+        submission["creationTimeSeconds"] for submission in submissions
+        if (str(submission["problem"].get("contestId")) == contest_id and
+            submission["problem"].get("index") == problem_index and
+            submission.get("verdict") == "OK")
+    ]
+    COMPARE_PHASE.observe(time.perf_counter() - started)
+    return min(solved_times) if solved_times else None
 
-def check_problem_solution(handle1, handle2, problem_id, tracking_id):
+def check_handle(cursor, contest_id, problem_index, tenant=DEFAULT_TENANT):
     """
-    Poll Codeforces API to check which user solves a problem first.
-    Only checks the latest submission from each user.
-    
-    Args:
-        handle1 (str): First Codeforces handle
-        handle2 (str): Second Codeforces handle
-        problem_id (str): Problem ID in format "contestId/index" (e.g. "1800/A")
-        tracking_id (str): Unique tracking identifier
-    
+    Check whether a handle has submitted an accepted solution since its
+    cursor was last advanced.
+
     Returns:
-        dict: Result containing winner and timing information
+        int: Submission time of the accepted solution, or None if not solved
     """
     try:
-        contest_id, problem_index = problem_id.split("/")[::-1][:2][::-1]
+        # A verdict on the tracked problem is pending: this poll may decide the match
+        hedge = (contest_id, problem_index) in cursor.judging
+        return accepted_time(cf_client.new_submissions(cursor, hedge, tenant), contest_id, problem_index)
+    except CircuitOpenError:
+        pass
+    except Exception as e:
+        logs.error("Error checking handle", handle=cursor.handle, tenant=tenant, phase="poll", error=e)
+    return None
 
-        # Store the initial status
-        handle1_solved = False
-        handle2_solved = False
-        handle1_time = None
-        handle2_time = None
-        
-        poll_interval = 5  # seconds
-        
-        # Track if this thread should stop
-        should_stop = threading.Event()
-        tracking_threads[tracking_id] = should_stop
-        
-        while not should_stop.is_set():
-            # Check first handle
-            if not handle1_solved:
-                try:
-                    url1 = f"https://codeforces.com/api/user.status?handle={handle1}&count=1"  # Only get the latest submission
-                    response1 = requests.get(url1)
-                    data1 = response1.json()
-                    
-                    if data1["status"] == "OK" and data1["result"]:
-                        submission = data1["result"][0]  # Get the latest submission
-                        if (str(submission["problem"].get("contestId")) == contest_id and 
-                            submission["problem"].get("index") == problem_index and 
-                            submission["verdict"] == "OK"):
-                            handle1_solved = True
-                            handle1_time = submission["creationTimeSeconds"]
-                except Exception as e:
-                    print(f"Error checking {handle1}: {str(e)}")
-            
-            # Check second handle
-            if not handle2_solved:
-                try:
-                    url2 = f"https://codeforces.com/api/user.status?handle={handle2}&count=1"  # Only get the latest submission
-                    response2 = requests.get(url2)
-                    data2 = response2.json()
-                    
-                    if data2["status"] == "OK" and data2["result"]:
-                        submission = data2["result"][0]  # Get the latest submission
-                        if (str(submission["problem"].get("contestId")) == contest_id and 
-                            submission["problem"].get("index") == problem_index and 
-                            submission["verdict"] == "OK"):
-                            handle2_solved = True
-                            handle2_time = submission["creationTimeSeconds"]
-                except Exception as e:
-                    print(f"Error checking {handle2}: {str(e)}")
-            
-            # Check if we have a winner
-            if handle1_solved and handle2_solved:
-                # Both solved, compare times
-                if handle1_time < handle2_time:
-                    result = {
-                        "winner": handle1,
-                        "loser": handle2,
-                        "winner_time": handle1_time,
-                        "loser_time": handle2_time,
-                        "time_difference": handle2_time - handle1_time,
-                        "status": "both_solved",
-                        "match_id": tracking_id
-                    }
-                    publish_to_winner_queue({"match_id": tracking_id, "winner": handle1})
-                else:
-                    result = {
-                        "winner": handle2,
-                        "loser": handle1,
-                        "winner_time": handle2_time,
-                        "loser_time": handle1_time,
-                        "time_difference": handle1_time - handle2_time,
-                        "status": "both_solved",
-                        "match_id": tracking_id
-                    }
-                    publish_to_winner_queue({"match_id": tracking_id, "winner": handle2})
-                active_tracking[tracking_id] = result
-                # Clean up
-                if tracking_id in tracking_threads:
-                    del tracking_threads[tracking_id]
-                return result
-            elif handle1_solved:
-                result = {
-                    "winner": handle1,
-                    "loser": handle2,
-                    "winner_time": handle1_time,
-                    "loser_time": None,
-                    "status": "one_solved",
-                    "message": f"{handle2} has not solved the problem yet",
-                    "match_id": tracking_id
-                }
-                publish_to_winner_queue({"match_id": tracking_id, "winner": handle1})
-                active_tracking[tracking_id] = result
-                # Clean up
-                if tracking_id in tracking_threads:
-                    del tracking_threads[tracking_id]
-                return result
-            elif handle2_solved:
-                result = {
-                    "winner": handle2,
-                    "loser": handle1,
-                    "winner_time": handle2_time,
-                    "loser_time": None,
-                    "status": "one_solved",
-                    "message": f"{handle1} has not solved the problem yet",
-                    "match_id": tracking_id
-                }
-                publish_to_winner_queue({"match_id": tracking_id, "winner": handle2})
-                active_tracking[tracking_id] = result
-                # Clean up
-                if tracking_id in tracking_threads:
-                    del tracking_threads[tracking_id]
-                return result
-            
-            # Wait before polling again
-            time.sleep(poll_interval)
+async def async_check_handle(cursor, contest_id, problem_index, tenant=DEFAULT_TENANT):
+    """asyncio counterpart of check_handle using the shared aiohttp pool."""
+    try:
+        hedge = (contest_id, problem_index) in cursor.judging
+        return accepted_time(await async_cf_client.new_submissions(cursor, hedge, tenant), contest_id, problem_index)
+    except CircuitOpenError:
+        pass
     except Exception as e:
-        print(f"Error in tracking thread {tracking_id}: {str(e)}")
-        result = {
-            "error": str(e),
-            "status": "error",
-            "message": f"An error occurred while tracking: {str(e)}",
+        logs.error("Error checking handle", handle=cursor.handle, tenant=tenant, phase="poll", error=e)
+    return None
+
+def decide_winner(state, tracking_id):
+    """
+    Build the match result from the solved flags of a tracking state.
+
+    Returns:
+        tuple: (result, winner) or (None, None) if nobody has solved yet
+    """
+    handle1, handle2 = state["handle1"], state["handle2"]
+    handle1_time, handle2_time = state["handle1_time"], state["handle2_time"]
+
+    if state["handle1_solved"] and state["handle2_solved"]:
+        # Both solved, compare times
+        if handle1_time < handle2_time:
+            return {
+                "winner": handle1,
+                "loser": handle2,
+                "winner_time": handle1_time,
+                "loser_time": handle2_time,
+                "time_difference": handle2_time - handle1_time,
+                "status": "both_solved",
+                "match_id": tracking_id
+            }, handle1
+        return {
+            "winner": handle2,
+            "loser": handle1,
+            "winner_time": handle2_time,
+            "loser_time": handle1_time,
+            "time_difference": handle1_time - handle2_time,
+            "status": "both_solved",
             "match_id": tracking_id
-        }
-        active_tracking[tracking_id] = result
-        # Clean up
-        if tracking_id in tracking_threads:
-            del tracking_threads[tracking_id]
-        return result
+        }, handle2
+    elif state["handle1_solved"]:
+        return {
+            "winner": handle1,
+            "loser": handle2,
+            "winner_time": handle1_time,
+            "loser_time": None,
+            "status": "one_solved",
+            "message": f"{handle2} has not solved the problem yet",
+            "match_id": tracking_id
+        }, handle1
+    elif state["handle2_solved"]:
+        return {
+            "winner": handle2,
+            "loser": handle1,
+            "winner_time": handle2_time,
+            "loser_time": None,
+            "status": "one_solved",
+            "message": f"{handle1} has not solved the problem yet",
+            "match_id": tracking_id
+        }, handle2
+    return None, None
+
+def parse_problem_id(problem_id):
+    """Split "contestId/index" (or a longer path ending in it) into its two parts."""
+    return problem_id.split("/")[::-1][:2][::-1]
+
+def record_solve(state, key, solved_time):
+    """Mark a handle solved, unless its accepted submission was made after the match deadline."""
+    if solved_time is not None and (state["deadline"] is None or solved_time <= state["deadline"]):
+        state[f"{key}_solved"] = True
+        state[f"{key}_time"] = solved_time
+
+def record_activity(state, keys):
+    """Note the time if a poll of these handles found a new submission."""
+    if any(state["cursors"][key].idle_polls == 0 for key in keys):
+        state["active_at"] = time.time()
 
-def start_tracking(match_id, handle1, handle2, problem_id):
+def match_from_message(data, tenant=None):
+    """Tracking parameters of a match in the matches queue format; tenant applies when the match names none."""
+    if not isinstance(data, dict):
+        data = {}
+    return {
+        "match_id": data.get("match_id"),
+        "handle1": data.get("p1"),
+        "handle2": data.get("p2"),
+        "problem_id": data.get("cf_question"),
+        "level": data.get("level"),
+        "time_limit": data.get("time_limit"),
+        "tenant": data.get("tenant", tenant)
+    }
+
+def valid_time_limit(time_limit):
+    """A match time limit is either absent or a positive number of seconds."""
+    if time_limit is None:
+        return True
     try:
-        if not handle1 or not handle2 or not problem_id or not match_id:
-            print('missing parameters', handle1, handle2, problem_id, match_id)
-            return jsonify({"error": "Missing required parameters", "status": "error"}), 400
+        return float(time_limit) > 0
+    except (TypeError, ValueError):
+        return False
 
-        # print(f"Starting tracking for match {handle1} vs {handle2} on problem {problem_id}")
-        # Start tracking in a separate thread
-        def tracking_thread():
+def match_deadline(start_time, time_limit=None):
+    """Unix time a match started at start_time times out, or None if it never does."""
+    limit = float(time_limit) if time_limit is not None else MATCH_TIME_LIMIT
+    return start_time + limit if limit > 0 else None
+
+def start_matches(matches, validate=True):
+    """
+    Start tracking many matches at once, all or nothing: if any match is
+    invalid none are started. In a cluster each match goes to its owner.
+
+    Args:
+        matches (list): Match parameter dicts
+        validate (bool): Check the handles with Codeforces before starting;
+            if False they are checked in the background once polling has
+            started, and matches with unknown handles end with an error
+
+    Returns:
+        dict: Tracking id (or position) -> error, empty once all are tracked
+    """
+    errors = {}
+    seen = set()
+    tracked = []
+    for index, match in enumerate(matches):
+        key = match.get("match_id") or f"#{index}"
+        missing = [field for field in ("match_id", "handle1", "handle2", "problem_id") if not match.get(field)]
+        try:
+            tenant = tenant_of(match.get("tenant"))
+            check_match_id(tenant, match.get("match_id"))
+        except ValueError as e:
+            errors[key] = str(e)
+            continue
+        if not missing:
+            key = tenant_key(tenant, match["match_id"])
+        if missing:
+            errors[key] = f"Missing {', '.join(missing)}"
+        elif key in seen:
+            errors[key] = "Duplicate match_id"
+        elif not valid_time_limit(match.get("time_limit")):
+            errors[key] = "time_limit must be a positive number of seconds"
+        seen.add(key)
+        tracked.append(dict(match, match_id=key, tenant=tenant))
+    if errors:
+        return errors
+    matches = tracked
+
+    # Every handle of the round in one or two user.info calls
+    invalid = invalid_handles([match[key] for match in matches for key in ("handle1", "handle2")]) if validate else set()
+    for match in matches:
+        unknown = [handle for handle in (match["handle1"], match["handle2"]) if handle in invalid]
+        if unknown:
+            errors[match["match_id"]] = f"Unknown Codeforces handle(s): {', '.join(unknown)}"
+    if errors:
+        return errors
+
+    local = matches
+    if cluster is not None:
+        local, owned = [], {}
+        for match in matches:
+            owner = cluster.owner(match["match_id"])
+            if owner == NODE_ID:
+                local.append(match)
+            else:
+                owned.setdefault(owner, []).append(match)
+        for owner, owner_matches in owned.items():
             try:
-                check_problem_solution(handle1, handle2, problem_id, match_id)
+                cluster.post(owner, '/cluster/matches', {"matches": owner_matches, "check_handles": not validate})
             except Exception as e:
-                active_tracking[match_id] = {
-                    "error": str(e),
-                    "status": "error",
-                    "message": f"An error occurred in tracking thread: {str(e)}",
-                    "match_id": match_id
-                }
-        
-        thread = threading.Thread(target=tracking_thread)
-        thread.daemon = True
-        thread.start()
-        
-        active_tracking[match_id] = {
+                logs.warning("Could not hand matches to their owner, tracking them here", owner=owner,
+                             matches=len(owner_matches), phase="cluster", error=e)
+                local.extend(owner_matches)
+
+    # One start time and one critical section for the whole round
+    start_time = int(time.time())
+    with tracking_lock:
+        for match in local:
+            track_match(dict(match, start_time=start_time))
+    if not validate:
+        for match in local:
+            check_handles_later(match["match_id"], [match["handle1"], match["handle2"]])
+    return {}
+
+def invalid_handles(handles):
+    """
+    Handles Codeforces does not know. If Codeforces cannot be asked right
+    now nothing is rejected, and the matches are tracked unvalidated.
+    """
+    try:
+        resolved = handle_directory.resolve(handles)
+    except Exception as e:
+        logs.warning("Could not validate handles, tracking them unvalidated", handles=len(set(handles)), phase="validate", error=e)
+        return set()
+    return {handle for handle, canonical in resolved.items() if canonical is None}
+
+def check_handles_later(tracking_id, handles):
+    """Queue the handles of a match that is already being polled for the background check."""
+    with unchecked_lock:
+        unchecked[tracking_id] = handles
+    unchecked_ready.set()
+
+def check_handles_forever():
+    while True:
+        unchecked_ready.wait()
+        # Matches the backend sends one message at a time arrive together; their handles share one lookup
+        time.sleep(HANDLE_CHECK_DELAY)
+        unchecked_ready.clear()
+        with unchecked_lock:
+            batch = dict(unchecked)
+            unchecked.clear()
+        try:
+            check_tracked_handles(batch)
+        except Exception as e:
+            logs.error("Error checking handles", matches=len(batch), phase="validate", error=e)
+
+def check_tracked_handles(batch):
+    """
+    Check the handles of matches already being polled, in one or two
+    user.info calls. A match with an unknown handle ends with an error;
+    the others poll with the casing Codeforces reports.
+
+    Args:
+        batch (dict): Tracking id -> its handles
+    """
+    invalid = invalid_handles([handle for handles in batch.values() for handle in handles])
+    for tracking_id, handles in batch.items():
+        unknown = [handle for handle in handles if handle in invalid]
+        if unknown:
+            if end_match(tracking_id, "error", f"Unknown Codeforces handle(s): {', '.join(unknown)}") is not None:
+                logs.warning("Rejected match: unknown Codeforces handle(s)", match=tracking_id, handles=unknown, phase="validate")
+            continue
+        with tracking_lock:
+            state = match_states.get(tracking_id)
+            if state is not None and state["mode"] == "user":
+                for key in ("handle1", "handle2"):
+                    state["cursors"][key].handle = handle_directory.canonical(state[key])
+
+def forward_match(owner, match):
+    """Hand a match from the queue to the node that owns it. Returns False if that node could not take it."""
+    try:
+        cluster.post(owner, '/cluster/matches', {"matches": [match], "check_handles": True})
+        return True
+    except Exception as e:
+        logs.warning("Could not hand a match to its owner, tracking it here", match=match["match_id"], owner=owner,
+                     phase="cluster", error=e)
+        return False
+
+def tracking_error(tracking_id, e):
+    logs.error("Error in tracking", match=tracking_id, phase="poll", error=e)
+    state = match_states.get(tracking_id)
+    result = with_tenant({
+        "error": str(e),
+        "status": "error",
+        "message": f"An error occurred while tracking: {str(e)}",
+        "match_id": tracking_id
+    }, state["tenant"] if state is not None else DEFAULT_TENANT)
+    log_state("result", tracking_id, result=result, winner=None)
+    tracking_registry.put(tracking_id, result)
+    return result
+
+def with_tenant(data, tenant):
+    """Tag a status or message with its tenant; the default tenant's stay as they always were."""
+    if tenant != DEFAULT_TENANT:
+        data["tenant"] = tenant
+    return data
+
+def winner_message(tracking_id, winner, tenant, **fields):
+    """winners queue message of a match, under the match id its tenant sent."""
+    return with_tenant({"match_id": local_id(tenant, tracking_id), "winner": winner, **fields}, tenant)
+
+def log_state(op, match_id, **fields):
+    if state_log is not None:
+        state_log.append(op, match_id, **fields)
+
+def log_cursor_progress(tracking_id, state):
+    """Append a cursor record for every handle whose cursor moved since it was last logged."""
+    for key, cursor in state["cursors"].items():
+        position = (cursor.last_id, sorted(cursor.pending))
+        if cursor.last_id is not None and state["logged_cursors"].get(key) != position:
+            state["logged_cursors"][key] = position
+            log_state("cursor", tracking_id, key=key, last_id=position[0], pending=position[1])
+
+def claim_result(tracking_id):
+    """
+    Decide a match under the tracking lock, so that when both the match poll
+    and its contest feed see the solve only one of them publishes it.
+
+    Returns:
+        tuple: (result, winner) or (None, None) if undecided or already claimed
+    """
+    with tracking_lock:
+        state = match_states.get(tracking_id)
+        if state is None or state.get("decided"):
+            return None, None
+        result, winner = decide_winner(state, tracking_id)
+        if result is not None:
+            state["decided"] = True
+            with_tenant(result, state["tenant"])
+        return result, winner
+
+def publish_result(tracking_id, result, winner):
+    started = time.perf_counter()
+    log_state("result", tracking_id, result=result, winner=winner)
+    if result.get("winner_time") is not None:
+        winner_times[tracking_id] = result["winner_time"]
+    tenant = result.get("tenant", DEFAULT_TENANT)
+    try:
+        publish_to_winner_queue(winner_message(tracking_id, winner, tenant))
+        tracking_registry.put(tracking_id, result)
+        event_bus.publish("winner", with_tenant({"match_id": tracking_id, "winner": winner}, tenant))
+        return result
+    except Exception as e:
+        winner_times.pop(tracking_id, None)
+        return tracking_error(tracking_id, e)
+    finally:
+        PUBLISH_PHASE.observe(time.perf_counter() - started)
+
+def winner_published(message):
+    """Record a broker-confirmed winner and how long it took to detect."""
+    tracking_id = tenant_key(message.get("tenant", DEFAULT_TENANT), message["match_id"])
+    log_state("published", tracking_id)
+    winner_time = winner_times.pop(tracking_id, None)
+    if winner_time is not None:
+        DETECTION_SECONDS.observe(max(time.time() - winner_time, 0))
+
+def check_problem_solution(tracking_id):
+    """
+    Run one poll cycle against the Codeforces API for a tracked match.
+    Checks every submission each user made since the previous cycle.
+
+    Args:
+        tracking_id (str): Unique tracking identifier
+
+    Returns:
+        dict: Result containing winner and timing information, or None if
+            nobody has solved the problem yet
+    """
+    state = match_states[tracking_id]
+    try:
+        contest_id, problem_index = parse_problem_id(state["problem_id"])
+        state["checked_at"] = int(time.time())
+
+        expired = past_deadline(state)
+        due = due_handles(tracking_id, state, every=expired)
+        for key in due:
+            record_solve(state, key, check_handle(state["cursors"][key], contest_id, problem_index, state["tenant"]))
+        rivals = rivals_to_confirm(state, due)
+        for key in rivals:
+            record_solve(state, key, check_handle(state["cursors"][key], contest_id, problem_index, state["tenant"]))
+        record_activity(state, due + rivals)
+        log_cursor_progress(tracking_id, state)
+
+        # Check if we have a winner
+        result, winner = claim_result(tracking_id)
+        if result is None:
+            return expire_match(tracking_id) if expired else None
+        return publish_result(tracking_id, result, winner)
+    except Exception as e:
+        return tracking_error(tracking_id, e)
+
+async def async_check_problem_solution(tracking_id):
+    """
+    asyncio counterpart of check_problem_solution. Both handles are polled
+    concurrently over the shared connection pool.
+    """
+    state = match_states[tracking_id]
+    try:
+        contest_id, problem_index = parse_problem_id(state["problem_id"])
+        state["checked_at"] = int(time.time())
+
+        expired = past_deadline(state)
+        pending = due_handles(tracking_id, state, every=expired)
+        solved_times = await asyncio.gather(
+            *(async_check_handle(state["cursors"][key], contest_id, problem_index, state["tenant"]) for key in pending)
+        )
+        for key, solved_time in zip(pending, solved_times):
+            record_solve(state, key, solved_time)
+        rivals = rivals_to_confirm(state, pending)
+        solved_times = await asyncio.gather(
+            *(async_check_handle(state["cursors"][key], contest_id, problem_index, state["tenant"]) for key in rivals)
+        )
+        for key, solved_time in zip(rivals, solved_times):
+            record_solve(state, key, solved_time)
+        record_activity(state, pending + rivals)
+        log_cursor_progress(tracking_id, state)
+
+        # Check if we have a winner
+        result, winner = claim_result(tracking_id)
+        if result is None:
+            return expire_match(tracking_id) if expired else None
+
+        return publish_result(tracking_id, result, winner)
+    except Exception as e:
+        return tracking_error(tracking_id, e)
+
+def feed_key(group_id):
+    """Scheduler / governor key of a contest feed."""
+    return f"{FEED_KEY_PREFIX}{group_id}"
+
+def submission_handles(submission):
+    return {member["handle"].lower() for member in submission.get("author", {}).get("members", [])}
+
+def feed_is_decisive(group):
+    """Whether a verdict is pending on a problem some match of a contest feed tracks."""
+    judging = group["cursor"].judging
+    return bool(judging) and any(
+        match_states[tracking_id]["problem"] in judging
+        for tracking_id in list(group["match_ids"]) if tracking_id in match_states
+    )
+
+def apply_contest_submissions(group_id, submissions):
+    """
+    Fan new submissions from a contest feed out to every match of the group.
+
+    Returns:
+        list: (tracking_id, result, winner) for each match decided by them
+    """
+    with tracking_lock:
+        members = list(contest_groups[group_id]["match_ids"]) if group_id in contest_groups else []
+
+    decided = []
+    for tracking_id in members:
+        state = match_states.get(tracking_id)
+        if state is None:
+            continue
+        contest_id, problem_index = parse_problem_id(state["problem_id"])
+        since = state["start_time"] - CURSOR_START_GRACE
+        for key in ("handle1", "handle2"):
+            if not state[f"{key}_solved"]:
+                handle = state[key].lower()
+                own = [
+                    submission for submission in submissions
+                    if submission.get("creationTimeSeconds", 0) >= since and handle in submission_handles(submission)
+                ]
+                record_solve(state, key, accepted_time(own, contest_id, problem_index))
+                if own:
+                    state["active_at"] = time.time()
+        result, winner = claim_result(tracking_id)
+        if result is not None:
+            decided.append((tracking_id, result, winner))
+    return decided
+
+def check_contest_feed(group_id):
+    """Poll a contest feed once and return the matches it decided."""
+    group = contest_groups[group_id]
+    group["checked_at"] = int(time.time())
+    try:
+        submissions = cf_client.new_contest_submissions(
+            group["contest_id"], group["cursor"], feed_is_decisive(group), group["tenant"]
+        )
+    except CircuitOpenError:
+        return []
+    except Exception as e:
+        logs.error("Error checking contest", contest=group_id, phase="feed", error=e)
+        return []
+    return apply_contest_submissions(group_id, submissions)
+
+async def async_check_contest_feed(group_id):
+    """asyncio counterpart of check_contest_feed."""
+    group = contest_groups[group_id]
+    group["checked_at"] = int(time.time())
+    try:
+        submissions = await async_cf_client.new_contest_submissions(
+            group["contest_id"], group["cursor"], feed_is_decisive(group), group["tenant"]
+        )
+    except CircuitOpenError:
+        return []
+    except Exception as e:
+        logs.error("Error checking contest", contest=group_id, phase="feed", error=e)
+        return []
+    return apply_contest_submissions(group_id, submissions)
+
+def choose_strategy(group_id):
+    """
+    Pick how the matches on a contest are polled. One contest.status call
+    covers every handle on the contest, so it wins once enough handles share
+    it, unless the contest is busy enough that keeping its feed current
+    takes as many pages on average as there are handles. Each tenant polls
+    its own feed, paid from its own budget. Must hold tracking_lock.
+    """
+    group = contest_groups[group_id]
+    handles = 2 * len(group["match_ids"])
+    feed_pages = group["cursor"].avg_pages if group["cursor"] is not None else 1
+    use_feed = CONTEST_FEED_MIN_HANDLES > 0 and handles >= CONTEST_FEED_MIN_HANDLES and feed_pages < handles
+
+    key = feed_key(group_id)
+    if use_feed and group["mode"] != "feed":
+        # Start the feed from the oldest point any member has not been checked past
+        since = min(match_states[m].get("checked_at") or match_states[m]["start_time"] for m in group["match_ids"])
+        group["cursor"] = SubmissionCursor(None, since=since - CURSOR_START_GRACE)
+        group["mode"] = "feed"
+        for tracking_id in group["match_ids"]:
+            match_states[tracking_id]["mode"] = "feed"
+            poll_scheduler.cancel(tracking_id)
+            rate_governor.register(tracking_id, 0, group["tenant"])
+            rate_governor.set_demand(tracking_id, 0)
+        poll_scheduler.schedule(key)
+    elif not use_feed and group["mode"] == "feed":
+        since = group.get("checked_at") or int(time.time())
+        group["mode"] = "user"
+        poll_scheduler.cancel(key)
+        rate_governor.unregister(key)
+        for tracking_id in group["match_ids"]:
+            state = match_states[tracking_id]
+            state["mode"] = "user"
+            for handle_key in ("handle1", "handle2"):
+                state["cursors"][handle_key] = SubmissionCursor(
+                    handle_directory.canonical(state[handle_key]), since=since - CURSOR_START_GRACE
+                )
+            rate_governor.register(tracking_id, state["weight"], group["tenant"])
+            poll_scheduler.schedule(tracking_id)
+
+    if group["mode"] == "feed":
+        rate_governor.register(key, sum(match_states[m]["weight"] for m in group["match_ids"]), group["tenant"])
+
+def join_contest_group(tracking_id, state):
+    """Must hold tracking_lock."""
+    group = contest_groups.setdefault(state["group"], {
+        "contest_id": state["contest_id"], "tenant": state["tenant"], "match_ids": set(), "cursor": None, "mode": "user"
+    })
+    group["match_ids"].add(tracking_id)
+    state["mode"] = group["mode"]
+    if state["mode"] == "feed":
+        # The contest feed already covers this match, it has no budget of its own
+        rate_governor.register(tracking_id, 0, state["tenant"])
+    choose_strategy(state["group"])
+
+def leave_contest_group(tracking_id, state):
+    """Must hold tracking_lock."""
+    group_id = state.get("group")
+    group = contest_groups.get(group_id)
+    if group is None:
+        return
+    group["match_ids"].discard(tracking_id)
+    if group["match_ids"]:
+        choose_strategy(group_id)
+        return
+    poll_scheduler.cancel(feed_key(group_id))
+    rate_governor.unregister(feed_key(group_id))
+    del contest_groups[group_id]
+
+def finish_match(tracking_id):
+    """Stop polling a match that has a result."""
+    with tracking_lock:
+        state = match_states.pop(tracking_id, None)
+        rate_governor.unregister(tracking_id)
+        if state is not None:
+            leave_contest_group(tracking_id, state)
+
+def end_match(tracking_id, status, message):
+    """
+    Stop tracking an undecided match without a winner, freeing its scheduler
+    entry, cursors and budget share, and record why it ended.
+
+    Returns:
+        dict: The recorded status, or None if the match is not tracked here
+            or already decided
+    """
+    with tracking_lock:
+        state = match_states.get(tracking_id)
+        if state is None or state.get("decided"):
+            return None
+        # A poll still in flight finds the match decided and drops what it saw
+        state["decided"] = True
+        poll_scheduler.cancel(tracking_id)
+    result = with_tenant({
+        "status": status,
+        "handle1": state["handle1"],
+        "handle2": state["handle2"],
+        "problem_id": state["problem_id"],
+        "match_id": tracking_id,
+        "start_time": state["start_time"],
+        "message": message
+    }, state["tenant"])
+    log_state("result", tracking_id, result=result, winner=None)
+    tracking_registry.put(tracking_id, result)
+    finish_match(tracking_id)
+    return result
+
+def past_deadline(state):
+    return state["deadline"] is not None and state["deadline"] <= time.time()
+
+def expire_match(tracking_id):
+    """
+    End a match with the configured timeout outcome once its final poll,
+    made after the deadline, found no accepted submission made before it.
+    While a handle still has a submission on the problem being judged the
+    match is left for a later poll, for up to TIMEOUT_VERDICT_GRACE seconds.
+
+    Returns:
+        dict: The timeout status, or None if the match is still tracked or
+            was not tracked here
+    """
+    state = match_states.get(tracking_id)
+    if state is None:
+        return None
+    judging = any(
+        state["problem"] in state["cursors"][key].judging
+        for key in ("handle1", "handle2") if not state[f"{key}_solved"]
+    )
+    if judging and time.time() < state["deadline"] + TIMEOUT_VERDICT_GRACE:
+        return None
+    result = end_match(tracking_id, "timeout", "Nobody solved the problem within the time limit")
+    if result is None:
+        return None
+    logs.info("Timed out match", match=tracking_id, phase="reap")
+    if TIMEOUT_OUTCOME == 'notify':
+        publish_to_winner_queue(winner_message(tracking_id, None, result.get("tenant", DEFAULT_TENANT), status="timeout"))
+    return result
+
+def reap_matches():
+    """
+    Give every match past its deadline a final poll of both handles, which
+    decides it if either solved in time and times it out otherwise. It runs
+    on the poll scheduler, never alongside another poll of the same match.
+
+    Returns:
+        list: Ids of the matches past their deadline
+    """
+    now = time.time()
+    expired = [
+        tracking_id for tracking_id, state in list(match_states.items())
+        if state["deadline"] is not None and state["deadline"] <= now and not state.get("decided")
+    ]
+    for tracking_id in expired:
+        poll_scheduler.schedule(tracking_id)
+    return expired
+
+def reap_forever():
+    while True:
+        time.sleep(REAPER_INTERVAL)
+        if fenced():
+            continue
+        try:
+            reap_matches()
+        except Exception as e:
+            logs.error("Error reaping matches", phase="reap", error=e)
+
+def stale_matches():
+    """Matches still being polled although neither handle has submitted for STALE_MATCH_AFTER seconds."""
+    cutoff = time.time() - STALE_MATCH_AFTER
+    return [tracking_id for tracking_id, state in list(match_states.items()) if state["active_at"] < cutoff]
+
+def match_demand(tracking_id):
+    """Codeforces calls per second spent on a match; a feed's calls are shared by its matches."""
+    state = match_states.get(tracking_id)
+    if state is None or state["mode"] != "feed":
+        return rate_governor.demand([tracking_id])
+    group = contest_groups.get(state["group"])
+    if not group:
+        return 0
+    return rate_governor.demand([feed_key(state["group"])]) / len(group["match_ids"])
+
+def stale_capacity():
+    """How much of the Codeforces budget stale matches are using."""
+    stale = stale_matches()
+    calls = sum(match_demand(tracking_id) for tracking_id in stale)
+    return {
+        "matches": len(stale),
+        "calls_per_second": round(calls, 3),
+        "budget_share": round(calls / rate_governor.rate, 3)
+    }
+
+def due_handles(tracking_id, state, every=False):
+    """Unsolved handle keys of a match whose next poll is due (all of them with every), marked as polled now."""
+    now = time.monotonic()
+    due = [key for key in ("handle1", "handle2") if not state[f"{key}_solved"] and (every or state["due"][key] <= now)]
+    for key in due:
+        state["polled"][key] = now
+    if due:
+        rate_governor.record_poll(tracking_id)
+    return due
+
+def rivals_to_confirm(state, polled):
+    """
+    Unsolved handles that were not polled this cycle although one that was
+    is now solved, marked as polled now. A backed-off handle may hold an
+    earlier accepted submission that was not seen yet, so it is polled
+    before the match is decided.
+    """
+    if not any(state[f"{key}_solved"] for key in polled):
+        return []
+    now = time.monotonic()
+    rivals = [key for key in ("handle1", "handle2") if key not in polled and not state[f"{key}_solved"]]
+    for key in rivals:
+        state["polled"][key] = now
+    return rivals
+
+def cursor_interval(cursor, decisive, weight):
+    """
+    Preferred seconds between polls of a cursor: fast while a submission on
+    a tracked problem is being judged, doubling for every poll after the
+    first that found nothing new, up to MAX_POLL_INTERVAL.
+    """
+    if decisive:
+        return FAST_POLL_INTERVAL
+    base = rate_governor.min_interval / weight
+    return min(base * 2 ** max(cursor.idle_polls - 1, 0), max(MAX_POLL_INTERVAL, base))
+
+def handle_interval(state, key):
+    """Preferred seconds between polls of one handle of a match."""
+    cursor = state["cursors"][key]
+    return cursor_interval(cursor, state["problem"] in cursor.judging, state["weight"])
+
+def next_poll_delay(tracking_id, result):
+    """Finish a decided match or return the delay until its next poll (None when done)."""
+    if result is not None:
+        finish_match(tracking_id)
+        return None
+
+    state = match_states.get(tracking_id)
+    if state is None or state.get("decided") or state["mode"] != "user":
+        # Finished or handed over to a contest feed
+        return None
+    now = time.monotonic()
+    unsolved = [key for key in ("handle1", "handle2") if not state[f"{key}_solved"]]
+    intervals = {key: handle_interval(state, key) for key in unsolved}
+    rate_governor.set_demand(tracking_id, sum(1 / max(interval, 0.001) for interval in intervals.values()))
+    for key, interval in intervals.items():
+        # Re-paced on every wake-up, so a handle that backed off follows the budget as it frees up
+        state["due"][key] = state["polled"][key] + rate_governor.paced(interval, tracking_id)
+    next_due = min((state["due"][key] for key in unsolved), default=now + POLL_INTERVAL)
+    # Wake up at least every MAX_POLL_INTERVAL to re-pace; a wake-up with nothing due makes no calls
+    return min(max(next_due - now, 0), MAX_POLL_INTERVAL)
+
+def next_feed_delay(group_id, decided):
+    """Finish the matches a feed poll decided and return the delay until the next one."""
+    key = feed_key(group_id)
+    rate_governor.record_poll(key)
+    for tracking_id, _, _ in decided:
+        finish_match(tracking_id)
+
+    with tracking_lock:
+        group = contest_groups.get(group_id)
+        if group is None:
+            return None
+        for tracking_id in group["match_ids"]:
+            rate_governor.record_poll(tracking_id)
+        choose_strategy(group_id)
+        if group["mode"] != "feed":
+            return None
+        pages = group["cursor"].count
+        # Paced like the handles it stands in for, as fast as its most important match
+        weight = max(match_states[tracking_id]["weight"] for tracking_id in group["match_ids"])
+        interval = cursor_interval(group["cursor"], feed_is_decisive(group), weight)
+    rate_governor.set_demand(key, pages / interval)
+    return rate_governor.paced(interval, key)
+
+def poll_contest_feed(group_id):
+    if group_id not in contest_groups:
+        return None
+    decided = check_contest_feed(group_id)
+    for tracking_id, result, winner in decided:
+        publish_result(tracking_id, result, winner)
+    return next_feed_delay(group_id, decided)
+
+async def async_poll_contest_feed(group_id):
+    if group_id not in contest_groups:
+        return None
+    decided = await async_check_contest_feed(group_id)
+    for tracking_id, result, winner in decided:
+        publish_result(tracking_id, result, winner)
+    return next_feed_delay(group_id, decided)
+
+def tenant_backlog(tracking_id):
+    """
+    Seconds until the tenant of a match or contest feed may call Codeforces
+    again. A poll due while its tenant is over budget is put back for that
+    long instead of holding a worker while it waits its turn.
+    """
+    if tracking_id.startswith(FEED_KEY_PREFIX):
+        owner = contest_groups.get(tracking_id[len(FEED_KEY_PREFIX):])
+    else:
+        owner = match_states.get(tracking_id)
+    return rate_governor.tenant_wait(owner["tenant"]) if owner is not None else 0
+
+def fenced():
+    """Whether this process's standby may have taken over its matches, so it must not poll, publish or consume."""
+    return replication_server is not None and replication_server.fenced()
+
+def poll_match(tracking_id):
+    """Scheduler entry point: poll a match or contest feed once and return the delay until the next poll."""
+    if fenced():
+        return STANDBY_LEASE_TTL
+    backlog = tenant_backlog(tracking_id)
+    if backlog > 0:
+        return backlog
+    started = time.perf_counter()
+    if tracking_id.startswith(FEED_KEY_PREFIX):
+        delay = poll_contest_feed(tracking_id[len(FEED_KEY_PREFIX):])
+        POLL_SECONDS.labels("feed").observe(time.perf_counter() - started)
+        return delay
+    if tracking_id not in match_states:
+        return None
+    result = check_problem_solution(tracking_id)
+    POLL_SECONDS.labels("match").observe(time.perf_counter() - started)
+    return next_poll_delay(tracking_id, result)
+
+async def async_poll_match(tracking_id):
+    """AsyncPollEngine entry point, same contract as poll_match."""
+    if fenced():
+        return STANDBY_LEASE_TTL
+    backlog = tenant_backlog(tracking_id)
+    if backlog > 0:
+        return backlog
+    started = time.perf_counter()
+    if tracking_id.startswith(FEED_KEY_PREFIX):
+        delay = await async_poll_contest_feed(tracking_id[len(FEED_KEY_PREFIX):])
+        POLL_SECONDS.labels("feed").observe(time.perf_counter() - started)
+        return delay
+    if tracking_id not in match_states:
+        return None
+    result = await async_check_problem_solution(tracking_id)
+    POLL_SECONDS.labels("match").observe(time.perf_counter() - started)
+    return next_poll_delay(tracking_id, result)
+
+def register_match(match_id, handle1, handle2, problem_id, level=None, start_time=None, cursors=None, deadline=None,
+                   tenant=DEFAULT_TENANT):
+    """
+    Create the polling state of a match and hand it to the scheduler.
+
+    Args:
+        match_id (str): Tracking id, namespaced by tenant_key
+        start_time (int): Unix time the match started, now if None
+        cursors (dict): Saved cursor positions per handle key, when resuming
+        deadline (float): Unix time the match times out, None for no limit
+        tenant (str): Tenant whose budget the match is polled from
+    """
+    if start_time is None:
+        start_time = int(time.time())
+    problem_parts = parse_problem_id(problem_id)
+    contest_id = problem_parts[0] if len(problem_parts) == 2 else None
+    state = {
+        "handle1": handle1,
+        "handle2": handle2,
+        "problem_id": problem_id,
+        "contest_id": contest_id,
+        "problem": tuple(problem_parts),
+        "level": level,
+        "tenant": tenant,
+        # Matches share a contest feed only within their tenant
+        "group": tenant_key(tenant, contest_id) if contest_id is not None else None,
+        "start_time": start_time,
+        "deadline": deadline,
+        # Unix time either handle last made a submission, for stale match accounting
+        "active_at": start_time,
+        "weight": match_weight(local_id(tenant, match_id), level),
+        "mode": "user",
+        "handle1_solved": False,
+        "handle2_solved": False,
+        "handle1_time": None,
+        "handle2_time": None,
+        # Monotonic times each handle was last polled and is next due
+        "polled": {"handle1": 0, "handle2": 0},
+        "due": {"handle1": 0, "handle2": 0},
+        # Submissions made before the match started don't count
+        "cursors": {
+            "handle1": SubmissionCursor(handle_directory.canonical(handle1), since=start_time - CURSOR_START_GRACE),
+            "handle2": SubmissionCursor(handle_directory.canonical(handle2), since=start_time - CURSOR_START_GRACE)
+        },
+        "logged_cursors": {}
+    }
+    for key, saved in (cursors or {}).items():
+        cursor = state["cursors"][key]
+        cursor.last_id = saved["last_id"]
+        cursor.pending = set(saved.get("pending", []))
+        state["logged_cursors"][key] = (cursor.last_id, sorted(cursor.pending))
+
+    with tracking_lock:
+        previous = match_states.pop(match_id, None)
+        if previous is not None:
+            leave_contest_group(match_id, previous)
+        match_states[match_id] = state
+        tracking_registry.put(match_id, with_tenant({
             "status": "tracking",
             "handle1": handle1,
             "handle2": handle2,
             "problem_id": problem_id,
-            "match_id": match_id
-        }
-        
-        return jsonify({
-            "tracking_id": match_id,
+            "match_id": match_id,
+            "start_time": start_time,
+            "deadline": deadline
+        }, tenant), round=match_round(local_id(tenant, match_id), level))
+        rate_governor.register(match_id, state["weight"], tenant)
+        if state["group"] is not None:
+            join_contest_group(match_id, state)
+
+        # Hand the match to the shared poll scheduler instead of a dedicated thread
+        if state["mode"] == "user":
+            poll_scheduler.schedule(match_id)
+    return state
+
+def start_tracking(match_id, handle1, handle2, problem_id, level=None, time_limit=None, tenant=DEFAULT_TENANT):
+    try:
+        if not handle1 or not handle2 or not problem_id or not match_id:
+            logs.warning("Missing parameters", match=match_id, handle1=handle1, handle2=handle2, problem=problem_id)
+            return jsonify({"error": "Missing required parameters", "status": "error"}), 400
+        if not valid_time_limit(time_limit):
+            return jsonify({"error": "time_limit must be a positive number of seconds", "status": "error"}), 400
+        try:
+            check_match_id(tenant, match_id)
+        except ValueError as e:
+            return jsonify({"error": str(e), "status": "error"}), 400
+
+        tracking_id = tenant_key(tenant, match_id)
+        response = with_tenant({
+            "tracking_id": tracking_id,
             "match_id": match_id,
             "status": "started",
             "message": f"Now tracking {handle1} vs {handle2} for problem {problem_id}"
-        })
+        }, tenant)
+        current = match_states.get(tracking_id)
+        if current is not None and (current["handle1"], current["handle2"], current["problem_id"]) == (handle1, handle2, problem_id):
+            # Redelivered message for a match we already track, keep its progress
+            return jsonify(response)
+
+        # print(f"Starting tracking for match {handle1} vs {handle2} on problem {problem_id}")
+        start_time = int(time.time())
+        deadline = match_deadline(start_time, time_limit)
+        log_state("start", tracking_id, handle1=handle1, handle2=handle2, problem_id=problem_id,
+                  level=level, start_time=start_time, deadline=deadline, tenant=tenant)
+        register_match(tracking_id, handle1, handle2, problem_id, level, start_time, deadline=deadline, tenant=tenant)
+
+        return jsonify(response)
     except Exception as e:
         # print(e)
         return {
@@ -299,18 +1300,198 @@ def start_tracking(match_id, handle1, handle2, problem_id):
             "message": f"An error occurred: {str(e)}"
         }, 500
 
+def tracking_changed(match_id, data):
+    """Registry hook: stream the change and replicate it to the rest of the cluster."""
+    event_bus.publish("tracking", data)
+    if cluster is not None:
+        announce_status(match_id, data)
+
+def announce_status(match_id, data):
+    """Record a status of a match tracked here in the cluster catalog and send it to the other nodes."""
+    state = match_states.get(match_id)
+    item = {"match_id": match_id, "data": {**data, "node": NODE_ID, "level": state["level"] if state else None}}
+    catalog_put(item)
+    cluster.broadcast('/cluster/sync', item)
+
+def catalog_put(item):
+    data = item["data"]
+    current = cluster_catalog.get(item["match_id"])
+    if current is not None and current.get("status") in FINISHED_STATUSES and data.get("status") not in FINISHED_STATUSES:
+        # A late update from a node that handed the match over; the result stands
+        return
+    tenant = data.get("tenant") or DEFAULT_TENANT
+    cluster_catalog.put(item["match_id"], data, round=match_round(local_id(tenant, item["match_id"]), data.get("level")))
+
+def track_match(match):
+    """
+    Track a match from a parameter dict, keeping its start time and cursor
+    positions when given (a match handed over by another node, or inherited
+    from a node that left). A match already tracked here is left as is.
+    """
+    match_id = match["match_id"]
+    current = match_states.get(match_id)
+    if current is not None and (current["handle1"], current["handle2"], current["problem_id"]) == (match["handle1"], match["handle2"], match["problem_id"]):
+        # Already tracked here; make sure the other nodes know it
+        data = tracking_registry.get(match_id)
+        if data is not None and cluster is not None:
+            announce_status(match_id, data)
+        return
+    start_time = match.get("start_time") or int(time.time())
+    deadline = match["deadline"] if "deadline" in match else match_deadline(start_time, match.get("time_limit"))
+    tenant = match.get("tenant") or DEFAULT_TENANT
+    log_state("start", match_id, handle1=match["handle1"], handle2=match["handle2"], problem_id=match["problem_id"],
+              level=match.get("level"), start_time=start_time, deadline=deadline, tenant=tenant)
+    register_match(match_id, match["handle1"], match["handle2"], match["problem_id"], match.get("level"),
+                   start_time, match.get("cursors"), deadline, tenant)
+
+def release_match(tracking_id):
+    """Stop polling a match another node has taken over, without recording a result."""
+    with tracking_lock:
+        poll_scheduler.cancel(tracking_id)
+        finish_match(tracking_id)
+    tracking_registry.remove(tracking_id)
+    log_state("release", tracking_id)
+    event_bus.publish("released", {"match_id": tracking_id, "node": cluster.owner(tracking_id)})
+
+def handoff_payload(tracking_id, state):
+    return {
+        "match_id": tracking_id,
+        "handle1": state["handle1"],
+        "handle2": state["handle2"],
+        "problem_id": state["problem_id"],
+        "level": state["level"],
+        "tenant": state["tenant"],
+        "start_time": state["start_time"],
+        "deadline": state["deadline"],
+        "cursors": {
+            key: {"last_id": cursor.last_id, "pending": sorted(cursor.pending)}
+            for key, cursor in state["cursors"].items() if cursor.last_id is not None
+        }
+    }
+
+def rebalance(joined, left):
+    """
+    Membership hook: hand matches that now hash to another node over to it,
+    take over unfinished matches of nodes that left, and send new members
+    this node's statuses.
+    """
+    handoffs = {}
+    with tracking_lock:
+        for tracking_id, state in match_states.items():
+            owner = cluster.owner(tracking_id)
+            if owner != NODE_ID and not state.get("decided"):
+                handoffs.setdefault(owner, []).append(handoff_payload(tracking_id, state))
+
+    handed_off = 0
+    for owner, matches in handoffs.items():
+        try:
+            cluster.post(owner, '/cluster/matches', {"matches": matches})
+        except Exception as e:
+            logs.warning("Could not hand matches to their owner", owner=owner, matches=len(matches), phase="cluster", error=e)
+            continue
+        for match in matches:
+            release_match(match["match_id"])
+        handed_off += len(matches)
+
+    adopted = 0
+    if left:
+        for record in cluster_catalog.without_status(*FINISHED_STATUSES):
+            if record.data.get("node") in left and cluster.is_local(record.match_id):
+                track_match(record.data)
+                adopted += 1
+
+    if joined:
+        for match_id, data in tracking_registry.snapshot().items():
+            announce_status(match_id, data)
+    logs.info("Rebalanced cluster", handed_off=handed_off, adopted=adopted, phase="cluster")
+
+def cluster_authorized():
+    return not CLUSTER_TOKEN or hmac.compare_digest(request.headers.get('X-Cluster-Token', ''), CLUSTER_TOKEN)
+
+def debug_authorized():
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(request.headers.get('X-Debug-Token', ''), DEBUG_TOKEN)
+
+def phase_summary():
+    """Calls, total and mean seconds of each poll phase since the process started."""
+    phases = {}
+    for (phase,), (count, total) in POLL_PHASE_SECONDS.totals().items():
+        phases[phase] = {"count": count, "seconds": round(total, 6), "mean": round(total / count, 6) if count else None}
+    return phases
+
+def recover_tracking(replicated=None):
+    """
+    Resume tracking from the state log after a restart, or from the state a
+    standby replicated from its primary. Winners the broker already
+    confirmed are not published again.
+    """
+    if state_log is None and replicated is None:
+        return
+    started = time.perf_counter()
+    if replicated is not None:
+        state = replicated
+        if state_log is not None:
+            state_log.restore(state)
+    else:
+        state = state_log.load()
+
+    for match_id, saved in state["results"].items():
+        tracking_registry.put(match_id, saved["result"])
+        if not saved["published"]:
+            # Decided before the restart but never confirmed by the broker
+            publish_to_winner_queue(winner_message(match_id, saved["winner"], saved["result"].get("tenant", DEFAULT_TENANT)))
+    for match_id, saved in state["matches"].items():
+        register_match(match_id, saved["handle1"], saved["handle2"], saved["problem_id"],
+                       saved.get("level"), saved["start_time"], saved["cursors"], saved.get("deadline"),
+                       saved.get("tenant") or DEFAULT_TENANT)
+
+    if state_log is not None:
+        state_log.start()
+    elapsed = (time.perf_counter() - started) * 1000
+    logs.info("Recovered tracking state", tracked=len(state["matches"]), decided=len(state["results"]),
+              elapsed_ms=round(elapsed, 1), phase="recover")
+
 @app.route('/check_status/<tracking_id>', methods=['GET'])
-def check_status(tracking_id):
+@app.route('/tenants/<tenant>/check_status/<tracking_id>', methods=['GET'])
+def check_status(tracking_id, tenant=None):
+    """
+    Status of one match, by tracking id or by a tenant's own match id. With
+    ?wait=<seconds> an unfinished match is held open until its status
+    changes (or the wait runs out); pass the X-Event-Id of the previous
+    response as ?last_event_id= to not miss a change between calls.
+    """
     try:
-        if tracking_id not in active_tracking:
+        if tenant is not None:
+            try:
+                tracking_id = tenant_key(tenant_of(tenant), tracking_id)
+            except ValueError as e:
+                return jsonify({"error": str(e), "status": "error"}), 400
+        last_event_id = request.args.get('last_event_id', type=int)
+        if last_event_id is None:
+            last_event_id = event_bus.last_id
+
+        # The registry guarantees match_id is included in every record
+        result = tracking_registry.get(tracking_id)
+        if result is None and cluster is not None and PROCESS_ROLE == 'api':
+            # The engine knows the rest of the cluster
+            return forward_to_engine()
+        if result is None and cluster is not None and not request.headers.get('X-Cluster-Forwarded'):
+            return cluster_status(tracking_id)
+        if result is None:
             return jsonify({"error": "Invalid tracking ID", "status": "error"}), 404
-        
-        result = active_tracking[tracking_id]
-        # Make sure match_id is included in the response
-        if isinstance(result, dict) and "match_id" not in result:
-            result["match_id"] = tracking_id
-            
-        return jsonify(result)
+
+        wait = request.args.get('wait', type=float)
+        if wait and result.get("status") not in FINISHED_STATUSES:
+            events = event_bus.wait(
+                last_event_id, min(wait, MAX_LONG_POLL),
+                lambda event: event.data.get("match_id") == tracking_id
+            )
+            if events:
+                last_event_id = events[-1].id
+            result = tracking_registry.get(tracking_id) or result
+
+        response = jsonify(result)
+        response.headers["X-Event-Id"] = str(max(last_event_id, 0))
+        return response
     except Exception as e:
         return jsonify({
             "error": str(e), 
@@ -319,6 +1500,102 @@ def check_status(tracking_id):
         }), 500
     
 
+@app.route('/check_status/batch', methods=['POST'])
+@app.route('/tenants/<tenant>/check_status/batch', methods=['POST'])
+def check_status_batch(tenant=None):
+    """
+    Statuses of many matches in one call: {"match_ids": [...]} by tracking
+    id, or a tenant's own match ids with {"tenant": ..., "match_ids": [...]}
+    or under /tenants/<tenant>/. Statuses are keyed by the ids as sent.
+    """
+    try:
+        data = request.json or {}
+        match_ids = data.get('match_ids')
+        if not match_ids or not isinstance(match_ids, list):
+            return jsonify({"error": "Missing or invalid match_ids parameter", "status": "error"}), 400
+        if tenant is None:
+            tenant = data.get('tenant')
+        if tenant is not None:
+            try:
+                tenant = tenant_of(tenant)
+            except ValueError as e:
+                return jsonify({"error": str(e), "status": "error"}), 400
+
+        matches = {}
+        for match_id in match_ids:
+            tracking_id = tenant_key(tenant, match_id) if tenant is not None else match_id
+            result = tracking_registry.get(tracking_id)
+            if result is None and cluster_catalog is not None:
+                result = cluster_catalog.get(tracking_id)
+            matches[match_id] = result
+
+        return jsonify({
+            "status": "success",
+            "matches": matches,
+            "missing": [match_id for match_id, result in matches.items() if result is None]
+        })
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "status": "error",
+            "message": f"An error occurred while checking statuses: {str(e)}"
+        }), 500
+
+def cluster_status(tracking_id):
+    """check_status for a match tracked on another node: ask that node, else use the replicated status."""
+    record = cluster_catalog.get(tracking_id)
+    owner = record.get("node") if record is not None else cluster.owner(tracking_id)
+    if owner != NODE_ID and owner in cluster.ring.nodes:
+        try:
+            wait = min(request.args.get('wait', 0, type=float), MAX_LONG_POLL)
+            response = cluster.get(owner, f'/check_status/{tracking_id}', params=request.args,
+                                   headers={"X-Cluster-Forwarded": NODE_ID}, timeout=cluster.timeout + wait)
+            if response.status_code != 404 or record is None:
+                forwarded = Response(response.content, status=response.status_code, mimetype='application/json')
+                if "X-Event-Id" in response.headers:
+                    forwarded.headers["X-Event-Id"] = response.headers["X-Event-Id"]
+                return forwarded
+        except Exception as e:
+            logs.warning("Could not ask the owner of a match", match=tracking_id, owner=owner, phase="cluster", error=e)
+    if record is None:
+        return jsonify({"error": "Invalid tracking ID", "status": "error"}), 404
+    return jsonify(record)
+
+@app.route('/events', methods=['GET'])
+def stream_events():
+    """
+    Server-Sent Events stream of tracking state changes and winner decisions.
+    Resumes after the Last-Event-ID header (or ?last_event_id=), and
+    ?match_id=a,b limits the stream to those matches.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id)
+    except (TypeError, ValueError):
+        last_event_id = event_bus.last_id
+
+    match_ids = {match_id for match_id in request.args.get('match_id', '').split(',') if match_id}
+    predicate = (lambda event: event.data.get("match_id") in match_ids) if match_ids else None
+
+    def generate():
+        last_id = last_event_id
+        yield "retry: 3000\n\n"
+        while True:
+            events = event_bus.wait(last_id, SSE_HEARTBEAT, predicate)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                # A reset may move the cursor back, to where a restarted bus numbers from
+                last_id = event.id
+                yield event.to_sse()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route('/', methods=['GET'])
 def health_check():
     return jsonify({
@@ -326,66 +1603,167 @@ def health_check():
     })
     
 
+@app.route('/start_tracking/batch', methods=['POST'])
+def start_tracking_batch():
+    """
+    Start a whole round in one call. Takes {"matches": [...], "tenant": ...}
+    with each match in the matches queue format; nothing is started if any
+    is invalid.
+    """
+    try:
+        data = request.json or {}
+        matches = data.get('matches')
+        if not matches or not isinstance(matches, list):
+            return jsonify({"error": "Missing or invalid matches parameter", "status": "error"}), 400
+
+        matches = [match_from_message(match, data.get('tenant')) for match in matches]
+        errors = start_matches(matches)
+        if errors:
+            return jsonify({"error": "Invalid matches", "status": "error", "errors": errors}), 400
+
+        return jsonify({
+            "status": "started",
+            "match_ids": [match["match_id"] for match in matches],
+            "tracking_ids": [tenant_key(tenant_of(match["tenant"]), match["match_id"]) for match in matches],
+            "message": f"Now tracking {len(matches)} match(es)"
+        })
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "status": "error",
+            "message": f"An error occurred while starting tracking: {str(e)}"
+        }), 500
+
+# Fields of a status kept in the compact round view
+ROUND_VIEW_FIELDS = ("status", "handle1", "handle2", "winner", "loser", "winner_time", "loser_time")
+
+@app.route('/rounds', methods=['GET'])
+@app.route('/rounds/<round_name>', methods=['GET'])
+@app.route('/tenants/<tenant>/rounds', methods=['GET'])
+@app.route('/tenants/<tenant>/rounds/<round_name>', methods=['GET'])
+def round_results(round_name=None, tenant=None):
+    """
+    Compact results of every match in a round (e.g. /rounds/QUARTER-FINAL),
+    or the number of matches per status in each round without a name.
+    Rounds are per tenant; /rounds shows the default tenant's.
+    """
+    try:
+        try:
+            tenant = tenant_of(tenant)
+        except ValueError as e:
+            return jsonify({"error": str(e), "status": "error"}), 400
+        registry = cluster_catalog if cluster_catalog is not None else tracking_registry
+        if round_name is None:
+            rounds = {}
+            for record in registry.in_tenant(tenant):
+                if record.round is not None:
+                    counts = rounds.setdefault(record.round, {})
+                    counts[record.status] = counts.get(record.status, 0) + 1
+            return jsonify({"status": "success", "rounds": rounds})
+
+        matches = {
+            record.match_id: {field: record.data[field] for field in ROUND_VIEW_FIELDS if record.data.get(field) is not None}
+            for record in registry.in_round(round_name) if record.tenant == tenant
+        }
+        decided = sum(1 for match in matches.values() if match.get("status") in DECIDED_STATUSES)
+        return jsonify({
+            "status": "success",
+            "round": round_name,
+            "tenant": tenant,
+            "total": len(matches),
+            "decided": decided,
+            "matches": matches
+        })
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "status": "error",
+            "message": f"An error occurred while getting round results: {str(e)}"
+        }), 500
+
 @app.route('/stop_tracking', methods=['POST'])
 def stop_tracking():
+    """
+    Stop tracking undecided matches: {"tracking_ids": [...]}, or a tenant's
+    own match ids with {"tenant": ..., "tracking_ids": [...]}. Without a
+    tenant only the default tenant's matches can be stopped. Their polling
+    stops at once and their status becomes "stopped"; decided matches keep
+    their result. In a cluster, matches tracked on other nodes are stopped there.
+    """
     try:
-        data = request.json
+        data = request.json or {}
         tracking_ids = data.get('tracking_ids', [])
         
         if not tracking_ids or not isinstance(tracking_ids, list):
             return jsonify({"error": "Missing or invalid tracking_ids parameter", "status": "error"}), 400
-        
+        try:
+            tenant = tenant_of(data.get('tenant'))
+        except ValueError as e:
+            return jsonify({"error": str(e), "status": "error"}), 400
+
         results = {}
-        for tracking_id in tracking_ids:
-            # Check if tracking exists
-            if tracking_id in active_tracking:
-                status = active_tracking[tracking_id]
-                
-                # Make sure match_id is included
-                if isinstance(status, dict) and "match_id" not in status:
-                    status["match_id"] = tracking_id
-                
-                # Check if a winner has been decided (match completed)
-                if isinstance(status, dict) and status.get("status") in ["both_solved", "one_solved"]:
-                    # Winner is already decided, no need to stop tracking
-                    results[tracking_id] = {
-                        "stopped": False,
-                        "already_complete": True,
-                        "result": status,
-                        "match_id": tracking_id
-                    }
-                # Only stop tracking if there's no winner yet
-                elif tracking_id in active_tracking:
-                    # Check if winner exists in the status
-                    if isinstance(status, dict) and "winner" in status:
-                        # Winner already determined, don't stop
-                        results[tracking_id] = {
-                            "stopped": False,
-                            "already_complete": True,
-                            "result": status,
-                            "match_id": tracking_id
-                        }
-                    else:
-                        # No winner yet, don't stop the tracking
-                        results[tracking_id] = {
-                            "stopped": False,
-                            "still_tracking": True,
-                            "result": status,
-                            "match_id": tracking_id,
-                            "message": "Tracking continues until winner is decided"
-                        }
-                else:
-                    results[tracking_id] = {
-                        "stopped": False,
-                        "error": "Thread not found but tracking exists",
-                        "match_id": tracking_id
-                    }
-            else:
+        remote = {}
+        for match_id in tracking_ids:
+            try:
+                check_match_id(tenant, match_id)
+            except ValueError as e:
+                results[str(match_id)] = {"stopped": False, "error": str(e), "match_id": match_id}
+                continue
+            tracking_id = tenant_key(tenant, match_id)
+            result = end_match(tracking_id, "stopped", "Tracking was stopped before a winner was decided")
+            if result is not None:
+                results[tracking_id] = {
+                    "stopped": True,
+                    "result": result,
+                    "match_id": tracking_id
+                }
+                continue
+
+            status = tracking_registry.get(tracking_id)
+            if status is None and cluster_catalog is not None:
+                status = cluster_catalog.get(tracking_id)
+                node = status.get("node") if status is not None else None
+                if node not in (None, NODE_ID) and status.get("status") not in FINISHED_STATUSES and not data.get('forwarded'):
+                    remote.setdefault(node, []).append(tracking_id)
+                    continue
+
+            if status is None:
                 results[tracking_id] = {
                     "stopped": False,
                     "error": "Tracking ID not found",
                     "match_id": tracking_id
                 }
+            elif status.get("status") in FINISHED_STATUSES:
+                # Decided (or ended) before the stop arrived, the result stands
+                results[tracking_id] = {
+                    "stopped": False,
+                    "already_complete": True,
+                    "result": status,
+                    "match_id": tracking_id
+                }
+            else:
+                results[tracking_id] = {
+                    "stopped": False,
+                    "error": "Match is not being tracked on this node",
+                    "result": status,
+                    "match_id": tracking_id
+                }
+
+        for node, node_ids in remote.items():
+            try:
+                reply = cluster.post(node, '/stop_tracking', {
+                    "tracking_ids": [local_id(tenant, tracking_id) for tracking_id in node_ids],
+                    "tenant": tenant,
+                    "forwarded": True
+                })
+                results.update(reply.get("results", {}))
+            except Exception as e:
+                for tracking_id in node_ids:
+                    results[tracking_id] = {
+                        "stopped": False,
+                        "error": f"Could not reach {node}: {str(e)}",
+                        "match_id": tracking_id
+                    }
         
         return jsonify({
             "status": "success",
@@ -398,23 +1776,41 @@ def stop_tracking():
             "message": f"An error occurred while stopping tracking: {str(e)}"
         }), 500
 
+def cached_listing(name, registry, build):
+    """
+    JSON response served from a snapshot that is rebuilt only when the
+    registry changed, with ETag / If-None-Match revalidation and gzip.
+    """
+    snapshot = listing_cache.get(name, registry.version, lambda: (app.json.dumps(build()) + "\n").encode())
+    gzipped = 0 < GZIP_MIN_BYTES <= len(snapshot.body) and 'gzip' in request.accept_encodings
+    etag = f"{snapshot.etag}-gzip" if gzipped else snapshot.etag
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    return Response(snapshot.gzipped if gzipped else snapshot.body, mimetype='application/json', headers=headers)
+
 @app.route('/list_tracking', methods=['GET'])
-def list_tracking():
+@app.route('/tenants/<tenant>/list_tracking', methods=['GET'])
+def list_tracking(tenant=None):
     try:
-        tracking_info = {}
-        for track_id, status in active_tracking.items():
-            # Make a copy of the status to avoid modifying the original
-            info = status.copy() if isinstance(status, dict) else {"status": status}
-            
-            # Ensure match_id is included
-            if "match_id" not in info:
-                info["match_id"] = track_id
-            
-            # Only include active tracking (not stopped or completed)
-            if not isinstance(info, dict) or info.get("status") not in ["stopped", "both_solved", "one_solved", "error"]:
-                tracking_info[track_id] = info
-        
-        return jsonify(tracking_info)
+        # Only include active tracking (not stopped or completed), straight from the status index;
+        # in a cluster the replicated catalog covers every node
+        registry = cluster_catalog if cluster is not None else tracking_registry
+        if tenant is not None:
+            try:
+                tenant = tenant_of(tenant)
+            except ValueError as e:
+                return jsonify({"error": str(e), "status": "error"}), 400
+            return cached_listing(f'list_tracking:{tenant}', registry, lambda: {
+                record.match_id: record.data
+                for record in registry.in_tenant(tenant) if record.status not in FINISHED_STATUSES
+            })
+        return cached_listing('list_tracking', registry, lambda: {
+            record.match_id: record.data
+            for record in registry.without_status(*FINISHED_STATUSES)
+        })
     except Exception as e:
         return jsonify({
             "error": str(e),
@@ -422,11 +1818,191 @@ def list_tracking():
             "message": f"An error occurred while listing tracking: {str(e)}"
         }), 500
 
+@app.route('/tenants', methods=['GET'])
+def list_tenants():
+    """Matches per status of every tenant, and the share of the Codeforces budget each is polled from"""
+    try:
+        registry = cluster_catalog if cluster is not None else tracking_registry
+        budgets = rate_governor.tenants()
+        tenants = {}
+        for tenant in set(registry.tenants()) | set(budgets):
+            counts = {}
+            for record in registry.in_tenant(tenant):
+                counts[record.status] = counts.get(record.status, 0) + 1
+            tenants[tenant] = {"matches": counts, "budget": budgets.get(tenant)}
+        return jsonify({"status": "success", "rate": rate_governor.rate, "tenants": tenants})
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "status": "error",
+            "message": f"An error occurred while listing tenants: {str(e)}"
+        }), 500
+
+@app.route('/cluster', methods=['GET'])
+def cluster_info():
+    """Cluster members, their leases and how many matches each is tracking"""
+    if cluster is None:
+        return jsonify({"status": "success", "node_id": NODE_ID, "cluster": False, "tracking": len(match_states)})
+    tracking = {}
+    for record in cluster_catalog.without_status(*FINISHED_STATUSES):
+        node = record.data.get("node")
+        tracking[node] = tracking.get(node, 0) + 1
+    return jsonify({
+        "status": "success",
+        "node_id": NODE_ID,
+        "cluster": True,
+        "members": cluster.members(),
+        "tracking": tracking
+    })
+
+@app.route('/cluster/heartbeat', methods=['POST'])
+def cluster_heartbeat():
+    if cluster is None or not cluster_authorized():
+        return jsonify({"error": "Forbidden", "status": "error"}), 403
+    data = request.json or {}
+    if not data.get("node_id") or not data.get("url"):
+        return jsonify({"error": "Missing node_id or url", "status": "error"}), 400
+    return jsonify(cluster.heartbeat(data["node_id"], data["url"]))
+
+@app.route('/cluster/matches', methods=['POST'])
+def cluster_matches():
+    """Take over matches routed or handed off by another node"""
+    if cluster is None or not cluster_authorized():
+        return jsonify({"error": "Forbidden", "status": "error"}), 403
+    try:
+        data = request.json or {}
+        matches = data.get("matches", [])
+        for match in matches:
+            track_match(match)
+            if data.get("check_handles"):
+                check_handles_later(match["match_id"], [match["handle1"], match["handle2"]])
+        return jsonify({"status": "success", "adopted": len(matches)})
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "status": "error",
+            "message": f"An error occurred while adopting matches: {str(e)}"
+        }), 500
+
+@app.route('/cluster/sync', methods=['POST'])
+def cluster_sync():
+    """Replicated status updates from other nodes"""
+    if cluster is None or not cluster_authorized():
+        return jsonify({"error": "Forbidden", "status": "error"}), 403
+    items = (request.json or {}).get("items", [])
+    for item in items:
+        catalog_put(item)
+    return jsonify({"status": "success", "synced": len(items)})
+
+@app.route('/rate_budget', methods=['GET'])
+def rate_budget():
+    """Codeforces rate budget usage, how stale each active match's last poll is and what stale matches cost"""
+    try:
+        return jsonify({
+            "status": "success",
+            "budget": rate_governor.stats(),
+            "tenants": rate_governor.tenants(),
+            "matches": rate_governor.staleness(),
+            "stale": stale_capacity()
+        })
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "status": "error",
+            "message": f"An error occurred while getting the rate budget: {str(e)}"
+        }), 500
+
+@app.route('/codeforces', methods=['GET'])
+def codeforces_health():
+    """Codeforces circuit breaker state and recent call latency per API method"""
+    try:
+        client = async_cf_client if async_cf_client is not None else cf_client
+        return jsonify({
+            "status": "success",
+            "breaker": cf_breaker.stats(),
+            "latency": {
+                method: {"p50": window.quantile(0.5), "p95": window.quantile(0.95)}
+                for method, window in list(client.latency.items())
+            },
+            "timeout": {"connect": CF_CONNECT_TIMEOUT, "read": CF_READ_TIMEOUT},
+            "hedge_quantile": CF_HEDGE_QUANTILE
+        })
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "status": "error",
+            "message": f"An error occurred while getting the Codeforces status: {str(e)}"
+        }), 500
+
+@app.route('/replication', methods=['GET'])
+def replication_status():
+    """Whether this worker is a primary or a standby, and how current its standby stream is"""
+    if standby is not None and not standby.took_over:
+        return jsonify({"status": "success", "role": "standby", "standby": standby.stats()})
+    stats = replication_server.stats() if replication_server is not None else {"standbys": 0, "fenced": False}
+    return jsonify({
+        "status": "success",
+        "role": "primary",
+        "took_over": standby is not None,
+        **stats
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Counters, histograms and gauges in the Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """
+    Sample the stacks of every thread for ?seconds=N (default 10). Returns
+    collapsed stacks for flamegraph tools and a per-function summary as
+    JSON, or only the collapsed stacks as text with ?format=collapsed.
+    """
+    if not debug_authorized():
+        return jsonify({"error": "Forbidden", "status": "error"}), 403
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({"error": "seconds and limit must be numbers", "status": "error"}), 400
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        return jsonify({
+            "error": "Invalid seconds",
+            "status": "error",
+            "message": f"seconds must be greater than 0 and at most {PROFILE_MAX_SECONDS}"
+        }), 400
+
+    try:
+        profile = profiler.profile(seconds)
+    except ProfilerBusyError as e:
+        return jsonify({"error": str(e), "status": "error"}), 409
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "status": "error",
+            "message": f"An error occurred while profiling: {str(e)}"
+        }), 500
+
+    if request.args.get('format') == 'collapsed':
+        return Response(collapse(profile["stacks"]), mimetype='text/plain')
+    return jsonify({
+        "status": "success",
+        "seconds": profile["seconds"],
+        "interval": PROFILE_INTERVAL,
+        "rounds": profile["rounds"],
+        "samples": sum(profile["stacks"].values()),
+        "overhead": profile["overhead"],
+        "collapsed": collapse(profile["stacks"]),
+        "functions": summarize(profile["stacks"], limit),
+        "phases": phase_summary()
+    })
+
 @app.route('/all_tracking_history', methods=['GET'])
 def all_tracking_history():
     """New route to get all tracking history, including stopped and completed items"""
     try:
-        return jsonify(active_tracking)
+        return cached_listing('all_tracking_history', tracking_registry, tracking_registry.snapshot)
     except Exception as e:
         return jsonify({
             "error": str(e),
@@ -441,16 +2017,9 @@ def matches_completed():
     A match is considered completed if it has a status of "both_solved" or "one_solved".
     """
     try:
-        completed_matches = []
-        
-        for match_id, status in active_tracking.items():
-            # Check if the status is a dictionary and has a 'status' field
-            if isinstance(status, dict) and status.get("status") in ["both_solved", "one_solved"]:
-                completed_matches.append(match_id)
-        
-        return jsonify({
+        return cached_listing('matches_completed', tracking_registry, lambda: {
             "status": "success",
-            "matches_completed": completed_matches
+            "matches_completed": [record.match_id for record in tracking_registry.with_status(*DECIDED_STATUSES)]
         })
     except Exception as e:
         return jsonify({
@@ -459,5 +2028,107 @@ def matches_completed():
             "message": f"An error occurred while retrieving completed matches: {str(e)}"
         }), 500
 
+def engine_request(message):
+    """Answer an HTTP request relayed by an API worker by running it against this process's app."""
+    response = app.test_client().open(
+        message["path"], method=message["method"], query_string=message.get("query"),
+        headers=message.get("headers"), data=message.get("body")
+    )
+    return {
+        "status": response.status_code,
+        "headers": {key: value for key, value in response.headers.items() if key in RELAYED_HEADERS},
+        "body": response.get_data(as_text=True)
+    }
+
+# Headers passed between API workers and the engine
+RELAYED_HEADERS = ('Content-Type', 'X-Event-Id', 'X-Cluster-Token', 'X-Cluster-Forwarded', 'X-Debug-Token')
+
+# Served from the API worker's replica; every other route is relayed to the engine
+REPLICA_ENDPOINTS = {'check_status', 'stream_events', 'health_check', 'all_tracking_history', 'matches_completed'}
+if cluster is None:
+    # With a cluster, listing needs the engine's cluster catalog
+    REPLICA_ENDPOINTS.update(('list_tracking', 'check_status_batch', 'round_results'))
+
+# Served by a standby before it takes over
+STANDBY_ENDPOINTS = {'health_check', 'metrics', 'replication_status'}
+
+def forward_to_engine():
+    """Relay the current request to the engine process and return its response."""
+    try:
+        reply = engine_replica.request({
+            "path": request.path,
+            "method": request.method,
+            "query": request.query_string.decode(),
+            "headers": {key: value for key, value in request.headers.items() if key in RELAYED_HEADERS},
+            "body": request.get_data(as_text=True)
+        }, timeout=ENGINE_TIMEOUT)
+    except Exception as e:
+        return jsonify({
+            "error": str(e),
+            "status": "error",
+            "message": f"The tracking engine is unavailable: {str(e)}"
+        }), 503
+    return Response(reply["body"], status=reply["status"], headers=reply["headers"])
+
+def start_engine(replicated=None):
+    """
+    Resume matches from before a restart, or from a primary's replicated
+    state on takeover, then start polling, publishing and taking new matches.
+    """
+    global match_consumer, replication_server
+    winner_publisher.start()
+    poll_scheduler.start()
+    recover_tracking(replicated)
+    if REPLICATION_LISTEN:
+        if state_log is None:
+            logs.warning("REPLICATION_LISTEN needs a STATE_DIR, not serving standbys")
+        else:
+            replication_server = ReplicationServer(
+                REPLICATION_LISTEN, state_log, token=REPLICATION_TOKEN, heartbeat=REPLICATION_HEARTBEAT,
+                fence_grace=REPLICATION_FENCE_GRACE
+            )
+            replication_server.start()
+            logs.info("Streaming the state log to standbys", address=REPLICATION_LISTEN, phase="replicate")
+    if cluster is not None:
+        cluster.start()
+    threading.Thread(target=reap_forever, name="match-reaper", daemon=True).start()
+    threading.Thread(target=check_handles_forever, name="handle-checker", daemon=True).start()
+    if PROCESS_ROLE == 'engine':
+        EngineServer(ENGINE_SOCKET, tracking_registry, event_bus, engine_request, heartbeat=SSE_HEARTBEAT).start()
+        logs.info("Tracking engine serving its state", socket=ENGINE_SOCKET, phase="ipc")
+
+    # Start Subscriber
+    match_consumer = MatchConsumer(
+        CLOUDAMQP_URL, MATCHES_QUEUE, callback, prefetch=MATCHES_PREFETCH, workers=CONSUMER_WORKERS, paused=fenced
+    )
+    match_consumer.start()
+
+if PROCESS_ROLE == 'api':
+    # Stateless HTTP worker: reads come from a replica of the engine's state
+    engine_replica = EngineReplica(ENGINE_SOCKET, tracking_registry, event_bus, timeout=ENGINE_TIMEOUT).start()
+
+    @app.before_request
+    def relay_to_engine():
+        if request.endpoint not in REPLICA_ENDPOINTS:
+            return forward_to_engine()
+else:
+    engine_replica = None
+    match_consumer = None
+    if STANDBY_OF:
+        # Idle until the primary's lease lapses; polling starts from its replicated state
+        standby = Standby(STANDBY_OF, start_engine, lease_ttl=STANDBY_LEASE_TTL, token=REPLICATION_TOKEN).start()
+        logs.info("Standing by for the primary", primary=STANDBY_OF, phase="replicate")
+
+        @app.before_request
+        def refuse_while_standby():
+            if not standby.took_over and request.endpoint not in STANDBY_ENDPOINTS:
+                return jsonify({
+                    "error": "Standby",
+                    "status": "error",
+                    "message": f"This worker is a standby of {STANDBY_OF}"
+                }), 503
+    else:
+        start_engine()
+
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+import logs
+from metrics import POLL_LAG_SECONDS
+
+
+class AsyncPollEngine:
+    """
+    Drive every tracked match from a single asyncio event loop.
+
+    Exposes the same schedule/cancel interface as PollScheduler so the app can
+    switch engines without touching the callers. The loop runs in one
+    background thread; polls are coroutines, so thousands of matches share it.
+
+    Args:
+        poll_fn (callable): Coroutine function called as await poll_fn(key).
+            Returns the delay in seconds until the next poll, or None when
+            the key is finished.
+        max_in_flight (int): Maximum number of polls running at once
+    """
+
+    def __init__(self, poll_fn, max_in_flight=256):
+        self._poll_fn = poll_fn
+        self._max_in_flight = max_in_flight
+        self.loop = asyncio.new_event_loop()
+        self._semaphore = None
+        # key -> TimerHandle of its pending poll / Task of its running poll
+        self._pending = {}
+        self._running = {}
+        self._cancelled = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run_loop, name="async-poll-engine", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self._max_in_flight)
+        self.loop.run_forever()
+
+    def schedule(self, key, delay=0):
+        """Schedule (or reschedule) a poll of key after delay seconds. Thread-safe."""
+        self.loop.call_soon_threadsafe(self._schedule, key, delay)
+
+    def cancel(self, key):
+        """Drop any pending poll for key. A poll already running is allowed to finish."""
+        self.loop.call_soon_threadsafe(self._cancel, key)
+
+    def submit(self, coro):
+        """Run a coroutine on the engine loop and return a concurrent future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def is_scheduled(self, key):
+        with self._lock:
+            return key in self._pending or key in self._running
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending) + len(self._running)
+
+    def _schedule(self, key, delay):
+        with self._lock:
+            self._cancelled.discard(key)
+            handle = self._pending.pop(key, None)
+            if handle is not None:
+                handle.cancel()
+            self._pending[key] = self.loop.call_later(delay, self._spawn, key)
+
+    def _cancel(self, key):
+        with self._lock:
+            handle = self._pending.pop(key, None)
+            if handle is not None:
+                handle.cancel()
+            if key in self._running:
+                self._cancelled.add(key)
+
+    def _spawn(self, key):
+        with self._lock:
+            handle = self._pending.pop(key, None)
+            if handle is not None:
+                POLL_LAG_SECONDS.observe(max(self.loop.time() - handle.when(), 0))
+            if key in self._running:
+                # Previous poll still in flight; try again shortly
+                self._pending[key] = self.loop.call_later(0.1, self._spawn, key)
+                return
+            self._running[key] = self.loop.create_task(self._poll(key))
+
+    async def _poll(self, key):
+        try:
+            async with self._semaphore:
+                delay = await self._poll_fn(key)
+        except Exception as e:
+            logs.error("Error polling", match=key, phase="poll", error=e)
+            delay = None
+        with self._lock:
+            self._running.pop(key, None)
+            if key in self._cancelled:
+                self._cancelled.discard(key)
+            elif delay is not None and key not in self._pending:
+                self._pending[key] = self.loop.call_later(delay, self._spawn, key)
@@ -0,0 +1,180 @@
+import collections
+import itertools
+import threading
+import time
+
+import pika
+
+
+class Method:
+    __slots__ = ("delivery_tag", "redelivered", "routing_key")
+
+    def __init__(self, delivery_tag, redelivered, routing_key):
+        self.delivery_tag = delivery_tag
+        self.redelivered = redelivered
+        self.routing_key = routing_key
+
+
+class FakeBroker:
+    """
+    In-process stand-in for RabbitMQ covering the parts of
+    pika.BlockingConnection the worker uses: durable queues on the default
+    exchange, prefetch, manual acks, requeue and publisher confirms.
+
+    Install it with `pika.BlockingConnection = broker.connect` before the
+    worker is imported.
+    """
+
+    def __init__(self):
+        self._queues = collections.defaultdict(collections.deque)
+        self._listeners = {}
+        self._cond = threading.Condition()
+        self.published = collections.Counter()
+
+    def connect(self, parameters=None):
+        return FakeConnection(self)
+
+    def listen(self, queue, listener):
+        """Hand every message published to queue to listener(body) instead of queueing it."""
+        self._listeners[queue] = listener
+
+    def publish(self, queue, body, redelivered=False):
+        listener = self._listeners.get(queue)
+        with self._cond:
+            self.published[queue] += 1
+            if listener is None:
+                self._queues[queue].append((body, redelivered))
+                self._cond.notify_all()
+        if listener is not None:
+            listener(body)
+
+    def depth(self, queue):
+        with self._cond:
+            return len(self._queues[queue])
+
+
+class FakeConnection:
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_open = True
+        self._callbacks = collections.deque()
+        self._channels = []
+
+    def channel(self):
+        channel = FakeChannel(self)
+        self._channels.append(channel)
+        return channel
+
+    def add_callback_threadsafe(self, callback):
+        if not self.is_open:
+            raise RuntimeError("Connection is closed")
+        with self.broker._cond:
+            self._callbacks.append(callback)
+            self.broker._cond.notify_all()
+
+    def call_later(self, delay, callback):
+        """Run callback on the next process_data_events; delays are not simulated."""
+        with self.broker._cond:
+            self._callbacks.append(callback)
+            self.broker._cond.notify_all()
+
+    def _run_callbacks(self):
+        while self._callbacks:
+            self._callbacks.popleft()()
+
+    def process_data_events(self, time_limit=0):
+        """
+        Run threadsafe callbacks and deliver messages to consumers on this
+        thread, waiting up to time_limit seconds for the first of them.
+        """
+        deadline = time.monotonic() + time_limit
+        while self.is_open:
+            with self.broker._cond:
+                delivery = next(filter(None, (channel._next_delivery() for channel in self._channels)), None)
+                remaining = deadline - time.monotonic()
+                if delivery is None and not self._callbacks:
+                    if remaining <= 0:
+                        return
+                    self.broker._cond.wait(min(remaining, 0.5))
+                    continue
+            self._run_callbacks()
+            if delivery is not None:
+                callback, channel, method, body = delivery
+                callback(channel, method, None, body)
+            return
+
+    def close(self):
+        with self.broker._cond:
+            self.is_open = False
+            # Like the broker, hand unacked messages to the next consumer
+            for channel in self._channels:
+                for queue, body in channel._unacked.values():
+                    self.broker._queues[queue].append((body, True))
+                channel._unacked.clear()
+            self.broker._cond.notify_all()
+
+
+class FakeChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.broker = connection.broker
+        self.prefetch = 0
+        self._consumers = []
+        self._unacked = {}
+        self._tags = itertools.count(1)
+        # A BlockingChannel wraps a pika.channel.Channel as _impl; one object plays both here
+        self._impl = self
+        self._on_confirm = None
+        self._confirm_tags = itertools.count(1)
+
+    @property
+    def is_open(self):
+        return self.connection.is_open
+
+    def queue_declare(self, queue, durable=False):
+        with self.broker._cond:
+            self.broker._queues[queue]
+
+    def basic_qos(self, prefetch_count=0):
+        self.prefetch = prefetch_count
+
+    def confirm_delivery(self, ack_nack_callback=None, callback=None):
+        self._on_confirm = ack_nack_callback
+
+    def add_on_return_callback(self, callback):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.broker.publish(routing_key, body)
+        if self._on_confirm is not None:
+            frame = pika.frame.Method(1, pika.spec.Basic.Ack(delivery_tag=next(self._confirm_tags)))
+            self.connection.call_later(0, lambda: self._on_confirm(frame))
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False):
+        self._consumers.append((queue, on_message_callback))
+
+    def basic_ack(self, delivery_tag):
+        self._unacked.pop(delivery_tag, None)
+
+    def basic_nack(self, delivery_tag, requeue=True):
+        message = self._unacked.pop(delivery_tag, None)
+        if message is not None and requeue:
+            self.broker.publish(message[0], message[1], redelivered=True)
+
+    def _next_delivery(self):
+        """Pop a deliverable message, or None. Must hold the broker condition."""
+        if self.prefetch and len(self._unacked) >= self.prefetch:
+            return None
+        for queue, callback in self._consumers:
+            messages = self.broker._queues[queue]
+            if messages:
+                body, redelivered = messages.popleft()
+                tag = next(self._tags)
+                self._unacked[tag] = (queue, body)
+                return callback, self, Method(tag, redelivered, queue), body
+        return None
+
+    def start_consuming(self):
+        """Deliver messages and run threadsafe callbacks on this thread until the connection closes."""
+        while self.connection.is_open:
+            self.connection.process_data_events(time_limit=0.5)
@@ -0,0 +1,173 @@
+import bisect
+import collections
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CALL_LIMIT = {"status": "FAILED", "comment": "Call limit exceeded"}
+
+
+class Submission:
+    """
+    One scripted submission. It is invisible before `created`, reports
+    TESTING until `judged`, and its final verdict after that.
+    """
+    __slots__ = ("id", "handle", "contest_id", "index", "created", "judged", "verdict")
+
+    def __init__(self, id, handle, contest_id, index, created, judged, verdict):
+        self.id = id
+        self.handle = handle
+        self.contest_id = contest_id
+        self.index = index
+        self.created = created
+        self.judged = judged
+        self.verdict = verdict
+
+    def to_api(self, now):
+        return {
+            "id": self.id,
+            "contestId": self.contest_id,
+            "creationTimeSeconds": int(self.created),
+            "problem": {"contestId": self.contest_id, "index": self.index},
+            "author": {"members": [{"handle": self.handle}]},
+            "verdict": self.verdict if now >= self.judged else "TESTING"
+        }
+
+
+class Timeline:
+    """
+    Submissions ordered by creation time, queried the way the Codeforces API
+    pages them: newest first, `from` counted from 1.
+    """
+
+    def __init__(self):
+        self._created = []
+        self._submissions = []
+
+    def add(self, submission):
+        index = bisect.bisect_right(self._created, submission.created)
+        self._created.insert(index, submission.created)
+        self._submissions.insert(index, submission)
+
+    def page(self, now, start, count):
+        visible = bisect.bisect_right(self._created, now)
+        end = max(visible - (start - 1), 0)
+        return [submission.to_api(now) for submission in reversed(self._submissions[max(end - count, 0):end])]
+
+
+class FakeCodeforces:
+    """
+    Local stand-in for the `user.status`, `contest.status` and `user.info` API methods,
+    serving scripted submissions with configurable latency and throttling.
+
+    Args:
+        submissions (list): Submission objects to serve
+        latency (float): Seconds added to every response
+        jitter (float): Extra random latency of up to this many seconds
+        rate (float): Calls per second before "Call limit exceeded"; 0 disables throttling
+        burst (int): Calls allowed back to back before throttling starts
+    """
+
+    def __init__(self, submissions, latency=0.05, jitter=0.05, rate=0, burst=5):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate = rate
+        self.burst = burst
+        self.by_handle = collections.defaultdict(Timeline)
+        self.by_contest = collections.defaultdict(Timeline)
+        for submission in submissions:
+            self.by_handle[submission.handle].add(submission)
+            self.by_contest[submission.contest_id].add(submission)
+        self.requests = collections.Counter()
+        self.throttled = 0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _allow(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                self.throttled += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def handle(self, method, params):
+        """Response status and body for one API call."""
+        if method == "stats":
+            return 200, {"requests": dict(self.requests), "throttled": self.throttled}
+        if method not in ("user.status", "contest.status", "user.info"):
+            return 400, {"status": "FAILED", "comment": f"Unknown method {method}"}
+        with self._lock:
+            self.requests[method] += 1
+
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        if not self._allow():
+            return 503, CALL_LIMIT
+        if method == "user.info":
+            return self.user_info(params.get("handles", ""))
+        try:
+            start = int(params.get("from", 1))
+            count = int(params.get("count", 1))
+            if method == "user.status":
+                timeline = self.by_handle.get(params["handle"], Timeline())
+            else:
+                timeline = self.by_contest.get(int(params["contestId"]), Timeline())
+        except (KeyError, ValueError) as e:
+            return 400, {"status": "FAILED", "comment": f"Bad parameters: {str(e)}"}
+        return 200, {"status": "OK", "result": timeline.page(time.time(), start, count)}
+
+    def user_info(self, handles):
+        # Every handle with a scripted submission exists, in any casing
+        known = {handle.lower(): handle for handle in self.by_handle}
+        users = []
+        for handle in handles.split(";"):
+            if handle.lower() not in known:
+                return 400, {"status": "FAILED", "comment": f"handles: User with handle {handle} not found"}
+            users.append({"handle": known[handle.lower()]})
+        return 200, {"status": "OK", "result": users}
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Start serving on a background thread and return the server."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                status, body = fake.handle(url.path.rsplit("/", 1)[-1], params)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The worker gave up on this request, e.g. a hedged call answered elsewhere
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="fake-codeforces", daemon=True).start()
+        return server
+
+
+def run_server(submissions, options, ready):
+    """multiprocessing entry point: serve until the parent terminates the process."""
+    server = FakeCodeforces(submissions, **options).serve()
+    ready.put(server.server_address[1])
+    threading.Event().wait()
@@ -0,0 +1,269 @@
+"""
+Offline end-to-end load test of the tracking worker.
+
+Starts a fake Codeforces API in a separate process and an in-process
+broker stand-in, imports the real worker against them, publishes N matches
+to the matches queue and waits for their winners. Run it from the Asim
+directory:
+
+    python -m bench.loadtest --matches 500 --json results.json
+
+Worker settings (CF_RATE, POLL_INTERVAL, TRACKING_WORKERS, ...) are read
+from the environment as usual.
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+import pika
+import requests
+
+from bench.fake_broker import FakeBroker
+from bench.fake_codeforces import Submission, run_server
+from codec import decode_message
+from registry import ROUND_NAMES
+
+
+def parse_tenants(spec):
+    """Tenants and how many matches each gets of every batch, from "busy:9,quiet:1"."""
+    pattern = []
+    for item in spec.split(","):
+        if item.strip():
+            tenant, _, count = item.partition(":")
+            pattern.extend([tenant.strip()] * int(count or 1))
+    return pattern
+
+
+def build_timeline(matches, contests, history, solve_window, judge_window, seed, start, tenants=None, slow_winner=False):
+    """
+    Script every match: past submissions on other problems, a wrong attempt
+    or two, the winning accepted submission and sometimes a later solve by
+    the loser. Matches are dealt to tenants in the order of `tenants`.
+
+    With `slow_winner` the winner submits nothing until the winning
+    solution, so its handle has backed off, while the loser keeps
+    submitting elsewhere and solves two to four seconds after the winner:
+    the loser's handle is polled sooner and finds its solve first.
+
+    Returns:
+        tuple: (submissions, match messages, (tenant, match id) -> (winner, time the winning verdict appeared))
+    """
+    rng = random.Random(seed)
+    scripted = []
+    messages = []
+    expected = {}
+    for i in range(matches):
+        level = rng.randint(1, 5)
+        match_id = f"{ROUND_NAMES[level]}-{i}"
+        contest_id = 1000 + i % contests
+        handles = (f"bench_{i}_a", f"bench_{i}_b")
+        for handle in handles:
+            for k in range(history):
+                created = start - 3600 + k
+                scripted.append((handle, contest_id, "Z", created, created, "OK"))
+
+        winner, loser = rng.sample(handles, 2)
+        won_at = start + rng.uniform(*solve_window)
+        if slow_winner:
+            # Busy on another problem every second, so the loser's handle never backs off
+            for k in range(int(won_at - start) + 5):
+                scripted.append((loser, contest_id, "B", start + k, start + k, "WRONG_ANSWER"))
+        elif rng.random() < 0.5:
+            scripted.append((winner, contest_id, "A", won_at - rng.uniform(1, 5), won_at, "WRONG_ANSWER"))
+        accepted_at = won_at + rng.uniform(*judge_window)
+        scripted.append((winner, contest_id, "A", won_at, accepted_at, "OK"))
+        # The loser is at least two whole seconds behind, so creationTimeSeconds never ties
+        if slow_winner:
+            lost_at = won_at + rng.uniform(2, 4)
+            scripted.append((loser, contest_id, "A", lost_at, lost_at, "OK"))
+        else:
+            lost_at = won_at + rng.uniform(2, 30)
+            scripted.append((loser, contest_id, "A", lost_at, lost_at + 1, "OK" if rng.random() < 0.5 else "WRONG_ANSWER"))
+
+        message = {"match_id": match_id, "p1": handles[0], "p2": handles[1], "cf_question": f"{contest_id}/A", "level": level}
+        tenant = tenants[i % len(tenants)] if tenants else None
+        if tenant is not None:
+            message["tenant"] = tenant
+        messages.append(message)
+        expected[(tenant, match_id)] = (winner, accepted_at)
+
+    scripted.sort(key=lambda entry: entry[3])
+    submissions = [Submission(id, *entry) for id, entry in enumerate(scripted, start=1)]
+    return submissions, messages, expected
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+def rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return None
+
+
+def fetch_stats(port):
+    return requests.get(f"http://127.0.0.1:{port}/api/stats", timeout=5).json()
+
+
+def run(args):
+    start = time.time() + args.warmup
+    submissions, messages, expected = build_timeline(
+        args.matches, args.contests, args.history, (args.solve_min, args.solve_max),
+        (args.judge_min, args.judge_max), args.seed, start, parse_tenants(args.tenants), args.slow_winner
+    )
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    options = {"latency": args.latency, "jitter": args.jitter, "rate": args.cf_rate_limit, "burst": args.cf_burst}
+    server = context.Process(target=run_server, args=(submissions, options, ready), daemon=True)
+    server.start()
+    port = ready.get(timeout=30)
+
+    # Point the worker at the stand-ins before it is imported
+    os.environ["CF_API_URL"] = f"http://127.0.0.1:{port}/api"
+    os.environ["CLOUDAMQP_URL"] = "amqp://bench/"
+    os.environ["TRACKING_ENGINE"] = args.engine
+    os.environ.setdefault("STATE_DIR", tempfile.mkdtemp(prefix="blitz-bench-"))
+    broker = FakeBroker()
+    pika.BlockingConnection = broker.connect
+
+    detected = {}
+    lock = threading.Lock()
+    all_detected = threading.Event()
+
+    def on_winner(body):
+        # JSON, or msgpack when the worker runs with QUEUE_CODEC=msgpack
+        message = decode_message(body)
+        with lock:
+            detected.setdefault((message.get("tenant"), message["match_id"]), (message["winner"], time.time()))
+            if len(detected) >= len(expected):
+                all_detected.set()
+
+    broker.listen("winners", on_winner)
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    wall_before = time.time()
+    log = sys.stdout if args.verbose else open(os.devnull, "w")
+    with contextlib.redirect_stdout(log):
+        importlib.import_module("app")  # starts the worker
+        if args.batch:
+            broker.publish("matches", json.dumps({"matches": messages}))
+        else:
+            for message in messages:
+                broker.publish("matches", json.dumps(message))
+        all_detected.wait(max(start + args.solve_max - time.time(), 0) + args.timeout)
+        stats = fetch_stats(port)
+    wall = time.time() - wall_before
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    server.terminate()
+
+    latencies = []
+    wrong = []
+    by_tenant = {}
+    for key, (winner, received) in detected.items():
+        expected_winner, accepted_at = expected[key]
+        if winner != expected_winner:
+            wrong.append(key)
+        latencies.append(received - accepted_at)
+        by_tenant.setdefault(key[0], []).append(received - accepted_at)
+
+    cpu = usage.ru_utime - usage_before.ru_utime + usage.ru_stime - usage_before.ru_stime
+    return {
+        "matches": len(expected),
+        "detected": len(detected),
+        "missed": len(expected) - len(detected),
+        "wrong_winner": len(wrong),
+        "detection_seconds": {
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies, default=None)
+        },
+        "tenants": {
+            tenant: {
+                "matches": sum(1 for expected_tenant, _ in expected if expected_tenant == tenant),
+                "detected": len(tenant_latencies),
+                "p50": percentile(tenant_latencies, 50),
+                "p90": percentile(tenant_latencies, 90)
+            }
+            for tenant, tenant_latencies in by_tenant.items() if tenant is not None
+        },
+        "codeforces_requests": stats["requests"],
+        "codeforces_throttled": stats["throttled"],
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "cpu_percent": 100 * cpu / wall if wall else None,
+        "max_rss_mb": usage.ru_maxrss / 1024,
+        "rss_mb": rss_mb(),
+        "settings": vars(args)
+    }
+
+
+def print_report(report):
+    def fmt(value):
+        return "-" if value is None else f"{value:.3f}"
+
+    latency = report["detection_seconds"]
+    print(f"matches        {report['matches']}  detected {report['detected']}  missed {report['missed']}  "
+          f"wrong winner {report['wrong_winner']}")
+    print(f"detection (s)  p50 {fmt(latency['p50'])}  p90 {fmt(latency['p90'])}  p99 {fmt(latency['p99'])}  "
+          f"max {fmt(latency['max'])}")
+    for tenant, entry in sorted(report["tenants"].items()):
+        print(f"  {tenant:<12} {entry['detected']}/{entry['matches']}  p50 {fmt(entry['p50'])}  p90 {fmt(entry['p90'])}")
+    requests = ", ".join(f"{method} {count}" for method, count in sorted(report["codeforces_requests"].items()))
+    print(f"codeforces     {requests or 'no calls'}  throttled {report['codeforces_throttled']}")
+    print(f"worker         cpu {report['cpu_seconds']:.2f}s ({report['cpu_percent']:.1f}% of {report['wall_seconds']:.1f}s)  "
+          f"max rss {report['max_rss_mb']:.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test of the tracking worker")
+    parser.add_argument("--matches", type=int, default=200, help="concurrent matches to track")
+    parser.add_argument("--contests", type=int, default=20, help="contests the matches are spread over")
+    parser.add_argument("--history", type=int, default=20, help="older submissions per handle")
+    parser.add_argument("--solve-min", type=float, default=5, help="earliest winning submission, seconds after start")
+    parser.add_argument("--solve-max", type=float, default=60, help="latest winning submission, seconds after start")
+    parser.add_argument("--judge-min", type=float, default=0, help="shortest judging time of a winning submission")
+    parser.add_argument("--judge-max", type=float, default=2, help="longest judging time of a winning submission")
+    parser.add_argument("--batch", action="store_true", help="publish every match in one round message")
+    parser.add_argument("--slow-winner", action="store_true",
+                        help="the winner's handle is idle until it solves while the loser's stays busy")
+    parser.add_argument("--tenants", default="", help="deal matches to tenants, e.g. busy:9,quiet:1")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds between publishing matches and their start")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for winners after the last solve")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Codeforces response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="extra random latency in seconds")
+    parser.add_argument("--cf-rate-limit", type=float, default=0, help="fake Codeforces calls per second, 0 for unlimited")
+    parser.add_argument("--cf-burst", type=int, default=5, help="fake Codeforces calls allowed back to back")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default=os.getenv("TRACKING_ENGINE", "threads"))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the worker's own output")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["missed"] == 0 and report["wrong_winner"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import logs
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, OPEN, HALF_OPEN)
+
+
+class CircuitOpenError(Exception):
+    """A call was refused because the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker around an unreliable upstream.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    refuses calls for `reset_timeout` seconds. Then it lets one probe call
+    through (half-open): a success closes it, a failure opens it again.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the breaker
+        reset_timeout (float): Seconds the breaker stays open before a probe
+        name (str): Upstream name used in log lines and errors
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, name="upstream"):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = None
+        self.last_error = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now. Half-open, only one probe is in flight at a time."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logs.info("Upstream is answering again, closing the circuit", upstream=self.name, phase="breaker")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) if error is not None else None
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                if self.state == CLOSED:
+                    self.trips += 1
+                logs.warning("Upstream keeps failing, pausing calls", upstream=self.name, phase="breaker",
+                             failures=self.failures, pause_seconds=self.reset_timeout)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "open_seconds": round(time.monotonic() - self.opened_at, 3) if self.state != CLOSED else None,
+                "last_error": self.last_error
+            }
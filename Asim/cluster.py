@@ -0,0 +1,183 @@
+import bisect
+import hashlib
+import math
+import queue
+import threading
+import time
+
+import requests
+
+import logs
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring of node ids. Each node is placed at `vnodes`
+    points, so a node joining or leaving only moves about 1/N of the keys.
+    """
+
+    def __init__(self, nodes=(), vnodes=64):
+        points = sorted((ring_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self.nodes = frozenset(nodes)
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key):
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, ring_hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ClusterMembership:
+    """
+    Lease-based cluster membership over HTTP heartbeats.
+
+    Every `heartbeat_interval` seconds the node posts a heartbeat to each
+    peer; both sides of the exchange renew the other's lease. A node whose
+    lease has not been renewed for `lease_ttl` seconds leaves the hash ring,
+    and on_change(joined, left) is called with the node ids that joined
+    and left. The ring is only rebuilt on the heartbeat thread, so on_change
+    calls never overlap.
+
+    Args:
+        node_id (str): This node's id
+        url (str): Base URL peers reach this node on
+        peers (list): Base URLs of the other nodes
+        lease_ttl (float): Seconds a node stays a member without a heartbeat
+        heartbeat_interval (float): Seconds between heartbeat rounds
+        token (str): Shared secret sent as X-Cluster-Token, if any
+        timeout (float): Seconds to wait on a peer request
+        on_change (callable): Called as on_change(joined, left) after the ring changes
+    """
+
+    def __init__(self, node_id, url, peers, lease_ttl=15, heartbeat_interval=5, token=None, timeout=2, on_change=None):
+        self.node_id = node_id
+        self.url = url
+        self.peers = [peer.rstrip("/") for peer in peers if peer.rstrip("/") != url.rstrip("/")]
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.timeout = timeout
+        self.on_change = on_change
+        self.session = requests.Session()
+        if token:
+            self.session.headers["X-Cluster-Token"] = token
+        self._members = {node_id: {"url": url, "expires": math.inf}}
+        self._lock = threading.Lock()
+        self._outbox = queue.Queue()
+        self.ring = HashRing([node_id])
+        self._threads = []
+
+    def start(self):
+        """Run one heartbeat round so the ring is known, then keep it fresh in the background."""
+        if self._threads:
+            return
+        self._heartbeat_round()
+        for target, name in ((self._heartbeat_forever, "cluster-heartbeat"), (self._send_forever, "cluster-sync")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def heartbeat(self, node_id, url):
+        """Renew a peer's lease. Returns this node's side of the exchange."""
+        with self._lock:
+            self._members[node_id] = {"url": url, "expires": time.monotonic() + self.lease_ttl}
+        return {"node_id": self.node_id, "url": self.url}
+
+    def owner(self, match_id):
+        return self.ring.owner(match_id)
+
+    def is_local(self, match_id):
+        return self.ring.owner(match_id) == self.node_id
+
+    def url_of(self, node_id):
+        member = self._members.get(node_id)
+        return member["url"] if member is not None else None
+
+    def members(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                node_id: {"url": member["url"], "lease_seconds": None if member["expires"] == math.inf else round(member["expires"] - now, 3)}
+                for node_id, member in self._members.items()
+            }
+
+    def post(self, node_id, path, payload):
+        """POST JSON to a member and return its decoded response; raises on failure."""
+        url = self.url_of(node_id)
+        if url is None:
+            raise RuntimeError(f"Unknown cluster node {node_id}")
+        response = self.session.post(f"{url.rstrip('/')}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get(self, node_id, path, params=None, headers=None, timeout=None):
+        """GET from a member; returns the requests response without raising on HTTP errors."""
+        url = self.url_of(node_id)
+        if url is None:
+            raise RuntimeError(f"Unknown cluster node {node_id}")
+        return self.session.get(f"{url.rstrip('/')}{path}", params=params, headers=headers, timeout=timeout or self.timeout)
+
+    def broadcast(self, path, item):
+        """Queue an item for every other member; items are sent in batches as {"items": [...]}."""
+        self._outbox.put((path, item))
+
+    def _heartbeat_round(self):
+        for peer in self.peers:
+            try:
+                response = self.session.post(
+                    f"{peer}/cluster/heartbeat", json={"node_id": self.node_id, "url": self.url}, timeout=self.timeout
+                )
+                response.raise_for_status()
+                reply = response.json()
+                self.heartbeat(reply["node_id"], reply.get("url") or peer)
+            except Exception as e:
+                logs.warning("Cluster heartbeat failed", peer=peer, phase="cluster", error=e)
+        self._refresh()
+
+    def _refresh(self):
+        """Drop expired leases and rebuild the ring if membership changed."""
+        now = time.monotonic()
+        with self._lock:
+            for node_id in [node_id for node_id, member in self._members.items() if member["expires"] < now]:
+                del self._members[node_id]
+            nodes = frozenset(self._members)
+        previous = self.ring.nodes
+        if nodes == previous:
+            return
+        self.ring = HashRing(nodes)
+        joined, left = nodes - previous, previous - nodes
+        logs.info("Cluster membership changed", joined=sorted(joined), left=sorted(left), phase="cluster")
+        if self.on_change is not None:
+            try:
+                self.on_change(joined, left)
+            except Exception as e:
+                logs.error("Error rebalancing cluster", phase="cluster", error=e)
+
+    def _heartbeat_forever(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            self._heartbeat_round()
+
+    def _send_forever(self):
+        while True:
+            batches = {}
+            path, item = self._outbox.get()
+            batches.setdefault(path, []).append(item)
+            # Everything queued meanwhile goes in the same request
+            while True:
+                try:
+                    path, item = self._outbox.get_nowait()
+                except queue.Empty:
+                    break
+                batches.setdefault(path, []).append(item)
+            for node_id in self.ring.nodes - {self.node_id}:
+                for path, items in batches.items():
+                    try:
+                        self.post(node_id, path, {"items": items})
+                    except Exception as e:
+                        logs.warning("Cluster sync failed", peer=node_id, phase="cluster", error=e)
@@ -0,0 +1,508 @@
+import asyncio
+import collections
+import concurrent.futures
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from breaker import CircuitOpenError
+from codec import cf_loads
+import logs
+from metrics import CF_REQUEST_SECONDS, CF_REQUESTS, CF_RATE_WAIT_SECONDS, CF_HEDGED_REQUESTS, POLL_PHASE_SECONDS
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is only needed for the asyncio tracking engine
+    aiohttp = None
+
+CF_API_URL = os.getenv("CF_API_URL", "https://codeforces.com/api")
+CALL_LIMIT_COMMENT = "Call limit exceeded"
+# user.info fails as a whole when it names a handle that does not exist
+HANDLE_NOT_FOUND = re.compile(r"User with handle (\S+) not found")
+# What a handle can contain; anything else could never be a Codeforces user
+HANDLE_PATTERN = re.compile(r"[\w.\-]{1,64}")
+
+HTTP_PHASE = POLL_PHASE_SECONDS.labels("http")
+DECODE_PHASE = POLL_PHASE_SECONDS.labels("decode")
+
+
+def is_call_limited(data):
+    return data.get("status") == "FAILED" and CALL_LIMIT_COMMENT in str(data.get("comment", ""))
+
+
+def call_outcome(data):
+    if data.get("status") == "OK":
+        return "ok"
+    return "throttled" if is_call_limited(data) else "failed"
+
+
+class CodeforcesError(Exception):
+    """The API answered with a non-OK status."""
+
+
+def api_result(data):
+    """Return the result of an API response, raising CodeforcesError if it failed."""
+    if data.get("status") != "OK":
+        raise CodeforcesError(data.get("comment") or data.get("status"))
+    return data["result"]
+
+
+def is_final(submission):
+    """A submission is final once it has a verdict other than TESTING."""
+    verdict = submission.get("verdict")
+    return verdict is not None and verdict != "TESTING"
+
+
+class SubmissionCursor:
+    """
+    Per-handle watermark over a user's submission history.
+
+    Each poll pages through user.status newest-first until it reaches
+    submissions already seen, so nothing submitted between polls is missed
+    while a quiet handle still costs a single count=1 request. Submissions
+    still being judged stay below the watermark until they get a verdict.
+
+    Args:
+        handle (str): Codeforces handle, or None for a contest feed
+        since (int): Before the first poll, only submissions created at or
+            after this unix time are considered new. None means only the
+            latest submission is.
+        max_count (int): Largest page size requested when catching up
+    """
+
+    def __init__(self, handle, since=None, max_count=1000):
+        self.handle = handle
+        self.since = since
+        self.max_count = max_count
+        self.last_id = None
+        self.pending = set()
+        self.count = 1
+        # Moving average of pages per poll, the cost of keeping this cursor current
+        self.avg_pages = 1.0
+        # Consecutive polls that found no new submission, and the
+        # ("contestId", "index") problems with a submission still being judged
+        self.idle_polls = 0
+        self.judging = set()
+
+    def _floor(self):
+        """Highest id below which every submission is known and final."""
+        if self.pending:
+            return min(self.pending) - 1
+        return self.last_id
+
+    def _is_unseen(self, submission, floor):
+        if floor is not None:
+            return submission["id"] > floor
+        return submission.get("creationTimeSeconds", 0) >= self.since
+
+    def pages(self):
+        """
+        Generator driving one poll: yields (from, count) page requests and
+        is sent each page's submission list in return. Returns the
+        submissions that are new or were still being judged, newest first.
+        The cursor only advances once the generator finishes, so an aborted
+        poll is simply retried.
+        """
+        floor = self._floor()
+        unseen = []
+        start, count = 1, self.count
+        pages = 0
+        while True:
+            page = yield start, count
+            pages += 1
+            if floor is None and self.since is None:
+                # Nothing to compare against yet: only the latest submission counts
+                unseen.extend(page[:1])
+                break
+            fresh = [s for s in page if self._is_unseen(s, floor)]
+            unseen.extend(fresh)
+            # Stop once the page reaches seen submissions or the end of history
+            if len(fresh) < len(page) or len(page) < count:
+                break
+            start += count
+            count = min(count * 2, self.max_count)
+
+        self.avg_pages = 0.75 * self.avg_pages + 0.25 * pages
+        if start > 1:
+            # Fell behind: ask for a bigger first page next time
+            self.count = min(self.count * 2, self.max_count)
+        else:
+            self.count = max(1, self.count // 2)
+
+        new = [s for s in unseen if self.last_id is None or s["id"] > self.last_id]
+        self.idle_polls = 0 if new else self.idle_polls + 1
+        if unseen:
+            self.last_id = max([s["id"] for s in unseen] + ([self.last_id] if self.last_id is not None else []))
+        self.pending = {s["id"] for s in unseen if not is_final(s)}
+        self.judging = {
+            (str(s.get("problem", {}).get("contestId")), s.get("problem", {}).get("index"))
+            for s in unseen if not is_final(s)
+        }
+        return unseen
+
+
+def drain(cursor, fetch_page):
+    """Run a cursor poll with a blocking fetch_page(start, count) -> submissions."""
+    plan = cursor.pages()
+    request = next(plan)
+    while True:
+        try:
+            request = plan.send(fetch_page(*request))
+        except StopIteration as stop:
+            return stop.value
+
+
+async def async_drain(cursor, fetch_page):
+    """Run a cursor poll with a coroutine fetch_page(start, count) -> submissions."""
+    plan = cursor.pages()
+    request = next(plan)
+    while True:
+        try:
+            request = plan.send(await fetch_page(*request))
+        except StopIteration as stop:
+            return stop.value
+
+
+class LatencyWindow:
+    """Latencies of the most recent answered calls of one API method."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = collections.deque(maxlen=size)
+        self._sorted = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._sorted = None
+
+    def quantile(self, q):
+        """Latency at quantile q of the window, or None until it holds min_samples calls."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            if self._sorted is None:
+                self._sorted = sorted(self._samples)
+            return self._sorted[min(int(len(self._sorted) * q), len(self._sorted) - 1)]
+
+
+class CodeforcesClient:
+    """
+    Blocking Codeforces API client backed by one pooled keep-alive session.
+
+    Calls that fail (connection errors, timeouts, unparseable responses)
+    count against the circuit breaker; while it is open calls raise
+    CircuitOpenError without touching the network or the rate budget. A
+    call made with hedge=True that is still unanswered at the
+    `hedge_quantile` latency of its method sends a second identical request
+    if the rate budget has a token to spare, and takes whichever answers first.
+
+    Args:
+        pool_size (int): Maximum number of kept-alive connections to codeforces.com
+        governor (RateGovernor): Rate budget every call waits on, if any
+        timeout (tuple): (connect, read) timeouts of one request in seconds
+        breaker (CircuitBreaker): Breaker shared by every call, if any
+        hedge_quantile (float): Latency quantile after which hedged calls send a second request, 0 disables
+    """
+
+    def __init__(self, pool_size=16, governor=None, timeout=(3.05, 10), breaker=None, hedge_quantile=0.95):
+        self.governor = governor
+        self.timeout = timeout
+        self.breaker = breaker
+        self.hedge_quantile = hedge_quantile
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.latency = collections.defaultdict(LatencyWindow)
+        self._hedge_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="cf-hedge"
+        ) if hedge_quantile else None
+
+    def call(self, method, hedge=False, tenant=None, **params):
+        """Call an API method for a tenant and return the decoded JSON response."""
+        if self.breaker is not None and not self.breaker.allow():
+            CF_REQUESTS.labels(method, "refused").inc()
+            raise CircuitOpenError(f"Codeforces calls are paused: {self.breaker.last_error}")
+        if self.governor is not None:
+            waited = time.perf_counter()
+            self.governor.acquire(tenant)
+            CF_RATE_WAIT_SECONDS.observe(time.perf_counter() - waited)
+        started = time.perf_counter()
+        try:
+            if hedge and self._hedge_pool is not None:
+                data = self._hedged_get(method, params)
+            else:
+                data = self._get(method, params)
+        except Exception as e:
+            CF_REQUESTS.labels(method, "error").inc()
+            if self.breaker is not None:
+                self.breaker.record_failure(e)
+            raise
+        finally:
+            CF_REQUEST_SECONDS.labels(method).observe(time.perf_counter() - started)
+        if self.breaker is not None:
+            self.breaker.record_success()
+        CF_REQUESTS.labels(method, call_outcome(data)).inc()
+        if self.governor is not None and is_call_limited(data):
+            logs.warning("Codeforces call limit exceeded, backing off", method=method, phase="http")
+            self.governor.penalize()
+        return data
+
+    def _get(self, method, params):
+        started = time.perf_counter()
+        response = self.session.get(f"{CF_API_URL}/{method}", params=params, timeout=self.timeout)
+        body = response.content
+        fetched = time.perf_counter()
+        data = cf_loads(method, body)
+        decoded = time.perf_counter()
+        HTTP_PHASE.observe(fetched - started)
+        DECODE_PHASE.observe(decoded - fetched)
+        self.latency[method].observe(decoded - started)
+        return data
+
+    def _hedged_get(self, method, params):
+        first = self._hedge_pool.submit(self._get, method, params)
+        done, _ = concurrent.futures.wait([first], timeout=self.latency[method].quantile(self.hedge_quantile))
+        if done or (self.governor is not None and not self.governor.try_acquire()):
+            return first.result()
+
+        second = self._hedge_pool.submit(self._get, method, params)
+        error = None
+        for future in concurrent.futures.as_completed((first, second)):
+            try:
+                data = future.result()
+            except Exception as e:
+                error = e
+                continue
+            CF_HEDGED_REQUESTS.labels(method, "hedge" if future is second else "original").inc()
+            return data
+        raise error
+
+    def user_status(self, handle, start=1, count=1, hedge=False, tenant=None):
+        return self.call("user.status", hedge=hedge, tenant=tenant, handle=handle, **{"from": start, "count": count})
+
+    def new_submissions(self, cursor, hedge=False, tenant=None):
+        """Submissions of the cursor's handle made since its last poll."""
+        return drain(cursor, lambda start, count: api_result(self.user_status(cursor.handle, start, count, hedge, tenant)))
+
+    def contest_status(self, contest_id, start=1, count=1, hedge=False, tenant=None):
+        return self.call("contest.status", hedge=hedge, tenant=tenant, contestId=contest_id, **{"from": start, "count": count})
+
+    def new_contest_submissions(self, contest_id, cursor, hedge=False, tenant=None):
+        """Submissions of every user in a contest made since the cursor's last poll."""
+        return drain(cursor, lambda start, count: api_result(self.contest_status(contest_id, start, count, hedge, tenant)))
+
+    def user_info(self, handles):
+        return self.call("user.info", handles=";".join(handles))
+
+
+class AsyncCodeforcesClient:
+    """
+    asyncio Codeforces API client sharing one aiohttp connection pool.
+
+    The session is created lazily so it binds to the event loop that first
+    uses it.
+
+    Timeouts, the circuit breaker and hedging work as in CodeforcesClient.
+
+    Args:
+        pool_size (int): Maximum number of concurrent connections to codeforces.com
+        governor (RateGovernor): Rate budget every call waits on, if any
+        timeout (tuple): (connect, read) timeouts of one request in seconds
+        breaker (CircuitBreaker): Breaker shared by every call, if any
+        hedge_quantile (float): Latency quantile after which hedged calls send a second request, 0 disables
+    """
+
+    def __init__(self, pool_size=100, governor=None, timeout=(3.05, 10), breaker=None, hedge_quantile=0.95):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for the asyncio tracking engine")
+        self.governor = governor
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.breaker = breaker
+        self.hedge_quantile = hedge_quantile
+        self.latency = collections.defaultdict(LatencyWindow)
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=30,
+                ttl_dns_cache=300
+            )
+            connect, read = self.timeout
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+            )
+        return self._session
+
+    async def call(self, method, hedge=False, tenant=None, **params):
+        """Call an API method for a tenant and return the decoded JSON response."""
+        if self.breaker is not None and not self.breaker.allow():
+            CF_REQUESTS.labels(method, "refused").inc()
+            raise CircuitOpenError(f"Codeforces calls are paused: {self.breaker.last_error}")
+        if self.governor is not None:
+            waited = time.perf_counter()
+            await self.governor.acquire_async(tenant)
+            CF_RATE_WAIT_SECONDS.observe(time.perf_counter() - waited)
+        started = time.perf_counter()
+        try:
+            if hedge and self.hedge_quantile:
+                data = await self._hedged_get(method, params)
+            else:
+                data = await self._get(method, params)
+        except Exception as e:
+            CF_REQUESTS.labels(method, "error").inc()
+            if self.breaker is not None:
+                self.breaker.record_failure(e)
+            raise
+        finally:
+            CF_REQUEST_SECONDS.labels(method).observe(time.perf_counter() - started)
+        if self.breaker is not None:
+            self.breaker.record_success()
+        CF_REQUESTS.labels(method, call_outcome(data)).inc()
+        if self.governor is not None and is_call_limited(data):
+            logs.warning("Codeforces call limit exceeded, backing off", method=method, phase="http")
+            self.governor.penalize()
+        return data
+
+    async def _get(self, method, params):
+        started = time.perf_counter()
+        async with self._get_session().get(f"{CF_API_URL}/{method}", params=params) as response:
+            body = await response.read()
+        fetched = time.perf_counter()
+        data = cf_loads(method, body)
+        decoded = time.perf_counter()
+        HTTP_PHASE.observe(fetched - started)
+        DECODE_PHASE.observe(decoded - fetched)
+        self.latency[method].observe(decoded - started)
+        return data
+
+    async def _hedged_get(self, method, params):
+        first = asyncio.ensure_future(self._get(method, params))
+        done, _ = await asyncio.wait([first], timeout=self.latency[method].quantile(self.hedge_quantile))
+        if done or (self.governor is not None and not self.governor.try_acquire()):
+            return await first
+
+        second = asyncio.ensure_future(self._get(method, params))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                CF_HEDGED_REQUESTS.labels(method, "hedge" if task is second else "original").inc()
+                return task.result()
+        raise error
+
+    async def user_status(self, handle, start=1, count=1, hedge=False, tenant=None):
+        return await self.call("user.status", hedge=hedge, tenant=tenant, handle=handle, **{"from": start, "count": count})
+
+    async def new_submissions(self, cursor, hedge=False, tenant=None):
+        """Submissions of the cursor's handle made since its last poll."""
+        async def fetch_page(start, count):
+            return api_result(await self.user_status(cursor.handle, start, count, hedge, tenant))
+        return await async_drain(cursor, fetch_page)
+
+    async def contest_status(self, contest_id, start=1, count=1, hedge=False, tenant=None):
+        return await self.call("contest.status", hedge=hedge, tenant=tenant, contestId=contest_id, **{"from": start, "count": count})
+
+    async def new_contest_submissions(self, contest_id, cursor, hedge=False, tenant=None):
+        """Submissions of every user in a contest made since the cursor's last poll."""
+        async def fetch_page(start, count):
+            return api_result(await self.contest_status(contest_id, start, count, hedge, tenant))
+        return await async_drain(cursor, fetch_page)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class HandleDirectory:
+    """
+    Which Codeforces handles exist, with their canonical casing, looked up
+    in batches through user.info and cached for `ttl` seconds.
+
+    Args:
+        client (CodeforcesClient): Client the lookups go through
+        ttl (float): Seconds a lookup stays cached
+        batch_size (int): Handles per user.info call
+    """
+
+    def __init__(self, client, ttl=6 * 3600, batch_size=300):
+        self.client = client
+        self.ttl = ttl
+        self.batch_size = batch_size
+        # Lowercased handle -> (canonical handle or None if it does not exist, expiry)
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, handle):
+        entry = self._handles.get(handle.lower())
+        if entry is not None and entry[1] > time.monotonic():
+            return entry
+        return None
+
+    def canonical(self, handle):
+        """The handle as Codeforces spells it, if known, else as given."""
+        entry = self._cached(handle)
+        return entry[0] if entry is not None and entry[0] is not None else handle
+
+    def _store(self, handle, canonical):
+        with self._lock:
+            self._handles[handle.lower()] = (canonical, time.monotonic() + self.ttl)
+
+    def _lookup(self, batch):
+        """
+        One user.info call per unknown handle in the batch plus one: a call
+        naming a handle that does not exist fails as a whole, so that handle
+        is recorded as missing and the call repeated without it.
+        """
+        batch = list(batch)
+        while batch:
+            data = self.client.user_info(batch)
+            if data.get("status") == "OK":
+                for user in data["result"]:
+                    self._store(user["handle"], user["handle"])
+                return
+            missing = HANDLE_NOT_FOUND.search(str(data.get("comment", "")))
+            if missing is None or missing.group(1).lower() not in {handle.lower() for handle in batch}:
+                raise CodeforcesError(data.get("comment") or data.get("status"))
+            self._store(missing.group(1), None)
+            batch = [handle for handle in batch if handle.lower() != missing.group(1).lower()]
+
+    def resolve(self, handles):
+        """
+        Validate handles, looking up the ones not cached.
+
+        Returns:
+            dict: Handle -> canonical handle, or None if it does not exist
+
+        Raises:
+            CodeforcesError, CircuitOpenError, requests.RequestException:
+                A lookup failed for another reason, so validity is unknown
+        """
+        unknown = []
+        for handle in dict.fromkeys(handles):
+            if HANDLE_PATTERN.fullmatch(handle or "") and self._cached(handle) is None:
+                unknown.append(handle)
+        for index in range(0, len(unknown), self.batch_size):
+            self._lookup(unknown[index:index + self.batch_size])
+        resolved = {}
+        for handle in handles:
+            entry = self._cached(handle) if HANDLE_PATTERN.fullmatch(handle or "") else None
+            resolved[handle] = entry[0] if entry is not None else None
+        return resolved
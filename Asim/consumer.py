@@ -0,0 +1,136 @@
+import functools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pika
+
+import logs
+
+
+class MatchConsumer:
+    """
+    Manual-ack consumer that hands messages to a worker pool.
+
+    The broker delivers up to `prefetch` unacked messages at once, so a whole
+    round published together is pulled in a single burst. Each message is
+    acked only after its handler reports success; failures are requeued
+    once and then rejected. The consumer reconnects forever with jittered
+    exponential backoff. While `paused()` is true it holds no connection, so
+    the broker keeps the messages, including the prefetched unacked ones,
+    for other consumers.
+
+    Args:
+        url (str): AMQP connection URL
+        queue (str): Queue to consume
+        handler (callable): Called as handler(ch, method, properties, body)
+            on a worker thread. Returns True once the message is handled,
+            False if it can never be handled.
+        prefetch (int): basic_qos prefetch count
+        workers (int): Threads running the handler
+        max_backoff (float): Longest wait between reconnect attempts, in seconds
+        paused (callable): Returns True while no messages may be taken
+    """
+
+    def __init__(self, url, queue, handler, prefetch=64, workers=4, max_backoff=30, paused=None):
+        self.url = url
+        self.queue = queue
+        self.handler = handler
+        self.prefetch = prefetch
+        self.max_backoff = max_backoff
+        self.paused = paused
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="match-consumer")
+        self._thread = None
+        self._connection = None
+        self.received = 0
+        self.acked = 0
+        self.rejected = 0
+        self.reconnects = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._consume_forever, name="match-subscriber", daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        return {
+            "connected": self._connection is not None and self._connection.is_open,
+            "received": self.received,
+            "acked": self.acked,
+            "rejected": self.rejected,
+            "reconnects": self.reconnects
+        }
+
+    def _is_paused(self):
+        return self.paused is not None and self.paused()
+
+    def _consume_forever(self):
+        backoff = 1
+        while True:
+            if self._is_paused():
+                time.sleep(0.1)
+                continue
+            try:
+                self._connection = pika.BlockingConnection(pika.URLParameters(self.url))
+                channel = self._connection.channel()
+                channel.queue_declare(queue=self.queue, durable=True)
+                channel.basic_qos(prefetch_count=self.prefetch)
+                channel.basic_consume(queue=self.queue, on_message_callback=self._on_message, auto_ack=False)
+
+                logs.info("Waiting for messages", queue=self.queue, phase="consume")
+                backoff = 1
+                while not self._is_paused():
+                    self._connection.process_data_events(time_limit=1)
+                logs.info("Consumer paused, returning unacked messages", queue=self.queue, phase="consume")
+                continue
+            except Exception as e:
+                logs.warning("Consumer connection lost, reconnecting", queue=self.queue, phase="consume",
+                             retry_seconds=backoff, error=e)
+            finally:
+                self._close()
+            self.reconnects += 1
+            time.sleep(backoff * random.uniform(0.5, 1.5))
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _close(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+    def _on_message(self, ch, method, properties, body):
+        self.received += 1
+        self._pool.submit(self._handle, ch, method, properties, body)
+
+    def _handle(self, ch, method, properties, body):
+        try:
+            handled = self.handler(ch, method, properties, body)
+            requeue = False
+        except Exception as e:
+            logs.error("Error handling message", queue=self.queue, phase="consume", error=e)
+            handled = False
+            # Give a transient failure one more delivery
+            requeue = not method.redelivered
+        self._settle(ch, method.delivery_tag, handled, requeue)
+
+    def _settle(self, ch, delivery_tag, handled, requeue):
+        """Ack or reject on the connection's own thread; pika channels are not thread safe."""
+        connection = ch.connection
+        if handled:
+            callback = functools.partial(ch.basic_ack, delivery_tag=delivery_tag)
+        else:
+            callback = functools.partial(ch.basic_nack, delivery_tag=delivery_tag, requeue=requeue)
+        try:
+            connection.add_callback_threadsafe(callback)
+        except Exception as e:
+            # Connection is gone; the broker redelivers the message after reconnect
+            logs.error("Could not settle message", queue=self.queue, delivery_tag=delivery_tag, phase="consume", error=e)
+            return
+        if handled:
+            self.acked += 1
+        else:
+            self.rejected += 1
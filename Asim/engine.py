@@ -0,0 +1,18 @@
+"""
+Tracking engine process: consumes the matches queue, polls Codeforces and
+publishes winners, and serves its state to API workers on ENGINE_SOCKET.
+
+    python engine.py
+    gunicorn -w 4 --worker-class gthread --threads 64 wsgi:application
+"""
+import os
+import threading
+
+os.environ.setdefault('PROCESS_ROLE', 'engine')
+
+import app as tracking_app  # noqa: E402  importing starts the engine
+import logs  # noqa: E402
+
+if __name__ == '__main__':
+    logs.info("Tracking engine running", node=tracking_app.NODE_ID, role=tracking_app.PROCESS_ROLE)
+    threading.Event().wait()
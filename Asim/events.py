@@ -0,0 +1,95 @@
+import collections
+import itertools
+import threading
+import time
+
+import codec
+
+
+class Event:
+    __slots__ = ("id", "type", "data", "time")
+
+    def __init__(self, id, type, data, time):
+        self.id = id
+        self.type = type
+        self.data = data
+        self.time = time
+
+    def to_sse(self):
+        return f"id: {self.id}\nevent: {self.type}\ndata: {codec.dumps(self.data).decode()}\n\n"
+
+
+class EventBus:
+    """
+    In-memory ring buffer of tracking events with blocking reads.
+
+    Every event gets an increasing id, so a client that reconnects with the
+    last id it saw gets exactly what it missed. A client that fell further
+    behind than the buffer, or holds an id this bus never handed out, gets
+    a single "reset" event telling it to refetch full state.
+
+    Ids start from the boot time in microseconds, so a restarted process
+    numbers its events above any id of its previous run, and clients
+    resuming from one of those get the reset instead of silently skipping
+    the new events.
+
+    Args:
+        max_events (int): Events kept for resuming clients
+    """
+
+    def __init__(self, max_events=10000):
+        self._events = collections.deque(maxlen=max_events)
+        self._cond = threading.Condition()
+        self.last_id = int(time.time() * 1_000_000)
+
+    def publish(self, event_type, data, id=None):
+        """Append an event. `id` keeps the id an upstream bus gave it, when replaying."""
+        with self._cond:
+            if id is not None and id <= self.last_id:
+                return self.last_id
+            self.last_id = id if id is not None else self.last_id + 1
+            self._events.append(Event(self.last_id, event_type, data, time.time()))
+            self._cond.notify_all()
+            return self.last_id
+
+    def reset(self, last_id):
+        """Drop buffered events and continue numbering after last_id."""
+        with self._cond:
+            self._events.clear()
+            self.last_id = last_id
+            self._cond.notify_all()
+
+    def _after(self, last_id, predicate):
+        """Events after last_id matching predicate. Must hold the condition."""
+        if last_id < self.last_id - len(self._events) or last_id > self.last_id:
+            reason = "events expired" if last_id < self.last_id else "unknown event id"
+            return [Event(self.last_id, "reset", {"reason": reason, "last_event_id": self.last_id}, time.time())]
+        if last_id == self.last_id:
+            return []
+        # Ids are contiguous, so skip straight to the first unseen event
+        start = len(self._events) - (self.last_id - last_id)
+        return [
+            event for event in itertools.islice(self._events, max(start, 0), None)
+            if predicate is None or predicate(event)
+        ]
+
+    def wait(self, last_id, timeout, predicate=None):
+        """
+        Block until there are events after last_id matching predicate, or
+        until timeout seconds pass.
+
+        Returns:
+            list: Matching events, possibly empty on timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                events = self._after(last_id, predicate)
+                if events:
+                    return events
+                # Non-matching events still move the cursor forward
+                last_id = self.last_id
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
@@ -0,0 +1,296 @@
+import asyncio
+import threading
+import time
+
+# Relative share of the request budget per tournament level (1 = round of 32, 5 = final)
+LEVEL_WEIGHTS = {1: 1, 2: 1, 3: 2, 4: 3, 5: 4}
+# Fallback for matches without a level, keyed on the backend's match id prefixes
+MATCH_ID_WEIGHTS = [
+    ("ROUND-OF-32", 1),
+    ("ROUND-OF-16", 1),
+    ("QUARTER-FINAL", 2),
+    ("SEMI-FINAL", 3),
+    ("FINAL", 4),
+]
+
+
+def match_weight(match_id, level=None):
+    """Budget weight of a match, from its level or else its match id."""
+    try:
+        if level is not None:
+            return LEVEL_WEIGHTS.get(int(level), 1)
+    except (TypeError, ValueError):
+        pass
+    for prefix, weight in MATCH_ID_WEIGHTS:
+        if str(match_id).startswith(prefix):
+            return weight
+    return 1
+
+
+class RateGovernor:
+    """
+    Process-wide token bucket that every Codeforces call goes through.
+
+    Callers reserve a token and sleep until it is theirs, so requests leave
+    the process in reservation order at no more than `rate` per second. The
+    budget is split across registered matches by weight to derive each
+    match's poll cadence.
+
+    Keys belong to tenants (tournaments sharing the process). Each tenant
+    with registered keys is guaranteed its share of the rate, and whatever
+    a tenant does not use goes to the others (max-min fair), so a busy
+    tournament is slowed down to its budget instead of every tournament
+    being slowed down with it.
+
+    Args:
+        rate (float): Sustained Codeforces calls per second for the process
+        burst (int): Maximum number of calls allowed back to back
+        min_interval (float): Fastest poll cadence any match may get, in seconds
+        shares (dict): Relative budget share per tenant
+        default_share (float): Share of tenants not in shares
+    """
+
+    def __init__(self, rate=0.5, burst=1, min_interval=5, shares=None, default_share=1):
+        self.rate = rate
+        self.burst = burst
+        self.min_interval = min_interval
+        self.shares = dict(shares or {})
+        self.default_share = default_share
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        # key -> weight, and key -> wall clock time of its last completed poll
+        self._weights = {}
+        self._last_poll = {}
+        # key -> calls per second it would make at its preferred cadence
+        self._demand = {}
+        # key -> tenant whose budget it is charged to, and tenant -> number of its keys
+        self._tenants = {}
+        self._tenant_keys = {}
+        # tenant -> (tokens, monotonic time) of its own bucket, used while several tenants have keys
+        self._tenant_buckets = {}
+        self.throttled = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait before using it."""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def reserve_tenant(self, tenant):
+        """
+        Take one token of a tenant's own bucket, which refills at the
+        tenant's budget, and return how long the caller must wait before it
+        may reserve a shared token. A tenant calling past its budget then
+        queues behind its own calls instead of everyone's. Free while at
+        most one tenant has keys, and for calls made for no tenant.
+        """
+        with self._lock:
+            if tenant is None or len(self._tenant_keys) <= 1:
+                return 0
+            tokens, rate = self._tenant_tokens(tenant)
+            self._tenant_buckets[tenant] = (tokens - 1, time.monotonic())
+            return (1 - tokens) / rate if tokens < 1 else 0
+
+    def tenant_wait(self, tenant):
+        """How long a call for tenant would wait on its own bucket now, without taking a token."""
+        with self._lock:
+            if tenant is None or len(self._tenant_keys) <= 1:
+                return 0
+            tokens, rate = self._tenant_tokens(tenant)
+            return (1 - tokens) / rate if tokens < 1 else 0
+
+    def _tenant_tokens(self, tenant):
+        """Refilled tokens of a tenant's bucket and the budget it refills at. Must hold the lock."""
+        rate = self._budget(tenant, self._budgets(self._tenant_demand()))
+        now = time.monotonic()
+        tokens, updated = self._tenant_buckets.get(tenant, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * rate), rate
+
+    def acquire(self, tenant=None):
+        time.sleep(self.reserve_tenant(tenant))
+        time.sleep(self.reserve())
+
+    def try_acquire(self):
+        """Take a token only if one is free right now, without waiting or going into debt."""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    async def acquire_async(self, tenant=None):
+        await asyncio.sleep(self.reserve_tenant(tenant))
+        await asyncio.sleep(self.reserve())
+
+    def penalize(self, seconds=None):
+        """Codeforces reported "Call limit exceeded": push every pending reservation back."""
+        if seconds is None:
+            seconds = 1 / self.rate
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+            self.throttled += 1
+
+    def register(self, key, weight=1, tenant=None):
+        """Add or re-weight a key of a tenant. Weight 0 tracks staleness without a budget share."""
+        with self._lock:
+            self._weights[key] = max(weight, 0)
+            if key in self._tenants:
+                self._drop_tenant_key(key)
+            self._tenants[key] = tenant
+            self._tenant_keys[tenant] = self._tenant_keys.get(tenant, 0) + 1
+            self._last_poll.setdefault(key, None)
+
+    def unregister(self, key):
+        with self._lock:
+            self._weights.pop(key, None)
+            if key in self._tenants:
+                self._drop_tenant_key(key)
+            self._last_poll.pop(key, None)
+            self._demand.pop(key, None)
+
+    def _drop_tenant_key(self, key):
+        """Must hold the lock."""
+        tenant = self._tenants.pop(key)
+        self._tenant_keys[tenant] -= 1
+        if not self._tenant_keys[tenant]:
+            del self._tenant_keys[tenant]
+            self._tenant_buckets.pop(tenant, None)
+
+    def share(self, tenant):
+        return self.shares.get(tenant, self.default_share)
+
+    def _tenant_demand(self):
+        """Declared calls per second per tenant. Must hold the lock."""
+        demand = {}
+        for key, calls in self._demand.items():
+            tenant = self._tenants.get(key)
+            demand[tenant] = demand.get(tenant, 0) + calls
+        return demand
+
+    def _budgets(self, demand):
+        """
+        Calls per second each tenant may make. Tenants asking for less than
+        their share of what is left get what they ask for; the rest is split
+        by share among the others. Must hold the lock.
+        """
+        budgets = {}
+        remaining = self.rate
+        pending = dict(demand)
+        while pending:
+            shares = sum(self.share(tenant) for tenant in pending) or 1
+            satisfied = {
+                tenant: calls for tenant, calls in pending.items()
+                if calls <= remaining * self.share(tenant) / shares
+            }
+            if not satisfied:
+                for tenant in pending:
+                    budgets[tenant] = remaining * self.share(tenant) / shares
+                break
+            for tenant, calls in satisfied.items():
+                budgets[tenant] = calls
+                remaining -= calls
+                del pending[tenant]
+        return budgets
+
+    def _budget(self, tenant, budgets):
+        """
+        Budget of a tenant: at least its share of the rate among tenants
+        with registered keys, however little it declared. Must hold the lock.
+        """
+        shares = sum(self.share(other) for other in self._tenant_keys)
+        if tenant not in self._tenant_keys:
+            shares += self.share(tenant)
+        guaranteed = self.rate * self.share(tenant) / (shares or 1)
+        return max(budgets.get(tenant, 0), guaranteed)
+
+    def record_poll(self, key):
+        with self._lock:
+            if key in self._weights:
+                self._last_poll[key] = time.time()
+
+    def set_demand(self, key, calls_per_second):
+        """Declare how many calls per second key would make at its preferred cadence."""
+        with self._lock:
+            if key in self._weights:
+                self._demand[key] = calls_per_second
+
+    def demand(self, keys=None):
+        """Declared calls per second of the given keys, or of every key."""
+        with self._lock:
+            if keys is None:
+                return sum(self._demand.values())
+            return sum(self._demand.get(key, 0) for key in keys)
+
+    def paced(self, interval, key=None):
+        """
+        Stretch a preferred poll interval so that the declared demand of all
+        keys together fits within the rate. Keys that back off while idle
+        lower the demand, which leaves room for busy ones to poll faster.
+        Given the key being paced, only its tenant's demand is stretched to
+        fit the tenant's budget.
+        """
+        with self._lock:
+            if key is None:
+                demand, budget = sum(self._demand.values()), self.rate
+            else:
+                tenant = self._tenants.get(key)
+                demand = self._tenant_demand()
+                budget = self._budget(tenant, self._budgets(demand))
+                demand = demand.get(tenant, 0)
+        return interval * max(1.0, demand / budget)
+
+    def tenants(self):
+        """Registered keys, weight, declared demand and budget of every tenant."""
+        with self._lock:
+            demand = self._tenant_demand()
+            budgets = self._budgets(demand)
+            tenants = {}
+            for key, weight in self._weights.items():
+                entry = tenants.setdefault(self._tenants.get(key), {"keys": 0, "weight": 0})
+                entry["keys"] += 1
+                entry["weight"] += weight
+            for tenant, entry in tenants.items():
+                budget = self._budget(tenant, budgets)
+                entry["share"] = self.share(tenant)
+                entry["demand"] = round(demand.get(tenant, 0), 3)
+                entry["budget"] = round(budget, 3)
+                # How much the tenant's preferred poll intervals are being stretched
+                entry["pace"] = round(max(1.0, demand.get(tenant, 0) / budget), 3)
+            return tenants
+
+    def staleness(self):
+        """Seconds since each registered match was last polled (None if never)."""
+        now = time.time()
+        with self._lock:
+            return {
+                key: {
+                    "weight": weight,
+                    "last_poll": self._last_poll.get(key),
+                    "stale_seconds": None if self._last_poll.get(key) is None else round(now - self._last_poll[key], 3)
+                }
+                for key, weight in self._weights.items()
+            }
+
+    def stats(self):
+        with self._lock:
+            self._refill()
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 3),
+                "active_matches": len(self._weights),
+                "total_weight": sum(self._weights.values()),
+                "demand": round(sum(self._demand.values()), 3),
+                "throttled": self.throttled
+            }
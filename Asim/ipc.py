@@ -0,0 +1,180 @@
+import os
+import socket
+import socketserver
+import threading
+import time
+
+import codec
+import logs
+
+SNAPSHOT = "snapshot"
+EVENT = "event"
+PING = "ping"
+
+
+def send_message(wfile, message):
+    wfile.write(codec.dumps(message) + b"\n")
+    wfile.flush()
+
+
+class EngineServer:
+    """
+    Local IPC endpoint of the tracking engine on a Unix socket.
+
+    A connection either subscribes to the engine's state, receiving one
+    snapshot of the tracking registry followed by every event published
+    on the event bus, or sends one request that `handler` answers. Messages
+    are JSON lines.
+
+    Args:
+        path (str): Unix socket path
+        registry (TrackingRegistry): Registry the snapshot is taken from
+        event_bus (EventBus): Bus whose events are streamed to subscribers
+        handler (callable): Called with a request dict, returns a reply dict
+        heartbeat (float): Seconds between pings on an idle subscription
+    """
+
+    def __init__(self, path, registry, event_bus, handler, heartbeat=15):
+        self.path = path
+        self.registry = registry
+        self.event_bus = event_bus
+        self.handler = handler
+        self.heartbeat = heartbeat
+        self._server = None
+
+    def start(self):
+        if self._server is not None:
+            return
+        if os.path.exists(self.path):
+            # Left behind by a previous engine
+            os.unlink(self.path)
+        engine = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = codec.loads(self.rfile.readline())
+                    if request.get("op") == "subscribe":
+                        engine._stream(self.wfile)
+                    else:
+                        send_message(self.wfile, engine.handler(request))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                except Exception as e:
+                    logs.error("Error serving engine client", phase="ipc", error=e)
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="engine-ipc", daemon=True).start()
+
+    def _snapshot(self, wfile):
+        # Taking the id first means events racing the snapshot are sent again, which replays harmlessly
+        last_id = self.event_bus.last_id
+        records = [
+            {"match_id": record.match_id, "round": record.round, "data": record.data}
+            for record in self.registry.records()
+        ]
+        send_message(wfile, {"type": SNAPSHOT, "last_event_id": last_id, "records": records})
+        return last_id
+
+    def _stream(self, wfile):
+        last_id = self._snapshot(wfile)
+        while True:
+            events = self.event_bus.wait(last_id, self.heartbeat)
+            if not events:
+                send_message(wfile, {"type": PING})
+                continue
+            for event in events:
+                if event.type == "reset":
+                    # The subscriber fell behind the event buffer
+                    last_id = self._snapshot(wfile)
+                    break
+                last_id = event.id
+                record = self.registry.record(event.data.get("match_id"))
+                send_message(wfile, {
+                    "type": EVENT, "id": event.id, "event": event.type, "data": event.data,
+                    "round": record.round if record is not None else None
+                })
+
+
+class EngineReplica:
+    """
+    Read-only replica of the engine's tracking registry and event bus,
+    kept current over the engine's IPC socket. Status reads and event
+    streams are then served from local memory in every HTTP worker.
+
+    Args:
+        path (str): Unix socket path of the engine
+        registry (TrackingRegistry): Local registry to mirror into
+        event_bus (EventBus): Local bus the engine's events are replayed on
+        timeout (float): Seconds to wait on a silent engine before reconnecting
+    """
+
+    def __init__(self, path, registry, event_bus, timeout=60):
+        self.path = path
+        self.registry = registry
+        self.event_bus = event_bus
+        self.timeout = timeout
+        self.synced = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._follow_forever, name="engine-replica", daemon=True)
+            self._thread.start()
+        return self
+
+    def _connect(self, timeout):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(self.path)
+        return sock
+
+    def request(self, message, timeout=None):
+        """Send one request to the engine and return its reply."""
+        with self._connect(timeout or self.timeout) as sock:
+            sock.sendall(codec.dumps(message) + b"\n")
+            with sock.makefile("rb") as rfile:
+                line = rfile.readline()
+        if not line:
+            raise ConnectionError("Engine closed the connection")
+        return codec.loads(line)
+
+    def _apply_snapshot(self, message):
+        records = {record["match_id"]: record for record in message["records"]}
+        for match_id in list(self.registry.snapshot()):
+            if match_id not in records:
+                self.registry.remove(match_id)
+        for match_id, record in records.items():
+            self.registry.put(match_id, record["data"], round=record["round"])
+        self.event_bus.reset(message["last_event_id"])
+        self.synced.set()
+
+    def _apply_event(self, message):
+        match_id = message["data"].get("match_id")
+        if message["event"] == "tracking":
+            self.registry.put(match_id, message["data"], round=message["round"])
+        elif message["event"] == "released":
+            self.registry.remove(match_id)
+        self.event_bus.publish(message["event"], message["data"], id=message["id"])
+
+    def _follow(self):
+        with self._connect(self.timeout) as sock:
+            sock.sendall(b'{"op":"subscribe"}\n')
+            with sock.makefile("rb") as rfile:
+                for line in rfile:
+                    message = codec.loads(line)
+                    if message["type"] == SNAPSHOT:
+                        self._apply_snapshot(message)
+                    elif message["type"] == EVENT:
+                        self._apply_event(message)
+
+    def _follow_forever(self):
+        while True:
+            try:
+                self._follow()
+                logs.warning("Engine closed the state stream, reconnecting", phase="ipc")
+            except Exception as e:
+                logs.warning("Lost the engine state stream, reconnecting", phase="ipc", retry_seconds=1, error=e)
+            self.synced.clear()
+            time.sleep(1)
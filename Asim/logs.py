@@ -0,0 +1,249 @@
+import atexit
+import datetime
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import codec
+from metrics import LOG_RECORDS
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+# Fields shown first in text output, in this order
+KEY_FIELDS = ("match", "handle", "phase")
+
+# Children are cached since they are counted on every record
+WRITTEN = LOG_RECORDS.labels("written")
+DEDUPLICATED = LOG_RECORDS.labels("deduplicated")
+RATE_LIMITED = LOG_RECORDS.labels("rate_limited")
+DROPPED = LOG_RECORDS.labels("dropped")
+
+
+def _error_kind(error):
+    """What makes two errors the same for deduplication: the exception type, not its text (which names the handle)."""
+    return type(error).__name__ if isinstance(error, BaseException) else error
+
+
+class AsyncLogger:
+    """
+    Structured logger whose records are written by a background thread.
+
+    log() builds a record dict and puts it on a bounded queue; formatting
+    and the write to the stream happen on the writer thread, one write per
+    batch, so a poll never waits on stdout. When the queue is full the
+    record is dropped and counted, never blocking the caller. Records are
+    JSON lines ({"ts", "level", "msg", "match", "handle", "phase", ...}) or
+    a readable text line.
+
+    Warnings and errors repeating the same message, phase and error type
+    within `dedup_window` seconds are logged once, followed by one record
+    with how many times they repeated. Past that, at most `rate` records per
+    second (bursts of `burst`) are accepted; the rest are counted and
+    reported in the next record about lost logs.
+
+    Args:
+        stream (file): Where records are written, sys.stdout (as it is at write time) if None
+        level (str): Lowest level written: debug, info, warning or error
+        fmt (str): "json" for JSON lines or "text"
+        buffer_size (int): Records queued for the writer before new ones are dropped
+        rate (float): Records per second accepted, 0 for no limit
+        burst (int): Records accepted back to back
+        dedup_window (float): Seconds a repeated warning or error is suppressed, 0 disables
+    """
+
+    def __init__(self, stream=None, level="info", fmt="json", buffer_size=10000, rate=200, burst=1000, dedup_window=10):
+        self.stream = stream
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._repeats = {}
+        self.dropped = 0
+        self.rate_limited = 0
+        self.configure(level=level, fmt=fmt, buffer_size=buffer_size, rate=rate, burst=burst, dedup_window=dedup_window)
+
+    def configure(self, level="info", fmt="json", buffer_size=10000, rate=200, burst=1000, dedup_window=10):
+        """Change the settings; buffer_size only applies if nothing was logged yet."""
+        if fmt not in ("json", "text"):
+            raise ValueError(f"Unknown log format {fmt}")
+        self.level = LEVELS[level]
+        self.fmt = fmt
+        self.buffer_size = buffer_size
+        self.rate = rate
+        self.burst = burst
+        self.dedup_window = dedup_window
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def _ensure_writer(self):
+        # Started on first use, and again in a forked child, where the parent's thread does not exist
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.buffer_size)
+            self._thread = threading.Thread(target=self._write_forever, name="log-writer", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _admit(self, level, msg, fields, now):
+        """Whether a record passes deduplication and the rate limit. Must hold the lock."""
+        if level >= LEVELS["warning"] and self.dedup_window > 0:
+            key = (level, msg, fields.get("phase"), _error_kind(fields.get("error")))
+            entry = self._repeats.get(key)
+            if entry is not None and now - entry["since"] < self.dedup_window:
+                entry["count"] += 1
+                DEDUPLICATED.inc()
+                return False
+            if entry is not None and entry["count"]:
+                self._enqueue(self._repeat_record(entry))
+            self._repeats[key] = {"since": now, "count": 0, "level": level, "msg": msg, "phase": fields.get("phase")}
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                self.rate_limited += 1
+                RATE_LIMITED.inc()
+                return False
+            self._tokens -= 1
+        return True
+
+    def log(self, level, msg, **fields):
+        """Queue a record; fields such as match, handle, phase and error are kept as keys."""
+        level = LEVELS[level]
+        if level < self.level:
+            return
+        self._ensure_writer()
+        with self._lock:
+            if not self._admit(level, msg, fields, time.monotonic()):
+                return
+        if "error" in fields:
+            fields["error"] = str(fields["error"])
+        self._enqueue({"ts": time.time(), "level": level, "msg": msg, **fields})
+
+    def _enqueue(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            DROPPED.inc()
+
+    def _repeat_record(self, entry):
+        return {
+            "ts": time.time(), "level": entry["level"], "msg": entry["msg"], "phase": entry["phase"],
+            "repeated": entry["count"], "window": self.dedup_window
+        }
+
+    def _sweep(self, now):
+        """Records of repeats whose window ended, and of records lost since the last sweep."""
+        records = []
+        with self._lock:
+            for key, entry in list(self._repeats.items()):
+                if now - entry["since"] >= self.dedup_window:
+                    del self._repeats[key]
+                    if entry["count"]:
+                        records.append(self._repeat_record(entry))
+            dropped, rate_limited = self.dropped, self.rate_limited
+            self.dropped = self.rate_limited = 0
+        if dropped or rate_limited:
+            records.append({
+                "ts": time.time(), "level": LEVELS["warning"], "msg": "Log records lost",
+                "dropped": dropped, "rate_limited": rate_limited
+            })
+        return records
+
+    def _format(self, record):
+        record["level"] = _LEVEL_NAMES[record["level"]]
+        if self.fmt == "text":
+            stamp = datetime.datetime.fromtimestamp(record.pop("ts")).isoformat(timespec="milliseconds")
+            level, msg = record.pop("level"), record.pop("msg")
+            keys = [key for key in KEY_FIELDS if record.get(key) is not None] + \
+                   [key for key in record if key not in KEY_FIELDS and record[key] is not None]
+            return " ".join([stamp, level.upper(), msg] + [f"{key}={record[key]}" for key in keys]) + "\n"
+        record["ts"] = round(record["ts"], 3)
+        record = {key: value for key, value in record.items() if value is not None}
+        try:
+            return codec.dumps(record).decode() + "\n"
+        except TypeError:
+            return json.dumps(record, default=str) + "\n"
+
+    def _write(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self._format(record))
+            except Exception as e:
+                lines.append(f"Unformattable log record {record!r}: {str(e)}\n")
+        stream = self.stream or sys.stdout
+        try:
+            stream.write("".join(lines))
+            stream.flush()
+        except Exception:
+            # Nowhere left to report it
+            pass
+        WRITTEN.inc(len(records))
+
+    def _write_forever(self):
+        pending = self._queue
+        swept = time.monotonic()
+        while True:
+            try:
+                records = [pending.get(timeout=0.5)]
+            except queue.Empty:
+                records = []
+            # Everything queued meanwhile goes out in the same write
+            while len(records) < 1000:
+                try:
+                    records.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            taken = len(records)
+            now = time.monotonic()
+            if now - swept >= 1:
+                records.extend(self._sweep(now))
+                swept = now
+            if records:
+                self._write(records)
+            for _ in range(taken):
+                pending.task_done()
+
+    def flush(self, timeout=2):
+        """Wait (up to timeout seconds) for the queued records to be written."""
+        if self._pid != os.getpid() or self._queue is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "buffer_size": self.buffer_size,
+            "repeating": len(self._repeats)
+        }
+
+
+_LEVEL_NAMES = {number: name for name, number in LEVELS.items()}
+
+# Process-wide logger every module writes through; app.py configures it from the environment
+LOGGER = AsyncLogger()
+atexit.register(LOGGER.flush)
+
+
+def debug(msg, **fields):
+    LOGGER.log("debug", msg, **fields)
+
+
+def info(msg, **fields):
+    LOGGER.log("info", msg, **fields)
+
+
+def warning(msg, **fields):
+    LOGGER.log("warning", msg, **fields)
+
+
+def error(msg, **fields):
+    LOGGER.log("error", msg, **fields)
@@ -0,0 +1,226 @@
+import bisect
+import math
+import threading
+
+# Latency buckets in seconds, from sub-millisecond HTTP calls up to slow detections
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; stored per bucket and made cumulative on render
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child for one set of label values; cache it when recording in a hot loop."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def totals(self):
+        """(count, sum) of every set of label values."""
+        totals = {}
+        for values, child in list(self._children.items()):
+            with child._lock:
+                totals[values] = (sum(child.counts), child.sum)
+        return totals
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Gauge(_Metric):
+    """
+    Gauge read at scrape time from a callback, so recording costs nothing.
+
+    Args:
+        fn (callable): Returns the value, or a dict of label value tuple -> value
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labelnames=(), registry=None):
+        self.fn = fn
+        super().__init__(name, help, labelnames, registry)
+
+    def _samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        values = value if isinstance(value, dict) else {(): value}
+        for label_values, sample in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, label_values)} {_format_value(sample)}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+    def unregister(self, name):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Codeforces API
+CF_REQUEST_SECONDS = Histogram(
+    "blitz_cf_request_seconds", "Codeforces API call latency, excluding rate budget waits", ["method"]
+)
+CF_REQUESTS = Counter(
+    "blitz_cf_requests_total", "Codeforces API calls by outcome (ok, failed, throttled, error, refused)", ["method", "outcome"]
+)
+CF_HEDGED_REQUESTS = Counter(
+    "blitz_cf_hedged_requests_total", "Slow Codeforces calls that sent a second request, by which one answered first",
+    ["method", "winner"]
+)
+CF_RATE_WAIT_SECONDS = Histogram(
+    "blitz_cf_rate_wait_seconds", "Time calls waited on the Codeforces rate budget"
+)
+
+# Polling
+POLL_LAG_SECONDS = Histogram(
+    "blitz_poll_lag_seconds", "How late polls started relative to when they were due"
+)
+POLL_SECONDS = Histogram(
+    "blitz_poll_seconds", "Duration of one poll cycle of a match or contest feed", ["kind"]
+)
+POLL_PHASE_SECONDS = Histogram(
+    "blitz_poll_phase_seconds",
+    "Time poll cycles spend per phase: Codeforces HTTP, JSON decode, submission comparison and winner publish",
+    ["phase"]
+)
+DETECTION_SECONDS = Histogram(
+    "blitz_detection_seconds",
+    "From the deciding Codeforces submission (creationTimeSeconds) to the winner being confirmed by the broker"
+)
+
+# Queues
+MATCHES_RECEIVED = Counter(
+    "blitz_matches_received_total", "Messages handled from the matches queue by outcome", ["outcome"]
+)
+CALLBACK_SECONDS = Histogram(
+    "blitz_callback_seconds", "Time to register a match from a matches queue message"
+)
+WINNER_PUBLISH_SECONDS = Histogram(
+    "blitz_winner_publish_seconds", "Time from publishing a winner's batch to the broker confirming it"
+)
+
+# Logging
+LOG_RECORDS = Counter(
+    "blitz_log_records_total", "Log records by outcome (written, deduplicated, rate_limited, dropped)", ["outcome"]
+)
@@ -0,0 +1,164 @@
+import os
+import re
+import sys
+import threading
+import time
+
+# Pool threads share a name up to their number ("poll-worker-3", "match-consumer_1")
+_POOL_SUFFIX = re.compile(r"[-_]\d+$")
+
+
+def thread_label(name):
+    return _POOL_SUFFIX.sub("", name)
+
+
+class ProfilerBusyError(Exception):
+    """Another profile is already being taken."""
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler over every thread of the process.
+
+    Every `interval` seconds the Python stack of each thread is read from
+    sys._current_frames(); nothing is installed in the profiled threads, so
+    they run untouched between samples. Stacks are grouped under their
+    thread name, with the numbers of pool threads stripped so a pool shows
+    up as one root. One profile runs at a time.
+
+    Args:
+        interval (float): Seconds between samples
+        max_depth (int): Innermost frames kept per stack
+    """
+
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._labels = {}
+        self._lock = threading.Lock()
+
+    def _frame_label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _sample(self, stacks, codes, frames, own_ident, previous):
+        """
+        Count one sample of every thread's stack. A frame's callers never
+        change, so a thread still in the same innermost frame as last round
+        (most threads, waiting) reuses that round's stack without a walk.
+
+        Returns:
+            dict: Innermost frame of each thread -> its stack key, for the next round
+        """
+        # Stacks are keyed by code object ids, innermost first: code objects hash by content,
+        # which is slow, and labels are only built once at the end
+        current = {}
+        for ident, leaf in frames.items():
+            if ident == own_ident:
+                continue
+            key = previous.get(leaf)
+            if key is None:
+                stack = [ident]
+                frame = leaf
+                while frame is not None and len(stack) <= self.max_depth:
+                    code = frame.f_code
+                    codes[id(code)] = code
+                    stack.append(id(code))
+                    frame = frame.f_back
+                key = tuple(stack)
+            current[leaf] = key
+            stacks[key] = stacks.get(key, 0) + 1
+        return current
+
+    def profile(self, seconds):
+        """
+        Sample every other thread for `seconds`.
+
+        Returns:
+            dict: Stack (tuple of frame labels, thread first) -> sample count,
+                with the number of sampling rounds and the CPU time spent
+                sampling as a share of the wall time
+
+        Raises:
+            ProfilerBusyError: A profile is already running
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            own_ident = threading.get_ident()
+            stacks = {}
+            names = {}
+            codes = {}
+            previous = {}
+            rounds = 0
+            started = time.perf_counter()
+            cpu_started = time.thread_time()
+            deadline = started + seconds
+            next_sample = started
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if now < next_sample:
+                    time.sleep(next_sample - now)
+                    continue
+                frames = sys._current_frames()
+                if not frames.keys() <= names.keys():
+                    # A thread started since the last round; names of threads that ended are kept
+                    names.update((thread.ident, thread_label(thread.name)) for thread in threading.enumerate())
+                previous = self._sample(stacks, codes, frames, own_ident, previous)
+                rounds += 1
+                next_sample += self.interval
+                if next_sample < now:
+                    # Sampling fell behind; skip the missed rounds instead of bursting
+                    next_sample = now + self.interval
+            elapsed = time.perf_counter() - started
+            # CPU the sampling thread used, as a share of the wall time it profiled for
+            overhead = (time.thread_time() - cpu_started) / elapsed if elapsed else 0.0
+            labelled = {}
+            for (ident, *code_ids), count in stacks.items():
+                stack = (names.get(ident) or f"thread-{ident}",) + tuple(self._frame_label(codes[code_id]) for code_id in reversed(code_ids))
+                labelled[stack] = labelled.get(stack, 0) + count
+            return {
+                "stacks": labelled,
+                "rounds": rounds,
+                "seconds": round(elapsed, 3),
+                "overhead": round(overhead, 4)
+            }
+        finally:
+            self._lock.release()
+
+
+def collapse(stacks):
+    """Stacks in the collapsed format flamegraph.pl and speedscope read: "a;b;c count" per line."""
+    lines = [f"{';'.join(stack)} {count}" for stack, count in stacks.items()]
+    lines.sort()
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def summarize(stacks, limit=50):
+    """
+    Per-function sample counts: `self` where the function was the innermost
+    frame, `total` where it was anywhere on the stack.
+
+    Returns:
+        list: The `limit` functions with the most self samples
+    """
+    samples = sum(stacks.values())
+    functions = {}
+    for stack, count in stacks.items():
+        # The first entry is the thread, not a function
+        frames = stack[1:]
+        for label in set(frames):
+            entry = functions.setdefault(label, {"function": label, "self": 0, "total": 0})
+            entry["total"] += count
+        if frames:
+            functions[frames[-1]]["self"] += count
+    ranked = sorted(functions.values(), key=lambda entry: (entry["self"], entry["total"]), reverse=True)[:limit]
+    for entry in ranked:
+        entry["self_percent"] = round(100 * entry["self"] / samples, 2) if samples else 0.0
+        entry["total_percent"] = round(100 * entry["total"] / samples, 2) if samples else 0.0
+    return ranked
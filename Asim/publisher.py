@@ -0,0 +1,215 @@
+import collections
+import itertools
+import random
+import threading
+import time
+
+import pika
+
+from codec import MessageCodec
+import logs
+from metrics import WINNER_PUBLISH_SECONDS
+
+
+class WinnerPublisher:
+    """
+    Long-lived RabbitMQ publisher fed from a bounded local outbox.
+
+    Callers only append to the outbox, so match detection never waits on the
+    broker. A background flusher owns the one connection and channel (pika
+    is not thread safe) and publishes in batches with publisher confirms.
+    Every message of a batch is written without waiting, then the flusher
+    waits once for the broker to confirm them all, so a batch costs one
+    round trip; a blocking channel in confirm mode would wait for each
+    message's confirm in turn. Messages leave the outbox only once
+    confirmed, and a batch with a nacked or unroutable message is retried
+    whole. On failure it reconnects with jittered exponential backoff.
+
+    Args:
+        url (str): AMQP connection URL
+        queue (str): Queue to publish to through the default exchange
+        max_outbox (int): Messages held locally before publish() rejects new ones, unless told to spill
+        batch_size (int): Messages published per flush
+        max_backoff (float): Longest wait between reconnect attempts, in seconds
+        on_published (callable): Called with each message once the broker confirmed it
+        codec (MessageCodec): Message encoding, JSON by default
+        paused (callable): Returns True while nothing may be published; messages stay in the outbox
+        confirm_timeout (float): Seconds to wait for a batch's confirms before reconnecting to retry it
+    """
+
+    def __init__(self, url, queue, max_outbox=10000, batch_size=100, max_backoff=30, on_published=None, codec=None,
+                 paused=None, confirm_timeout=30):
+        self.url = url
+        self.queue = queue
+        self.codec = codec or MessageCodec()
+        self.max_outbox = max_outbox
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.on_published = on_published
+        self.paused = paused
+        self.confirm_timeout = confirm_timeout
+        self._outbox = collections.deque()
+        self._cond = threading.Condition()
+        self._connection = None
+        self._channel = None
+        self._thread = None
+        self.published = 0
+        self.failures = 0
+        # Delivery tag of the last message published on the channel, the ones
+        # not confirmed yet, and whether any was nacked or returned unroutable
+        self._delivery_tag = 0
+        self._unconfirmed = set()
+        self._failed = 0
+        self.rejected = 0
+        self.spilled = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._flush_forever, name="winner-publisher", daemon=True)
+        self._thread.start()
+
+    def publish(self, message, spill=False):
+        """
+        Queue a message for publishing without blocking.
+
+        Args:
+            message (dict): Message to publish
+            spill (bool): Queue it even past max_outbox, for messages that
+                must not be lost
+
+        Returns:
+            bool: False if the outbox is full and the message was rejected
+        """
+        with self._cond:
+            full = len(self._outbox) >= self.max_outbox
+            if full and not spill:
+                self.rejected += 1
+                return False
+            if full:
+                self.spilled += 1
+            self._outbox.append(message)
+            self._cond.notify()
+        if full:
+            logs.warning("Winner outbox is full, holding the message past its limit", queue=self.queue,
+                         outbox=self.max_outbox, phase="publish")
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                "connected": self._channel is not None and self._channel.is_open,
+                "outbox": len(self._outbox),
+                "published": self.published,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "spilled": self.spilled
+            }
+
+    def _connect(self):
+        self._connection = pika.BlockingConnection(pika.URLParameters(self.url))
+        self._channel = self._connection.channel()
+        self._channel.queue_declare(queue=self.queue, durable=True)
+        self._channel.add_on_return_callback(self._on_returned)
+        # Confirm mode on the underlying channel, with our own ack/nack
+        # callback: the blocking channel's confirm_delivery() would make each
+        # basic_publish wait for its own confirm
+        self._channel._impl.confirm_delivery(ack_nack_callback=self._on_confirm)
+        self._delivery_tag = 0
+        self._unconfirmed = set()
+        self._failed = 0
+
+    def _on_returned(self, channel, method, properties, body):
+        # The broker sends a return before the confirm of the same message
+        self._failed += 1
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        if isinstance(method, pika.spec.Basic.Nack):
+            self._failed += 1
+        if method.multiple:
+            self._unconfirmed = {tag for tag in self._unconfirmed if tag > method.delivery_tag}
+        else:
+            self._unconfirmed.discard(method.delivery_tag)
+        if not self._unconfirmed:
+            # Wake the flusher blocked in process_data_events
+            self._connection.call_later(0, lambda: None)
+
+    def _close(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        properties = pika.BasicProperties(
+            delivery_mode=2,  # make message persistent
+            **self.codec.properties
+        )
+        for message in batch:
+            # Outside the blocking confirm mode this only writes to the socket
+            self._channel.basic_publish(
+                exchange='',
+                routing_key=self.queue,
+                body=self.codec.encode(message),
+                properties=properties,
+                mandatory=True
+            )
+            self._delivery_tag += 1
+            self._unconfirmed.add(self._delivery_tag)
+        # One wait for every confirm of the batch
+        deadline = time.monotonic() + self.confirm_timeout
+        while self._unconfirmed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"The broker did not confirm {len(self._unconfirmed)} winner message(s) in time")
+            self._connection.process_data_events(time_limit=remaining)
+        if self._failed:
+            self._failed = 0
+            raise RuntimeError(f"The broker nacked or returned winner message(s) from a batch of {len(batch)}")
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            for _ in batch:
+                self._outbox.popleft()
+            self.published += len(batch)
+        for message in batch:
+            WINNER_PUBLISH_SECONDS.observe(elapsed)
+            if self.on_published is not None:
+                self.on_published(message)
+
+    def _flush_forever(self):
+        backoff = 1
+        while True:
+            if self.paused is not None and self.paused():
+                time.sleep(0.1)
+                continue
+            with self._cond:
+                if not self._outbox:
+                    # Wake up periodically so heartbeats keep the idle connection alive
+                    self._cond.wait(timeout=5)
+                batch = list(itertools.islice(self._outbox, self.batch_size))
+            connected = self._channel is not None and self._channel.is_open
+            if not batch and not connected:
+                continue
+
+            try:
+                if not connected:
+                    self._connect()
+                if batch:
+                    self._flush(batch)
+                    logs.debug("Published to RabbitMQ", queue=self.queue, messages=len(batch), phase="publish")
+                else:
+                    self._connection.process_data_events(time_limit=0)
+                backoff = 1
+            except Exception as e:
+                self.failures += 1
+                logs.warning("Error publishing to RabbitMQ, retrying", queue=self.queue, phase="publish",
+                              retry_seconds=backoff, error=e)
+                self._close()
+                time.sleep(backoff * random.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, self.max_backoff)
+
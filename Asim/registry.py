@@ -0,0 +1,242 @@
+import collections
+import json
+import threading
+import time
+
+import logs
+from tenants import DEFAULT_TENANT
+
+FINISHED_STATUSES = ("both_solved", "one_solved", "error", "stopped", "timeout")
+DECIDED_STATUSES = ("both_solved", "one_solved")
+
+# Round names by tournament level, matching the backend's match id prefixes
+ROUND_NAMES = {1: "ROUND-OF-32", 2: "ROUND-OF-16", 3: "QUARTER-FINAL", 4: "SEMI-FINAL", 5: "FINAL"}
+
+
+def match_round(match_id, level=None):
+    """Round of a match, from its level or else its match id (e.g. QUARTER-FINAL-2)."""
+    try:
+        if level is not None and int(level) in ROUND_NAMES:
+            return ROUND_NAMES[int(level)]
+    except (TypeError, ValueError):
+        pass
+    prefix, _, number = str(match_id).rpartition("-")
+    return prefix if prefix and number.isdigit() else None
+
+
+class TrackingRecord:
+    __slots__ = ("match_id", "status", "round", "tenant", "data", "updated")
+
+    def __init__(self, match_id, status, round, data, updated):
+        self.match_id = match_id
+        self.status = status
+        self.round = round
+        self.tenant = data.get("tenant") or DEFAULT_TENANT
+        self.data = data
+        self.updated = updated
+
+
+class TrackingRegistry:
+    """
+    Thread-safe store of tracking statuses, indexed by status, round and tenant.
+
+    Records are replaced, never mutated, so readers can use a record's data
+    without holding the lock. Each index bucket caches an immutable tuple of
+    its records, rebuilt only after the bucket changes, so a status query
+    costs the size of the answer rather than the size of the registry.
+    Finished matches are evicted to an archive once they are older than
+    `retention` seconds or more than `max_finished` are held.
+
+    Args:
+        retention (float): Seconds a finished match stays in the registry
+        max_finished (int): Finished matches kept before the oldest are evicted
+        archive_path (str): JSON-lines file evicted records are appended to, if any
+        on_evict (callable): Called with each evicted match id
+        on_change (callable): Called as on_change(match_id, data) after every put
+    """
+
+    def __init__(self, retention=24 * 3600, max_finished=10000, archive_path=None, on_evict=None, on_change=None):
+        self.retention = retention
+        self.max_finished = max_finished
+        self.archive_path = archive_path
+        self.on_evict = on_evict
+        self.on_change = on_change
+        self._records = {}
+        self._by_status = collections.defaultdict(dict)
+        self._by_round = collections.defaultdict(dict)
+        self._by_tenant = collections.defaultdict(dict)
+        self._cache = {}
+        # Finished match ids in the order they finished, for eviction
+        self._finished = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.version = 0
+        self.evicted = 0
+
+    def start(self, interval=60):
+        """Evict expired records every interval seconds in the background."""
+        if self._thread is not None:
+            return
+
+        def reap_forever():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.evict_expired()
+                except Exception as e:
+                    logs.error("Error evicting tracking records", phase="registry", error=e)
+
+        self._thread = threading.Thread(target=reap_forever, name="registry-reaper", daemon=True)
+        self._thread.start()
+
+    def _bucket_add(self, index, name, key, record):
+        if key is None:
+            return
+        index[key][record.match_id] = record
+        self._cache.pop((name, key), None)
+
+    def _bucket_remove(self, index, name, key, match_id):
+        if key is None:
+            return
+        bucket = index.get(key)
+        if bucket is not None and bucket.pop(match_id, None) is not None:
+            self._cache.pop((name, key), None)
+            if not bucket:
+                del index[key]
+
+    def _remove(self, match_id):
+        """Drop a record from every index. Must hold the lock."""
+        record = self._records.pop(match_id, None)
+        if record is None:
+            return None
+        self._bucket_remove(self._by_status, "status", record.status, match_id)
+        self._bucket_remove(self._by_round, "round", record.round, match_id)
+        self._bucket_remove(self._by_tenant, "tenant", record.tenant, match_id)
+        self._finished.pop(match_id, None)
+        return record
+
+    def put(self, match_id, data, round=None):
+        """Store a new status dict for a match; the round is kept if not given."""
+        data = dict(data)
+        data.setdefault("match_id", match_id)
+        now = time.time()
+        with self._lock:
+            previous = self._remove(match_id)
+            if round is None and previous is not None:
+                round = previous.round
+            record = TrackingRecord(match_id, data.get("status"), round, data, now)
+            self._records[match_id] = record
+            self._bucket_add(self._by_status, "status", record.status, record)
+            self._bucket_add(self._by_round, "round", record.round, record)
+            self._bucket_add(self._by_tenant, "tenant", record.tenant, record)
+            if record.status in FINISHED_STATUSES:
+                self._finished[match_id] = now
+            self.version += 1
+            evicted = self._evict(now)
+        self._archive(evicted)
+        if self.on_change is not None:
+            self.on_change(match_id, data)
+        return data
+
+    def remove(self, match_id):
+        """Forget a match without archiving it, e.g. once another node tracks it."""
+        with self._lock:
+            record = self._remove(match_id)
+            if record is not None:
+                self.version += 1
+        return record.data if record is not None else None
+
+    def get(self, match_id):
+        record = self._records.get(match_id)
+        return record.data if record is not None else None
+
+    def record(self, match_id):
+        return self._records.get(match_id)
+
+    def records(self):
+        with self._lock:
+            return tuple(self._records.values())
+
+    def __contains__(self, match_id):
+        return match_id in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def _bucket(self, index, name, key):
+        """Immutable tuple of a bucket's records, cached until the bucket changes."""
+        with self._lock:
+            cached = self._cache.get((name, key))
+            if cached is None:
+                cached = tuple(index.get(key, {}).values())
+                self._cache[(name, key)] = cached
+            return cached
+
+    def with_status(self, *statuses):
+        """Records whose status is one of statuses."""
+        return [record for status in statuses for record in self._bucket(self._by_status, "status", status)]
+
+    def without_status(self, *statuses):
+        """Records whose status is none of statuses."""
+        with self._lock:
+            keys = [status for status in self._by_status if status not in statuses]
+        return [record for status in keys for record in self._bucket(self._by_status, "status", status)]
+
+    def in_round(self, round):
+        return list(self._bucket(self._by_round, "round", round))
+
+    def in_tenant(self, tenant):
+        return list(self._bucket(self._by_tenant, "tenant", tenant))
+
+    def tenants(self):
+        with self._lock:
+            return list(self._by_tenant)
+
+    def snapshot(self):
+        """Every record's data, keyed by match id."""
+        with self._lock:
+            records = tuple(self._records.values())
+        return {record.match_id: record.data for record in records}
+
+    def counts(self):
+        with self._lock:
+            return {
+                "total": len(self._records),
+                "by_status": {status: len(bucket) for status, bucket in self._by_status.items()},
+                "by_round": {round: len(bucket) for round, bucket in self._by_round.items()},
+                "by_tenant": {tenant: len(bucket) for tenant, bucket in self._by_tenant.items()},
+                "evicted": self.evicted,
+                "version": self.version
+            }
+
+    def evict_expired(self):
+        with self._lock:
+            evicted = self._evict(time.time())
+        self._archive(evicted)
+
+    def _evict(self, now):
+        """Pop finished records past retention or over the size bound. Must hold the lock."""
+        evicted = []
+        while self._finished:
+            match_id, finished_at = next(iter(self._finished.items()))
+            if len(self._finished) <= self.max_finished and now - finished_at < self.retention:
+                break
+            evicted.append(self._remove(match_id))
+        if evicted:
+            self.evicted += len(evicted)
+            self.version += 1
+        return evicted
+
+    def _archive(self, records):
+        if not records:
+            return
+        if self.archive_path:
+            try:
+                with open(self.archive_path, "a", encoding="utf-8") as f:
+                    for record in records:
+                        f.write(json.dumps({"match_id": record.match_id, "round": record.round, **record.data}) + "\n")
+            except Exception as e:
+                logs.error("Error archiving tracking records", phase="registry", error=e)
+        if self.on_evict is not None:
+            for record in records:
+                self.on_evict(record.match_id)
@@ -0,0 +1,120 @@
+import heapq
+import itertools
+import threading
+import time
+
+import logs
+from metrics import POLL_LAG_SECONDS
+
+
+class PollScheduler:
+    """
+    Deadline-ordered poll queue served by a fixed pool of worker threads.
+
+    Every tracked match is a single entry in a heap keyed by the time its next
+    poll is due, so the number of threads stays constant no matter how many
+    matches are being tracked.
+
+    Args:
+        poll_fn (callable): Called as poll_fn(key) when an entry is due.
+            Returns the delay in seconds until the next poll, or None when
+            the key is finished and should not be rescheduled.
+        workers (int): Number of worker threads serving the queue
+    """
+
+    def __init__(self, poll_fn, workers=4):
+        self._poll_fn = poll_fn
+        self._workers = workers
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        # key -> sequence number of its live heap entry; stale entries are skipped
+        self._entries = {}
+        # keys currently being polled, and deadlines requested while they ran
+        self._running = set()
+        self._deferred = {}
+        self._cancelled = set()
+        self._threads = []
+        self._started = False
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._worker, name=f"poll-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def schedule(self, key, delay=0):
+        """Schedule (or reschedule) a poll of key after delay seconds."""
+        due = time.monotonic() + delay
+        with self._cond:
+            if key in self._running:
+                self._cancelled.discard(key)
+                self._deferred[key] = due
+                return
+            self._push(key, due)
+
+    def cancel(self, key):
+        """Drop any pending poll for key. A poll already running is allowed to finish."""
+        with self._cond:
+            self._entries.pop(key, None)
+            self._deferred.pop(key, None)
+            if key in self._running:
+                self._cancelled.add(key)
+
+    def is_scheduled(self, key):
+        with self._cond:
+            return key in self._entries or key in self._running
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries) + len(self._running)
+
+    def _push(self, key, due):
+        seq = next(self._seq)
+        self._entries[key] = seq
+        heapq.heappush(self._heap, (due, seq, key))
+        self._cond.notify()
+
+    def _next_due(self):
+        """Pop the next live entry once it is due. Must hold the condition."""
+        while True:
+            while self._heap and self._entries.get(self._heap[0][2]) != self._heap[0][1]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._cond.wait()
+                continue
+            due, _, key = self._heap[0]
+            wait = due - time.monotonic()
+            if wait > 0:
+                self._cond.wait(wait)
+                continue
+            POLL_LAG_SECONDS.observe(-wait)
+            heapq.heappop(self._heap)
+            del self._entries[key]
+            self._running.add(key)
+            return key
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                key = self._next_due()
+
+            try:
+                delay = self._poll_fn(key)
+            except Exception as e:
+                logs.error("Error polling", match=key, phase="poll", error=e)
+                delay = None
+
+            with self._cond:
+                self._running.discard(key)
+                deferred = self._deferred.pop(key, None)
+                if key in self._cancelled:
+                    self._cancelled.discard(key)
+                elif deferred is not None:
+                    self._push(key, deferred)
+                elif delay is not None:
+                    self._push(key, time.monotonic() + delay)
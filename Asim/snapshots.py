@@ -0,0 +1,53 @@
+import gzip
+import hashlib
+import threading
+
+
+class Snapshot:
+    """One serialized response body with its ETag; the gzip variant is built on first use."""
+    __slots__ = ("version", "body", "etag", "_gzipped", "_lock")
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        # Derived from the content, so ETags stay valid across restarts that reset versions
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self._gzipped = None
+        self._lock = threading.Lock()
+
+    @property
+    def gzipped(self):
+        if self._gzipped is None:
+            with self._lock:
+                if self._gzipped is None:
+                    self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+
+class SnapshotCache:
+    """
+    Pre-serialized responses keyed by name and tied to a version counter.
+    A snapshot is rebuilt only when it is requested with a newer version,
+    so repeated reads of unchanged state cost a dict lookup.
+    """
+
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, name, version, build):
+        """
+        Snapshot of `name` at `version`, calling build() for the body bytes
+        only if the cached one is older.
+        """
+        snapshot = self._snapshots.get(name)
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshots.get(name)
+            if snapshot is None or snapshot.version != version:
+                snapshot = Snapshot(version, build())
+                self._snapshots[name] = snapshot
+                self.builds += 1
+        return snapshot
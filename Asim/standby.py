@@ -0,0 +1,287 @@
+import hmac
+import socket
+import socketserver
+import threading
+import time
+
+import codec
+import logs
+from ipc import send_message
+from statelog import apply_record
+
+SNAPSHOT = "snapshot"
+RECORD = "record"
+HEARTBEAT = "heartbeat"
+ERROR = "error"
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+class ReplicationServer:
+    """
+    TCP endpoint a primary streams its state log on to a warm standby.
+
+    A standby connects and sends {"op": "follow", "token": ..., "lease_ttl": ...}.
+    It receives the materialized state as one snapshot, then every record
+    appended to the log, as JSON lines. At least every `heartbeat` seconds a
+    heartbeat goes out; each message renews the primary's lease at the
+    standby. A standby more than `max_lag` records behind is disconnected
+    and resyncs from a new snapshot when it reconnects.
+
+    The lease is held on both sides. The snapshot and every heartbeat carry
+    the primary's monotonic send time, which the standby echoes back as
+    {"op": "ack", "sent": ...}. Once a snapshot went out, the primary is
+    fenced when no ack covers the last half of the standby's lease_ttl:
+    the standby takes over no sooner than lease_ttl after the last message
+    it heard, so a fenced primary has stopped well before that. Once no
+    standby has been connected for `fence_grace` seconds past the lease,
+    the primary runs unfenced again rather than waiting on a standby that
+    may be gone for good.
+
+    Args:
+        address (str): host:port to listen on
+        state_log (StateLog): Log whose records are streamed
+        token (str): Shared secret standbys must send, if any
+        heartbeat (float): Seconds between heartbeats on an idle stream
+        max_lag (int): Records queued per standby before it is dropped
+        fence_grace (float): Seconds past a lapsed lease, with no standby
+            connected, before fencing is lifted (0 fences until a standby acks)
+    """
+
+    def __init__(self, address, state_log, token=None, heartbeat=0.25, max_lag=10000, fence_grace=30):
+        self.address = parse_address(address)
+        self.state_log = state_log
+        self.token = token
+        self.heartbeat = heartbeat
+        self.max_lag = max_lag
+        self.fence_grace = fence_grace
+        self.followers = 0
+        # Monotonic time until which no standby can have taken over; None before any snapshot went out
+        self._lease_until = None
+        self._fenced = False
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        if self._server is not None:
+            return
+        replication = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def handle(self):
+                try:
+                    request = codec.loads(self.rfile.readline())
+                    if request.get("op") != "follow" or not replication.authorized(request.get("token")):
+                        send_message(self.wfile, {"type": ERROR, "message": "Forbidden"})
+                        return
+                    logs.info("Standby is following the state log", standby=self.client_address[0], phase="replicate")
+                    lease_ttl = float(request.get("lease_ttl") or 1)
+                    threading.Thread(
+                        target=replication._read_acks, args=(self.rfile, lease_ttl), name="replication-acks", daemon=True
+                    ).start()
+                    replication._stream(self.wfile, lease_ttl)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                except Exception as e:
+                    logs.error("Error streaming the state log", phase="replicate", error=e)
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self._server = Server(self.address, Handler)
+        threading.Thread(target=self._server.serve_forever, name="replication", daemon=True).start()
+
+    def authorized(self, token):
+        return not self.token or hmac.compare_digest(str(token or ""), self.token)
+
+    def fenced(self):
+        """
+        Whether a standby may have taken over, so this primary must not
+        poll, publish or take new matches until a standby acks it again, or
+        no standby has followed it for `fence_grace` seconds past the lease.
+        """
+        with self._lock:
+            now = time.monotonic()
+            abandoned = (
+                self.fence_grace > 0 and self.followers == 0 and
+                self._lease_until is not None and now > self._lease_until + self.fence_grace
+            )
+            if abandoned:
+                # No standby to hand over to; the next one to follow takes the lease up again
+                self._lease_until = None
+            fenced = self._lease_until is not None and now > self._lease_until
+            changed, self._fenced = fenced != self._fenced, fenced
+        if abandoned:
+            logs.warning("No standby followed the state log within the fence grace, running unfenced",
+                         grace=self.fence_grace, phase="replicate")
+        elif changed and fenced:
+            logs.warning("No standby acknowledged the replication lease, pausing", phase="replicate")
+        elif changed:
+            logs.info("A standby acknowledged the replication lease again, resuming", phase="replicate")
+        return fenced
+
+    def stats(self):
+        with self._lock:
+            lease_until = self._lease_until
+        return {
+            "standbys": self.followers,
+            "fenced": self.fenced(),
+            "lease_seconds": round(lease_until - time.monotonic(), 3) if lease_until is not None else None
+        }
+
+    def _renew(self, sent, lease_ttl):
+        with self._lock:
+            self._lease_until = max(self._lease_until or 0, sent + lease_ttl / 2)
+
+    def _read_acks(self, rfile, lease_ttl):
+        try:
+            for line in rfile:
+                message = codec.loads(line)
+                if message.get("op") == "ack":
+                    self._renew(float(message["sent"]), lease_ttl)
+        except Exception:
+            # The stream is over; _stream notices on its next write
+            pass
+
+    def _stream(self, wfile, lease_ttl):
+        state, follower = self.state_log.follow(self.max_lag)
+        self.followers += 1
+        try:
+            sent = time.monotonic()
+            # From here on this standby could take over, so the lease needs its acks
+            self._renew(sent, lease_ttl)
+            send_message(wfile, {"type": SNAPSHOT, "state": state, "sent": sent})
+            while True:
+                records = follower.take(self.heartbeat)
+                if records:
+                    for record in records:
+                        wfile.write(codec.dumps({"type": RECORD, "record": record}) + b"\n")
+                    wfile.flush()
+                elif follower.dropped:
+                    logs.warning("Standby fell behind the state log, dropping it to resync", phase="replicate")
+                    return
+                if not records or time.monotonic() - sent >= self.heartbeat:
+                    # Also while records flow, so acks keep renewing the lease
+                    sent = time.monotonic()
+                    send_message(wfile, {"type": HEARTBEAT, "sent": sent})
+        finally:
+            self.followers -= 1
+            self.state_log.unfollow(follower)
+
+
+class Standby:
+    """
+    Warm standby of a primary's ReplicationServer.
+
+    Keeps a copy of the primary's tracking state (matches, cursors and
+    results, with whether each winner was confirmed) current. Every message
+    from the primary renews its lease, and the send time of each heartbeat
+    is acked back so the primary knows its lease holds. Once the standby
+    has synced and then heard nothing for `lease_ttl` seconds, whether the
+    primary died or the stream broke, on_takeover(state) is called once on
+    the follower thread with the last replicated state, and following stops.
+
+    Args:
+        address (str): host:port of the primary's replication server
+        on_takeover (callable): Called as on_takeover(state) when the lease lapses
+        lease_ttl (float): Seconds of silence before the primary is presumed dead
+        token (str): Shared secret sent to the primary, if any
+    """
+
+    def __init__(self, address, on_takeover, lease_ttl=1, token=None):
+        self.address = address
+        self.on_takeover = on_takeover
+        self.lease_ttl = lease_ttl
+        self.token = token
+        self.state = None
+        self.records = 0
+        self.heard_at = None
+        self.took_over = False
+        self.synced = threading.Event()
+        # Short socket timeouts so a silent primary is noticed without waiting on a read
+        self._poll = min(0.1, lease_ttl / 4)
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._follow_forever, name="standby", daemon=True)
+            self._thread.start()
+        return self
+
+    def stats(self):
+        return {
+            "primary": self.address,
+            "synced": self.synced.is_set(),
+            "records": self.records,
+            "silent_seconds": round(time.monotonic() - self.heard_at, 3) if self.heard_at is not None else None,
+            "lease_ttl": self.lease_ttl,
+            "took_over": self.took_over
+        }
+
+    def _lease_lapsed(self):
+        # Never before the first snapshot: there would be nothing to take over
+        return self.heard_at is not None and time.monotonic() - self.heard_at > self.lease_ttl
+
+    def _apply(self, message):
+        """Apply one message of the stream; returns the primary's send time to ack, if it has one."""
+        if message["type"] == SNAPSHOT:
+            self.state = message["state"]
+            self.synced.set()
+        elif message["type"] == RECORD:
+            apply_record(self.state, message["record"])
+            self.records += 1
+        elif message["type"] == ERROR:
+            raise PermissionError(message.get("message"))
+        return message.get("sent")
+
+    def _follow(self):
+        with socket.create_connection(parse_address(self.address), timeout=self.lease_ttl / 2) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(self._poll)
+            sock.sendall(codec.dumps({"op": "follow", "token": self.token, "lease_ttl": self.lease_ttl}) + b"\n")
+            buffer = bytearray()
+            while not self._lease_lapsed():
+                try:
+                    chunk = sock.recv(65536)
+                except socket.timeout:
+                    continue
+                if not chunk:
+                    raise ConnectionError("Primary closed the replication stream")
+                # A snapshot spans many chunks; only the new bytes are searched for its end
+                scanned = len(buffer)
+                buffer += chunk
+                end = buffer.find(b"\n", scanned)
+                sent = None
+                while end >= 0:
+                    sent = self._apply(codec.loads(buffer[:end])) or sent
+                    del buffer[:end + 1]
+                    end = buffer.find(b"\n")
+                if self.synced.is_set():
+                    self.heard_at = time.monotonic()
+                    if sent is not None:
+                        sock.sendall(codec.dumps({"op": "ack", "sent": sent}) + b"\n")
+
+    def _follow_forever(self):
+        reported = False
+        while not self._lease_lapsed():
+            try:
+                self._follow()
+            except Exception as e:
+                # Once per outage: nothing is heard from the primary until it ends
+                if reported != self.heard_at:
+                    logs.warning("Lost the primary's state stream, retrying until its lease lapses", primary=self.address,
+                                 phase="replicate", error=e)
+                    reported = self.heard_at
+            time.sleep(self._poll)
+        self.took_over = True
+        logs.warning("Primary is silent, taking over", primary=self.address, silent_seconds=self.lease_ttl,
+                     tracked=len(self.state["matches"]), decided=len(self.state["results"]), phase="replicate")
+        self.on_takeover(self.state)
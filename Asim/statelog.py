@@ -0,0 +1,262 @@
+import os
+import queue
+import threading
+import time
+
+import codec
+import logs
+
+LOG_NAME = "state.log"
+SNAPSHOT_NAME = "state.snapshot.json"
+
+
+def empty_state():
+    return {"seq": 0, "matches": {}, "results": {}}
+
+
+def apply_record(state, record):
+    """Apply one log record to a materialized state dict."""
+    state["seq"] = record["seq"]
+    op = record["op"]
+    match_id = record["match_id"]
+    if op == "start":
+        state["matches"][match_id] = {
+            key: record.get(key) for key in ("handle1", "handle2", "problem_id", "level", "tenant", "start_time", "deadline")
+        }
+        state["matches"][match_id]["cursors"] = {}
+        state["results"].pop(match_id, None)
+    elif op == "cursor":
+        if match_id in state["matches"]:
+            state["matches"][match_id]["cursors"][record["key"]] = {
+                "last_id": record["last_id"],
+                "pending": record.get("pending", [])
+            }
+    elif op == "result":
+        state["matches"].pop(match_id, None)
+        state["results"][match_id] = {
+            "result": record["result"],
+            "winner": record.get("winner"),
+            "published": record.get("winner") is None
+        }
+    elif op == "published":
+        if match_id in state["results"]:
+            state["results"][match_id]["published"] = True
+    elif op == "evict":
+        state["results"].pop(match_id, None)
+    elif op == "release":
+        # Handed over to another node, which tracks it from now on
+        state["matches"].pop(match_id, None)
+
+
+class LogFollower:
+    """
+    Records appended to a state log after a follower's snapshot, queued for
+    one replication stream. A follower that falls `max_records` behind is
+    dropped instead of holding up appends.
+    """
+
+    def __init__(self, max_records=10000):
+        self.records = queue.Queue(maxsize=max_records)
+        self.dropped = False
+
+    def push(self, record):
+        try:
+            self.records.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped = True
+            return False
+
+    def take(self, timeout):
+        """Every queued record, waiting up to `timeout` seconds for the first."""
+        try:
+            records = [self.records.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                records.append(self.records.get_nowait())
+            except queue.Empty:
+                return records
+
+
+class StateLog:
+    """
+    Append-only write-ahead log of tracking state with compacted snapshots.
+
+    Records are JSON lines appended to an in-memory buffer; a background
+    thread writes and fsyncs the buffer every `fsync_interval` seconds, so
+    many records share one fsync. The log also keeps the materialized state
+    it describes, and once `compact_every` records have been appended it
+    writes that state as a snapshot (write, fsync, rename) and truncates the
+    log. Recovery reads the snapshot and replays the log after it. Followers
+    receive every appended record, for replication to a standby.
+
+    Args:
+        directory (str): Directory holding the log and snapshot files
+        fsync_interval (float): Seconds between batched writes + fsync
+        compact_every (int): Log records between snapshots
+    """
+
+    def __init__(self, directory, fsync_interval=0.2, compact_every=5000):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.log_path = os.path.join(directory, LOG_NAME)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.state = empty_state()
+        self._buffer = []
+        self._records_since_snapshot = 0
+        self._followers = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._file = None
+        self._thread = None
+
+    def load(self):
+        """Read the snapshot and replay the log. Returns the recovered state."""
+        os.makedirs(self.directory, exist_ok=True)
+        state = empty_state()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                state = codec.loads(f.read())
+
+        records, valid_size = self._read_log()
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > valid_size:
+            # Cut off a torn tail, or start() would append after it and the
+            # next replay would stop there and lose every later record
+            logs.warning("Truncating torn state log tail", phase="statelog",
+                         dropped=os.path.getsize(self.log_path) - valid_size)
+            with open(self.log_path, "r+b") as f:
+                f.truncate(valid_size)
+                f.flush()
+                os.fsync(f.fileno())
+
+        replayed = 0
+        for record in records:
+            if record["seq"] <= state["seq"]:
+                # Already in the snapshot (crash between snapshot and truncate)
+                continue
+            apply_record(state, record)
+            replayed += 1
+
+        with self._lock:
+            self.state = state
+            self._records_since_snapshot = replayed
+        return state
+
+    def _read_log(self):
+        """Records in the log, and the byte size of the log up to the last whole one."""
+        if not os.path.exists(self.log_path):
+            return [], 0
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        if data.endswith(b"\n"):
+            try:
+                # One parse of the whole log is much faster than a parse per line
+                return codec.loads(b"[" + b",".join(data.splitlines()) + b"]"), len(data)
+            except ValueError:
+                pass
+        records = []
+        valid_size = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                # Last append was cut short before its newline
+                break
+            try:
+                records.append(codec.loads(line))
+            except ValueError:
+                # Torn write from a crash mid-append; everything after it is lost anyway
+                break
+            valid_size += len(line)
+        return records, valid_size
+
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if self._file is None:
+            self._file = open(self.log_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._flush_forever, name="state-log", daemon=True)
+        self._thread.start()
+
+    def append(self, op, match_id, **fields):
+        with self._lock:
+            record = {"seq": self.state["seq"] + 1, "op": op, "match_id": match_id, "ts": time.time(), **fields}
+            line = codec.dumps(record).decode()
+            apply_record(self.state, record)
+            self._buffer.append(line)
+            self._records_since_snapshot += 1
+            for follower in list(self._followers):
+                if not follower.push(record):
+                    self._followers.remove(follower)
+
+    def follow(self, max_records=10000):
+        """
+        Copy of the materialized state, and a LogFollower receiving every
+        record appended after it.
+        """
+        follower = LogFollower(max_records)
+        with self._lock:
+            state = codec.loads(codec.dumps(self.state))
+            self._followers.append(follower)
+        return state, follower
+
+    def unfollow(self, follower):
+        with self._lock:
+            if follower in self._followers:
+                self._followers.remove(follower)
+
+    def restore(self, state):
+        """
+        Replace everything on disk with a state replicated from another
+        process, before start(). The state is written as the snapshot and
+        the log is truncated.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self.state = state
+            self._buffer = []
+            self._records_since_snapshot = 0
+        self._write_snapshot(codec.dumps(state).decode())
+
+    def flush(self):
+        """Write and fsync buffered records, compacting if the log has grown."""
+        with self._flush_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+                compact = self._records_since_snapshot >= self.compact_every
+            if lines and self._file is not None:
+                self._file.write("\n".join(lines) + "\n")
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            if compact:
+                self._compact()
+
+    def _compact(self):
+        with self._lock:
+            # The snapshot already covers anything still buffered, so drop it
+            snapshot = codec.dumps(self.state).decode()
+            self._buffer = []
+            self._records_since_snapshot = 0
+        self._write_snapshot(snapshot)
+
+    def _write_snapshot(self, snapshot):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.log_path, "w", encoding="utf-8")
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logs.error("Error writing state log", phase="statelog", error=e)
@@ -0,0 +1,55 @@
+import re
+
+# Matches published without a tenant belong to the default tenant and keep their bare ids
+DEFAULT_TENANT = "default"
+# Between a tenant and the id of a match or contest of that tenant
+SEPARATOR = "."
+TENANT_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def tenant_of(value):
+    """
+    Tenant named in a message or request, the default tenant if none is.
+
+    Raises:
+        ValueError: The tenant name is not 1-64 letters, digits, "-" or "_"
+    """
+    if value is None or value == "":
+        return DEFAULT_TENANT
+    if not isinstance(value, str) or not TENANT_PATTERN.fullmatch(value):
+        raise ValueError(f"Invalid tenant {value!r}")
+    return value
+
+
+def check_match_id(tenant, match_id):
+    """
+    Raises:
+        ValueError: A default tenant's match id contains the separator, so it
+            could be the tracking id of another tenant's match
+    """
+    if tenant == DEFAULT_TENANT and isinstance(match_id, str) and SEPARATOR in match_id:
+        raise ValueError(f"match_id {match_id!r} may not contain {SEPARATOR!r} without a tenant")
+
+
+def tenant_key(tenant, key):
+    """Id of a tenant's match or contest group, unique across tenants (e.g. iitb.FINAL-1)."""
+    if tenant == DEFAULT_TENANT:
+        return key
+    return f"{tenant}{SEPARATOR}{key}"
+
+
+def local_id(tenant, key):
+    """The id a tenant knows one of its namespaced ids by."""
+    if tenant == DEFAULT_TENANT:
+        return key
+    return key[len(tenant) + len(SEPARATOR):]
+
+
+def parse_shares(spec):
+    """Budget shares from "iitb:2,nitk:1"; tenants left out get the default share."""
+    shares = {}
+    for item in spec.split(","):
+        if item.strip():
+            tenant, _, share = item.partition(":")
+            shares[tenant_of(tenant.strip())] = float(share)
+    return shares
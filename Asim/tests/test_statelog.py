@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+from statelog import StateLog
+
+
+def restart(directory):
+    log = StateLog(directory, fsync_interval=60)
+    state = log.load()
+    log.start()
+    return log, state
+
+
+def start_record(log, match_id):
+    log.append("start", match_id, handle1="a", handle2="b", problem_id="1A", start_time=0)
+    log.flush()
+
+
+class TornWriteTest(unittest.TestCase):
+    def test_records_after_a_torn_write_survive_restarts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log, _ = restart(directory)
+            start_record(log, "m1")
+            with open(os.path.join(directory, "state.log"), "a", encoding="utf-8") as f:
+                f.write('{"seq":2,"op":"sta')
+
+            log, state = restart(directory)
+            self.assertEqual(list(state["matches"]), ["m1"])
+            start_record(log, "m2")
+
+            _, state = restart(directory)
+            self.assertEqual(sorted(state["matches"]), ["m1", "m2"])
+            self.assertEqual(state["seq"], 2)
+
+    def test_record_missing_its_newline_is_dropped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log, _ = restart(directory)
+            start_record(log, "m1")
+            with open(os.path.join(directory, "state.log"), "a", encoding="utf-8") as f:
+                f.write('{"seq":2,"op":"evict","match_id":"m0","ts":0}')
+
+            log, state = restart(directory)
+            self.assertEqual(state["seq"], 1)
+            start_record(log, "m2")
+
+            _, state = restart(directory)
+            self.assertEqual(sorted(state["matches"]), ["m1", "m2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,9 @@
-from app import app  # If your file is named `app.py`
+import os
+
+# Gunicorn workers serve the API; the tracking engine runs as engine.py
+os.environ.setdefault('PROCESS_ROLE', 'api')
+
+from app import app  # noqa: E402  If your file is named `app.py`
 
 if __name__ == "__main__":
     app.run()